@@ -6,38 +6,621 @@ import time
 import base64
 import numpy as np
 import re
+import html
+import threading
+import hashlib
+import mimetypes
+import queue
+import bisect
+import heapq
+import math
+import json
+import shutil
+import uuid
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from PIL import Image
 
 # --- CSV File Configuration ---
 # Define the file paths for all data storage.
+# The flat restaurant, review, menu and photo CSVs are read-only seed data: the first run
+# copies them into the location partitions under data/partitions/ (see Partitioned
+# Storage), and every later write goes to the partitions. The app never writes to the
+# seeds. Bookings and review rollups stay in flat files created at runtime.
 RESTAURANTS_CSV_FILE = "restaurants.csv"
 REVIEWS_CSV_FILE = "reviews.csv"
 MENUS_CSV_FILE = "menus.csv"
 GALLERY_CSV_FILE = "gallery_images.csv"
+SEED_FILES = {
+    "restaurants": RESTAURANTS_CSV_FILE,
+    "reviews": REVIEWS_CSV_FILE,
+    "menus": MENUS_CSV_FILE,
+    "gallery": GALLERY_CSV_FILE,
+}
+BOOKINGS_CSV_FILE = "bookings.csv"
+REVIEW_ROLLUPS_CSV_FILE = "review_rollups.csv"
+# Older per-restaurant photo uploads, folded into the media catalogue
+RESTAURANT_IMAGES_CSV_FILE = "restaurant_images.csv"
+
+# --- Text Matching Helpers ---
+# Character trigrams drive typo-tolerant matching (fuzzy search, facet clean-up, geocoding).
+FUZZY_MIN_SIMILARITY = 0.5
+FACET_MERGE_MIN_SIMILARITY = 0.6
+
+def tokenize(text):
+    """Splits text into lower-case alphanumeric words of two or more characters."""
+    return [word for word in re.findall(r"[a-z0-9]+", str(text).lower()) if len(word) > 1]
+
+def trigrams(text):
+    """Returns the set of padded character trigrams of each word in the text."""
+    grams = set()
+    for word in re.findall(r"[a-z0-9]+", str(text).lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def trigram_similarity(grams_a, grams_b):
+    """Dice coefficient of two trigram sets."""
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+class TrigramIndex:
+    """Inverted index from trigram to the keys containing it, with Dice-ranked lookups."""
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.gram_counts = {}
+
+    def add(self, key, text):
+        grams = trigrams(text)
+        if key in self.gram_counts or not grams:
+            return
+        self.gram_counts[key] = len(grams)
+        for gram in grams:
+            self.postings[gram].add(key)
+
+    def search(self, text, min_similarity=FUZZY_MIN_SIMILARITY, limit=None):
+        """Returns [(key, similarity)] for keys sharing enough trigrams, best first."""
+        query_grams = trigrams(text)
+        shared_counts = defaultdict(int)
+        for gram in query_grams:
+            for key in self.postings.get(gram, ()):
+                shared_counts[key] += 1
+        matches = [
+            (key, 2 * shared / (len(query_grams) + self.gram_counts[key]))
+            for key, shared in shared_counts.items()
+        ]
+        matches = sorted((match for match in matches if match[1] >= min_similarity), key=lambda match: -match[1])
+        return matches[:limit] if limit else matches
+
+def facet_similarity(value_a, value_b):
+    """
+    Similarity of two facet values: the better of the whole-value score and the score of
+    the shorter value against any single word of the longer one (so 'demsey' scores well
+    against 'Dempsey Hill').
+    """
+    shorter, longer = sorted([value_a, value_b], key=len)
+    best = trigram_similarity(trigrams(value_a), trigrams(value_b))
+    if len(tokenize(shorter)) == 1:
+        shorter_grams = trigrams(shorter)
+        for word in tokenize(longer):
+            best = max(best, trigram_similarity(shorter_grams, trigrams(word)))
+    return best
 
 # --- Utility Function to ensure DataFrame schema is correct ---
 def validate_and_update_dataframe(df):
     """
-    Checks for the presence of 'Private Room' and 'Max Capacity' columns
-    and adds them with default values if they are missing.
+    Checks for the presence of 'ID', 'Private Room', 'Max Capacity', 'Latitude' and
+    'Longitude' columns and adds them with default values if they are missing.
     """
+    # Every restaurant needs a stable integer ID; rows without one get the next free IDs
+    if 'ID' not in df.columns:
+        df['ID'] = np.nan
+    df['ID'] = pd.to_numeric(df['ID'], errors='coerce')
+    missing_ids = df['ID'].isna()
+    if missing_ids.any():
+        next_id = int(df['ID'].max()) + 1 if df['ID'].notna().any() else 1
+        df.loc[missing_ids, 'ID'] = np.arange(next_id, next_id + missing_ids.sum())
+    df['ID'] = df['ID'].astype(np.int64)
     if 'Private Room' not in df.columns:
         df['Private Room'] = 'No'
     if 'Max Capacity' not in df.columns:
         df['Max Capacity'] = np.nan
     # Ensure 'Max Capacity' is of numeric type for filtering
     df['Max Capacity'] = pd.to_numeric(df['Max Capacity'], errors='coerce')
+    # Coordinates come from the offline gazetteer; only rows without them are geocoded
+    for column in ['Latitude', 'Longitude']:
+        if column not in df.columns:
+            df[column] = np.nan
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    if {'Location', 'Address'} <= set(df.columns):
+        for idx in df.index[df['Latitude'].isna() | df['Longitude'].isna()]:
+            coordinates = geocode_restaurant(df.at[idx, 'Location'], df.at[idx, 'Address'])
+            if coordinates:
+                df.loc[idx, ['Latitude', 'Longitude']] = coordinates
     return df
 
+def resolve_uploaded_restaurant_ids(df_uploaded, stored_restaurants):
+    """
+    Gives the rows of an uploaded restaurant CSV IDs that can never point at another
+    restaurant's stored data. A row keeps its ID only if the stored restaurant with that ID
+    has the same name; otherwise it takes the ID of the stored restaurant with its name.
+    Rows matching no stored restaurant get negative IDs, which stored data never uses, so
+    their cards start empty and writes against them are refused.
+    """
+    def name_key(name):
+        return str(name).strip().casefold() if pd.notna(name) else None
+
+    stored_name_by_id = {int(restaurant_id): name_key(name) for restaurant_id, name in zip(stored_restaurants['ID'], stored_restaurants['Name'])}
+    stored_id_by_name = {name_key(name): int(restaurant_id) for restaurant_id, name in zip(stored_restaurants['ID'], stored_restaurants['Name'])}
+    uploaded_ids = pd.to_numeric(df_uploaded['ID'], errors='coerce') if 'ID' in df_uploaded.columns else pd.Series(np.nan, index=df_uploaded.index)
+    names = df_uploaded['Name'] if 'Name' in df_uploaded.columns else pd.Series(None, index=df_uploaded.index)
+
+    resolved_ids, used_ids, next_upload_id = [], set(), -1
+    for uploaded_id, name in zip(uploaded_ids, names):
+        key = name_key(name)
+        restaurant_id = None
+        if pd.notna(uploaded_id) and key is not None and stored_name_by_id.get(int(uploaded_id)) == key:
+            restaurant_id = int(uploaded_id)
+        elif key in stored_id_by_name:
+            restaurant_id = stored_id_by_name[key]
+        if restaurant_id is None or restaurant_id in used_ids:
+            restaurant_id, next_upload_id = next_upload_id, next_upload_id - 1
+        used_ids.add(restaurant_id)
+        resolved_ids.append(restaurant_id)
+    df_uploaded['ID'] = np.array(resolved_ids, dtype=np.int64)
+    return df_uploaded
+
+def is_uploaded_only_restaurant(restaurant_id):
+    """True for the negative IDs given to uploaded rows that match no stored restaurant."""
+    return pd.notna(restaurant_id) and int(restaurant_id) < 0
+
+# --- Offline Geocoding ---
+# Restaurants are placed on the map with a bundled gazetteer of Singapore areas and postal
+# districts (data/sg_gazetteer.csv), so no network geocoding service is needed. The
+# Location field is matched against area names (exactly, then fuzzily, so 'Demsey' still
+# lands in Dempsey Hill); failing that, an area named in the Address or the district of its
+# 6-digit postcode is used. Coordinates are area/district centroids, not exact addresses.
+GAZETTEER_CSV_FILE = os.path.join("data", "sg_gazetteer.csv")
+POSTCODE_PATTERN = re.compile(r"(?<!\d)(\d{6})(?!\d)")
+
+@st.cache_resource
+def load_gazetteer():
+    """
+    Loads the gazetteer into lookup tables: area name -> coordinates, postal sector (the
+    first two digits of a postcode) -> district coordinates, and a trigram index over the
+    area names for fuzzy matches.
+    """
+    gazetteer_df = pd.read_csv(GAZETTEER_CSV_FILE, dtype={"postal_sectors": str})
+    areas = gazetteer_df[gazetteer_df['kind'] == 'area']
+    area_coordinates = {
+        name: (float(lat), float(lon))
+        for name, lat, lon in zip(areas['name'], areas['latitude'], areas['longitude'])
+    }
+    area_index = TrigramIndex()
+    for name in area_coordinates:
+        area_index.add(name, name)
+    sector_coordinates = {}
+    for _, district in gazetteer_df[gazetteer_df['kind'] == 'district'].iterrows():
+        for sector in str(district['postal_sectors']).split():
+            sector_coordinates[sector] = (float(district['latitude']), float(district['longitude']))
+    return {
+        "areas": area_coordinates,
+        "areas_by_lower_name": {name.lower(): name for name in area_coordinates},
+        "area_index": area_index,
+        "sectors": sector_coordinates,
+    }
+
+def match_gazetteer_area(place):
+    """Returns the gazetteer area name for a place name, matching exactly or fuzzily, or None."""
+    if pd.isna(place) or not str(place).strip():
+        return None
+    gazetteer = load_gazetteer()
+    place = str(place).strip()
+    exact = gazetteer["areas_by_lower_name"].get(place.lower())
+    if exact:
+        return exact
+    candidates = [name for name, _ in gazetteer["area_index"].search(place, min_similarity=0.2, limit=10)]
+    scored = [(facet_similarity(place, name), name) for name in candidates]
+    scored = [match for match in scored if match[0] >= FACET_MERGE_MIN_SIMILARITY]
+    return max(scored)[1] if scored else None
+
+def geocode_restaurant(location, address):
+    """
+    Returns (latitude, longitude) for a restaurant from its Location and Address, or None
+    if neither can be resolved from the gazetteer.
+    """
+    gazetteer = load_gazetteer()
+    area = match_gazetteer_area(location)
+    if area:
+        return gazetteer["areas"][area]
+    address = "" if pd.isna(address) else str(address)
+    address_lower = address.lower()
+    for lower_name, name in gazetteer["areas_by_lower_name"].items():
+        if re.search(rf"\b{re.escape(lower_name)}\b", address_lower):
+            return gazetteer["areas"][name]
+    for postcode in POSTCODE_PATTERN.findall(address):
+        if postcode[:2] in gazetteer["sectors"]:
+            return gazetteer["sectors"][postcode[:2]]
+    return None
+
+# --- Media Storage Configuration ---
+# Uploaded images and menu files are stored once on disk under a content-hashed name
+# (<sha256>.<ext>) and referenced from the CSVs by that key. Because a key never changes
+# for a given set of bytes, browsers may cache each file indefinitely and reruns only
+# carry URLs. By default the files come from Streamlit's static folder
+# (/app/static/media/, see .streamlit/config.toml), which works wherever the app does but
+# sends no long-lived caching headers. A small dedicated endpoint that sends immutable
+# Cache-Control headers and ETags is opt-in: MEDIA_SERVER_PORT starts it, bound to
+# MEDIA_SERVER_HOST (loopback unless configured otherwise), and MEDIA_BASE_URL is the URL
+# browsers reach it at (e.g. through a reverse proxy). With only the port set, plain-HTTP
+# pages use that port on the host the browser used to reach the app. Nothing checks that
+# the endpoint is reachable from the browser; the static folder is used only when the
+# endpoint is not configured, cannot bind its port, or would be plain HTTP on an HTTPS page.
+MEDIA_DIR = os.path.join("static", "media")
+MEDIA_URL_PREFIX = "/app/static/media/"
+MEDIA_SERVER_PORT = os.environ.get("MEDIA_SERVER_PORT")
+MEDIA_SERVER_HOST = os.environ.get("MEDIA_SERVER_HOST", "127.0.0.1")
+MEDIA_BASE_URL = os.environ.get("MEDIA_BASE_URL")
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_KEY_PATTERN = re.compile(r"([0-9a-f]{64})\.[a-z0-9]+")
+MEDIA_REFERENCE_PREFIX = "media:"
+PLACEHOLDER_IMAGE_URL = "https://placehold.co/1600x900/CCCCCC/000000?text=Image+Not+Available"
+MEDIA_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "application/pdf": ".pdf",
+}
+
+def store_media_bytes(file_bytes, file_type):
+    """
+    Writes the bytes to the media folder under their content hash and returns the media key.
+    Identical uploads share one file, and an existing file is never rewritten.
+    """
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    extension = MEDIA_EXTENSIONS.get(file_type) or mimetypes.guess_extension(file_type or "") or ".bin"
+    media_key = f"{digest}{extension}"
+    media_path = os.path.join(MEDIA_DIR, media_key)
+    if not os.path.exists(media_path):
+        os.makedirs(MEDIA_DIR, exist_ok=True)
+        temp_path = f"{media_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as media_file:
+            media_file.write(file_bytes)
+        os.replace(temp_path, media_path)
+    return media_key
+
+def media_base_url():
+    """
+    Returns the dedicated media endpoint's base URL as the browser should see it, or None
+    when media has to come from Streamlit's static folder instead.
+    """
+    if MEDIA_SERVER_PORT and start_media_server(MEDIA_SERVER_HOST, MEDIA_SERVER_PORT) is None:
+        return None
+    if MEDIA_BASE_URL:
+        return MEDIA_BASE_URL.rstrip("/")
+    if not MEDIA_SERVER_PORT:
+        return None
+    try:
+        app_url = urlsplit(st.context.url or "")
+    except Exception:
+        return None
+    # A plain-HTTP endpoint cannot be used from an HTTPS page (mixed content)
+    if app_url.scheme != "http" or not app_url.hostname:
+        return None
+    host = f"[{app_url.hostname}]" if ":" in app_url.hostname else app_url.hostname
+    return f"http://{host}:{MEDIA_SERVER_PORT}"
+
+def media_url(media_key):
+    """Returns the stable, cacheable URL for a stored media key."""
+    base_url = media_base_url()
+    if base_url:
+        return f"{base_url}/media/{media_key}"
+    return f"{MEDIA_URL_PREFIX}{media_key}"
+
+def parse_data_uri(value):
+    """Splits a 'data:<type>;base64,<payload>' string into (file_type, bytes), or returns None."""
+    match = re.match(r"data:([^;,]+);base64,(.*)", value, re.DOTALL)
+    if not match:
+        return None
+    return match.group(1), base64.b64decode(match.group(2))
+
+def media_record_url(record):
+    """
+    Returns the URL for a media catalogue or menu record. Rows that still carry inline base64
+    data (e.g. appended by an older version of the app) are moved to the media folder first.
+    """
+    media_key = record.get('media_key')
+    if isinstance(media_key, str) and media_key:
+        return media_url(media_key)
+    url = record.get('url')
+    if isinstance(url, str) and url:
+        return url
+    base64_data = record.get('base64_data')
+    if isinstance(base64_data, str) and base64_data:
+        return media_url(store_media_bytes(base64.b64decode(base64_data), record.get('file_type')))
+    return PLACEHOLDER_IMAGE_URL
+
+# Every restaurant image (cover and gallery photos) lives in one partitioned media table,
+# ordered per restaurant by position, with at most one row flagged as the cover.
+MEDIA_CATALOGUE_COLUMNS = [
+    "restaurant_id", "restaurant_name", "position", "is_cover", "media_type",
+    "file_name", "file_type", "media_key", "url", "timestamp"
+]
+
+def is_placeholder_image(image):
+    """True for the generic 'Image Not Available' placeholder stored for restaurants without a photo."""
+    return isinstance(image, str) and "text=Image+Not+Available" in image
+
+def cover_media_row(restaurant_id, restaurant_name, image):
+    """
+    Returns the media catalogue row for a restaurant's Image value (a media reference or a
+    link), or None when it has no real image.
+    """
+    if not isinstance(image, str) or not image or is_placeholder_image(image):
+        return None
+    is_stored = image.startswith(MEDIA_REFERENCE_PREFIX)
+    return {
+        "restaurant_id": int(restaurant_id),
+        "restaurant_name": restaurant_name,
+        "position": 0,
+        "is_cover": True,
+        "media_type": "image",
+        "file_name": None,
+        "file_type": mimetypes.guess_type(image)[0] if is_stored else None,
+        "media_key": image[len(MEDIA_REFERENCE_PREFIX):] if is_stored else None,
+        "url": None if is_stored else image,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serves /media/<key> from the media folder with immutable caching headers and ETags."""
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        match = MEDIA_KEY_PATTERN.fullmatch(path[len("/media/"):]) if path.startswith("/media/") else None
+        media_path = os.path.join(MEDIA_DIR, match.group(0)) if match else None
+        if media_path is None or not os.path.isfile(media_path):
+            self.send_error(404, "Media not found")
+            return
+
+        # The file name is the content hash, so it doubles as a strong ETag
+        etag = f'"{match.group(1)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", MEDIA_CACHE_CONTROL)
+            self.end_headers()
+            return
+
+        with open(media_path, "rb") as media_file:
+            body = media_file.read()
+        self.send_response(200)
+        self.send_header("Content-Type", mimetypes.guess_type(media_path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", MEDIA_CACHE_CONTROL)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep the Streamlit console free of per-request access logs
+        pass
+
+@st.cache_resource
+def start_media_server(host, port):
+    """
+    Starts the dedicated media endpoint once per process, in a daemon thread. Returns None
+    if the port cannot be bound, in which case media falls back to the static folder.
+    """
+    try:
+        server = ThreadingHTTPServer((host, int(port)), MediaRequestHandler)
+    except (OSError, ValueError):
+        return None
+    threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+    return server
+
+# --- Upload Ingestion Pipeline ---
+# Uploads are streamed in fixed-size chunks straight into the media folder instead of
+# being copied whole (getvalue) and base64-encoded. Hashing, validation and image checks
+# run on a shared worker pool. Streamlit has already received each upload in full by the
+# time the script sees it, so the memory budget cannot stop those bytes arriving; what it
+# caps is the total size of the uploads being ingested at once (each reserves its whole
+# size until its job ends), so a burst of uploads waits instead of multiplying the memory
+# held by ingestion and image decoding.
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_MEMORY_BUDGET_BYTES = 64 * UPLOAD_CHUNK_BYTES
+UPLOAD_BUDGET_WAIT_SECONDS = 30
+UPLOAD_WORKERS = 4
+# Largest decoded image we are willing to verify (guards against decompression bombs)
+MAX_IMAGE_PIXELS = 50_000_000
+MAX_UPLOAD_BYTES = {
+    "image/jpeg": 10 * 1024 * 1024,
+    "image/png": 10 * 1024 * 1024,
+    "application/pdf": 25 * 1024 * 1024,
+}
+# Leading bytes each accepted MIME type must start with
+UPLOAD_MAGIC_BYTES = {
+    "image/jpeg": [b"\xff\xd8\xff"],
+    "image/png": [b"\x89PNG\r\n\x1a\n"],
+    "application/pdf": [b"%PDF-"],
+}
+
+class MemoryBudget:
+    """Counting limit on the bytes held in upload buffers across every session."""
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.in_use_bytes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size, timeout=None):
+        """Reserves `size` bytes, waiting for space; returns False if none frees up in time."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.in_use_bytes + size <= self.limit_bytes, timeout):
+                return False
+            self.in_use_bytes += size
+            return True
+
+    def release(self, size):
+        with self.condition:
+            self.in_use_bytes -= size
+            self.condition.notify_all()
+
+class UploadJob:
+    """Progress of one upload through the ingestion pool."""
+
+    def __init__(self, file_name, file_type, total_bytes):
+        self.file_name = file_name
+        self.file_type = file_type
+        self.total_bytes = total_bytes
+        self.bytes_done = 0
+        self.stage = "Queued"
+        self.future = None
+        self.perceptual_hash = None
+        # Set whenever the job moves on, so the progress display waits instead of polling
+        self.changed = threading.Event()
+
+    def advance(self, stage):
+        self.stage = stage
+        self.changed.set()
+
+    @property
+    def progress(self):
+        return min(self.bytes_done / self.total_bytes, 1.0) if self.total_bytes else 0.0
+
+@st.cache_resource
+def get_ingestion_pool():
+    """Returns the shared upload worker pool and memory budget."""
+    return {
+        "executor": ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload-ingest"),
+        "budget": MemoryBudget(UPLOAD_MEMORY_BUDGET_BYTES),
+        "active_jobs": set(),
+        "lock": threading.Lock(),
+    }
+
+def validate_upload(file_type, total_bytes, allowed_types):
+    """Checks the claimed MIME type and size before any bytes are read."""
+    if file_type not in allowed_types or file_type not in MAX_UPLOAD_BYTES:
+        raise ValueError(f"Files of type '{file_type}' are not accepted here.")
+    if total_bytes == 0:
+        raise ValueError("The uploaded file is empty.")
+    if total_bytes > MAX_UPLOAD_BYTES[file_type]:
+        raise ValueError(f"The file is larger than the {MAX_UPLOAD_BYTES[file_type] // (1024 * 1024)} MB limit for {file_type}.")
+
+def ingest_upload_worker(job, uploaded_file):
+    """
+    Runs on the ingestion pool: streams the upload into the media folder chunk by chunk,
+    checking the magic bytes against the claimed type and hashing as it goes, then
+    verifies images with Pillow. Returns the media key.
+    """
+    pool = get_ingestion_pool()
+    digest = hashlib.sha256()
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    temp_path = os.path.join(MEDIA_DIR, f"upload-{threading.get_ident()}-{id(job)}.tmp")
+    try:
+        job.advance("Uploading")
+        uploaded_file.seek(0)
+        with open(temp_path, "wb") as media_file:
+            while True:
+                chunk = uploaded_file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if job.bytes_done == 0 and not any(chunk.startswith(magic) for magic in UPLOAD_MAGIC_BYTES[job.file_type]):
+                    raise ValueError(f"The file content does not match its declared type ({job.file_type}).")
+                digest.update(chunk)
+                media_file.write(chunk)
+                job.bytes_done += len(chunk)
+                job.changed.set()
+                if job.bytes_done > MAX_UPLOAD_BYTES[job.file_type]:
+                    raise ValueError("The file grew beyond the upload size limit.")
+
+        if job.file_type.startswith("image/"):
+            job.advance("Verifying image")
+            with Image.open(temp_path) as image:
+                if image.width * image.height > MAX_IMAGE_PIXELS:
+                    raise ValueError("The image dimensions are too large.")
+                image.verify()
+            # verify() leaves the image unusable, so reopen it for the perceptual hash
+            job.advance("Hashing image")
+            with Image.open(temp_path) as image:
+                job.perceptual_hash = difference_hash(image)
+
+        job.advance("Storing")
+        media_key = f"{digest.hexdigest()}{MEDIA_EXTENSIONS[job.file_type]}"
+        media_path = os.path.join(MEDIA_DIR, media_key)
+        if os.path.exists(media_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, media_path)
+        job.advance("Done")
+        return media_key
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        job.advance("Failed")
+        raise
+    finally:
+        with pool["lock"]:
+            pool["active_jobs"].discard(job)
+
+def submit_upload(uploaded_file, allowed_types):
+    """
+    Validates an upload's declared type and size, reserves its size in the memory budget
+    and queues it on the ingestion pool. The reservation is released when the job ends.
+    """
+    validate_upload(uploaded_file.type, uploaded_file.size, allowed_types)
+    job = UploadJob(uploaded_file.name, uploaded_file.type, uploaded_file.size)
+    pool = get_ingestion_pool()
+    budget = pool["budget"]
+    with st.spinner("Waiting for other uploads to finish..."):
+        if not budget.acquire(job.total_bytes, timeout=UPLOAD_BUDGET_WAIT_SECONDS):
+            raise ValueError("The server is busy with other uploads. Please try again shortly.")
+    with pool["lock"]:
+        pool["active_jobs"].add(job)
+    try:
+        job.future = pool["executor"].submit(ingest_upload_worker, job, uploaded_file)
+    except Exception:
+        budget.release(job.total_bytes)
+        with pool["lock"]:
+            pool["active_jobs"].discard(job)
+        raise
+    job.future.add_done_callback(lambda _: budget.release(job.total_bytes))
+    job.future.add_done_callback(lambda _: job.changed.set())
+    return job
+
+def ingest_upload_with_progress(uploaded_file, allowed_types):
+    """
+    Sends an upload through the ingestion pool while showing its progress, and returns the
+    media key. Raises ValueError with a user-facing message if the file is rejected.
+    """
+    job = submit_upload(uploaded_file, allowed_types)
+    progress_bar = st.progress(0.0, text=f"{job.stage} {job.file_name}...")
+    while not job.future.done():
+        job.changed.wait()
+        job.changed.clear()
+        progress_bar.progress(job.progress, text=f"{job.stage} {job.file_name}...")
+    progress_bar.empty()
+    media_key = job.future.result()
+    if job.perceptual_hash is not None:
+        get_image_hash_index().remember_media_hash(media_key, job.perceptual_hash)
+    return media_key
+
 # --- Initialize CSV files and ensure they have the correct schema ---
 def initialize_csv_files():
     """
-    Initializes the restaurants.csv, reviews.csv, menus.csv, and gallery_images.csv files with headers.
+    Initializes the restaurants.csv, reviews.csv, menus.csv, gallery_images.csv and bookings.csv files with headers.
     If the files exist, it checks and adds new columns to avoid KeyErrors.
     """
     # Restaurant data initialization
     if not os.path.exists(RESTAURANTS_CSV_FILE):
         empty_df = pd.DataFrame(columns=[
-            "Name", "Cuisine", "Location", "Rating", "Price Range",
+            "ID", "Name", "Cuisine", "Location", "Rating", "Price Range",
             "Description", "Image", "Address", "Private Room", "Max Capacity"
         ])
         empty_df.to_csv(RESTAURANTS_CSV_FILE, index=False)
@@ -48,7 +631,7 @@ def initialize_csv_files():
     # Reviews data initialization
     if not os.path.exists(REVIEWS_CSV_FILE):
         initial_reviews_df = pd.DataFrame(columns=[
-            "restaurant_name", "rating", "review_text",
+            "restaurant_id", "restaurant_name", "rating", "review_text",
             "reviewer_name", "reviewer_department", "reviewer_designation",
             "timestamp"
         ])
@@ -57,53 +640,879 @@ def initialize_csv_files():
     # Menus data initialization with new columns for file uploads
     if not os.path.exists(MENUS_CSV_FILE):
         initial_menus_df = pd.DataFrame(columns=[
-            "restaurant_name", "file_name", "file_type", "base64_data", "timestamp"
+            "restaurant_id", "restaurant_name", "menu_name", "menu_description", "menu_price",
+            "file_name", "file_type", "base64_data", "media_key", "timestamp"
         ])
         initial_menus_df.to_csv(MENUS_CSV_FILE, index=False)
         
     # Gallery data initialization
     if not os.path.exists(GALLERY_CSV_FILE):
         initial_gallery_df = pd.DataFrame(columns=[
-            "restaurant_name", "file_name", "file_type", "base64_data", "timestamp"
+            "restaurant_id", "restaurant_name", "file_name", "file_type", "base64_data", "media_key", "timestamp"
         ])
         initial_gallery_df.to_csv(GALLERY_CSV_FILE, index=False)
 
+    # Private room bookings initialization
+    if not os.path.exists(BOOKINGS_CSV_FILE):
+        initial_bookings_df = pd.DataFrame(columns=[
+            "booking_id", "restaurant_id", "restaurant_name", "room", "start", "end",
+            "party_size", "booked_by", "timestamp"
+        ])
+        initial_bookings_df.to_csv(BOOKINGS_CSV_FILE, index=False)
+
+# --- Partitioned Storage ---
+# Restaurants, reviews, menus and media rows are stored in one CSV per location
+# partition (data/partitions/<table>/<partition>.csv), where a restaurant's partition is
+# its slugged Location and child rows follow their restaurant. A small manifest lists the
+# partitions, the locations in each, row counts and the restaurant ID -> partition map, so
+# a location-filtered view reads one file per table and the "All" view reads partitions
+# in parallel. The flat CSVs above are only the seed for the one-off partitioning pass.
+PARTITIONS_DIR = os.path.join("data", "partitions")
+PARTITION_MANIFEST_FILE = os.path.join(PARTITIONS_DIR, "manifest.json")
+PARTITIONED_TABLES = ["restaurants", "reviews", "menus", "media"]
+PARTITION_LOAD_WORKERS = 8
+UNASSIGNED_PARTITION = "unassigned"
+
+def partition_for_location(location):
+    """Maps a Location to its partition name, folding case and punctuation ('Orchard' == 'orchard')."""
+    if location is None or pd.isna(location):
+        return UNASSIGNED_PARTITION
+    return re.sub(r"[^a-z0-9]+", "-", str(location).lower()).strip("-") or UNASSIGNED_PARTITION
+
+def partition_file(table, partition):
+    return os.path.join(PARTITIONS_DIR, table, f"{partition}.csv")
+
+def write_csv_atomically(table_df, csv_file):
+    """Writes a CSV next to its destination and swaps it in, so readers never see a partial file."""
+    temp_file = f"{csv_file}.tmp"
+    table_df.to_csv(temp_file, index=False)
+    os.replace(temp_file, csv_file)
+
+def file_version(csv_file):
+    """
+    Returns (mtime_ns, size, inode) for a file, used as a cache key. Each atomic write
+    swaps in a new inode, so two writes within one mtime tick still change the key.
+    """
+    stat = os.stat(csv_file)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def write_partition_manifest(manifest):
+    temp_file = f"{PARTITION_MANIFEST_FILE}.tmp"
+    with open(temp_file, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(temp_file, PARTITION_MANIFEST_FILE)
+
+@st.cache_data(show_spinner=False)
+def read_partition_manifest(version):
+    with open(PARTITION_MANIFEST_FILE) as manifest_file:
+        return json.load(manifest_file)
+
+def get_partition_manifest():
+    """Returns the current partition manifest (re-read only after the writer replaces it)."""
+    return read_partition_manifest(file_version(PARTITION_MANIFEST_FILE))
+
+def partitions_for_location_filter(location_filter):
+    """Returns the partitions a location filter needs: one for a location, all for 'All'."""
+    manifest = get_partition_manifest()
+    if location_filter in (None, "All"):
+        return sorted(manifest["partitions"])
+    partition = partition_for_location(location_filter)
+    return [partition] if partition in manifest["partitions"] else []
+
+def partition_locations():
+    """Returns every Location value across the partitions, for the location filter."""
+    manifest = get_partition_manifest()
+    return sorted({location for partition in manifest["partitions"].values() for location in partition["locations"]})
+
+def restaurant_partition(restaurant_id):
+    """Returns the partition holding a restaurant and its child rows."""
+    return get_partition_manifest()["restaurant_partitions"].get(str(int(restaurant_id)), UNASSIGNED_PARTITION)
+
+def partition_versions(table, partitions):
+    """Returns ((partition, file version), ...) for the existing partition files; used as a cache key."""
+    versions = []
+    for partition in partitions:
+        csv_file = partition_file(table, partition)
+        if os.path.exists(csv_file):
+            versions.append((partition, file_version(csv_file)))
+    return tuple(versions)
+
+@st.cache_resource
+def get_partition_pool():
+    """Thread pool used to read several partition files at once."""
+    return ThreadPoolExecutor(max_workers=PARTITION_LOAD_WORKERS, thread_name_prefix="partition-loader")
+
+@st.cache_data(show_spinner=False)
+def load_partitions(table, versions):
+    """
+    Reads and concatenates the given partitions of a table. `versions` comes from
+    partition_versions(), so a partition rewritten by the writer misses the cache.
+    """
+    csv_files = [partition_file(table, partition) for partition, _ in versions]
+    if len(csv_files) > 1:
+        frames = list(get_partition_pool().map(pd.read_csv, csv_files))
+    else:
+        frames = [pd.read_csv(csv_file) for csv_file in csv_files]
+    if not frames:
+        return pd.DataFrame(columns=get_partition_manifest()["columns"][table])
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+def load_table(table, partitions=None):
+    """Reads a partitioned table, limited to `partitions` if given."""
+    if partitions is None:
+        partitions = sorted(get_partition_manifest()["partitions"])
+    return load_partitions(table, partition_versions(table, partitions))
+
+def row_partitions(table, table_df, restaurant_partitions):
+    """Returns each row's partition: by Location for restaurants, by restaurant for child rows."""
+    if table == "restaurants":
+        return table_df['Location'].map(partition_for_location)
+    restaurant_ids = pd.to_numeric(table_df['restaurant_id'], errors='coerce')
+    return restaurant_ids.map(lambda restaurant_id: UNASSIGNED_PARTITION if pd.isna(restaurant_id) else restaurant_partitions.get(str(int(restaurant_id)), UNASSIGNED_PARTITION))
+
+def mutation_partitions(table, mutation, manifest):
+    """Returns the partitions a mutation can touch, or None if it may touch any of them."""
+    restaurant_partitions = manifest["restaurant_partitions"]
+    if mutation["op"] == "append":
+        row = mutation["row"]
+        if table == "restaurants":
+            return {partition_for_location(row.get("Location"))}
+        return {restaurant_partitions.get(str(int(row["restaurant_id"])), UNASSIGNED_PARTITION)}
+    column, value = mutation["match"]
+    if column != ("ID" if table == "restaurants" else "restaurant_id"):
+        return None
+    partitions = {restaurant_partitions.get(str(int(value)), UNASSIGNED_PARTITION)}
+    if table == "restaurants" and "Location" in mutation.get("values", {}):
+        # A relocated restaurant is written to its new partition
+        partitions.add(partition_for_location(mutation["values"]["Location"]))
+    return partitions
+
+def commit_partitioned_table(table, mutations, manifest, moved_restaurant_ids=None, staged=None):
+    """
+    Applies a table's mutations to the partitions they touch and rewrites only those
+    files. Restaurants moved or deleted earlier in the same batch (moved_restaurant_ids,
+    with their old partitions) have their child rows read from the old partition. Updates
+    the manifest in place and returns {restaurant ID: old partition} for restaurants that
+    changed partition or were deleted. With a `staged` list, the new partition files are
+    appended to it as (DataFrame, path) instead of being written.
+    """
+    touched = set()
+    for mutation in mutations:
+        partitions = mutation_partitions(table, mutation, manifest)
+        touched |= set(manifest["partitions"]) if partitions is None else partitions
+    for restaurant_id, old_partition in (moved_restaurant_ids or {}).items():
+        touched.add(old_partition)
+        if str(restaurant_id) in manifest["restaurant_partitions"]:
+            touched.add(manifest["restaurant_partitions"][str(restaurant_id)])
+
+    def read_touched(partitions):
+        return [pd.read_csv(partition_file(table, partition)) for partition in sorted(partitions) if os.path.exists(partition_file(table, partition))]
+
+    frames = read_touched(touched)
+    table_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=manifest["columns"][table])
+    for mutation in mutations:
+        table_df = apply_mutation(table_df, mutation)
+
+    moved = {}
+    if table == "restaurants":
+        old_partitions = {rid: partition for rid, partition in manifest["restaurant_partitions"].items()}
+        for partition in touched:
+            for restaurant_id in [rid for rid, p in manifest["restaurant_partitions"].items() if p == partition]:
+                del manifest["restaurant_partitions"][restaurant_id]
+        for restaurant_id, partition in zip(table_df['ID'], row_partitions(table, table_df, {})):
+            manifest["restaurant_partitions"][str(int(restaurant_id))] = partition
+        for restaurant_id, previous in old_partitions.items():
+            if manifest["restaurant_partitions"].get(restaurant_id) != previous:
+                moved[int(restaurant_id)] = previous
+
+    assigned = row_partitions(table, table_df, manifest["restaurant_partitions"])
+    # Rows can only land in partitions that were read, but never overwrite one that was not
+    unread = set(assigned.unique()) - touched
+    if unread and read_touched(unread):
+        table_df = pd.concat([table_df, *read_touched(unread)], ignore_index=True)
+        assigned = row_partitions(table, table_df, manifest["restaurant_partitions"])
+        touched |= unread
+    write_table_partitions(table, table_df, assigned, touched, manifest, staged)
+    return moved
+
+def write_table_partitions(table, table_df, assigned, partitions, manifest, staged=None):
+    """Writes the rows assigned to each of `partitions` to its file and records it in the manifest."""
+    os.makedirs(os.path.join(PARTITIONS_DIR, table), exist_ok=True)
+    for partition in sorted(partitions):
+        partition_df = table_df[(assigned == partition).to_numpy()]
+        if staged is None:
+            write_csv_atomically(partition_df, partition_file(table, partition))
+        else:
+            staged.append((partition_df, partition_file(table, partition)))
+        entry = manifest["partitions"].setdefault(partition, {"locations": [], "rows": {}})
+        entry["rows"][table] = int(len(partition_df))
+        if table == "restaurants":
+            entry["locations"] = sorted(partition_df['Location'].dropna().astype(str).unique().tolist())
+    manifest["columns"][table] = list(dict.fromkeys([*manifest["columns"].get(table, []), *table_df.columns]))
+
+# --- Write-Behind Queue ---
+# Form submissions do not rewrite CSVs inside the user's script run. Each write is queued
+# as one or more mutations and a single background thread commits them in batches, so a
+# burst of writes to the same table costs one read and one rewrite of each file it touches.
+# Tables kept in flat files; the partitioned tables are written under PARTITIONS_DIR
+TABLE_FILES = {
+    "bookings": BOOKINGS_CSV_FILE,
+    "review_rollups": REVIEW_ROLLUPS_CSV_FILE,
+}
+WRITE_BATCH_WINDOW_SECONDS = 0.05
+WRITE_BATCH_MAX_WRITES = 200
+# Failed writes are remembered (by sequence number) long enough for their sessions to see the error
+FAILED_WRITES_KEPT = 1000
+
+def apply_mutation(table_df, mutation):
+    """
+    Applies one queued mutation to a table and returns the updated table. Mutations are
+    plain dicts: {"op": "append", "row": {...}}, {"op": "update"/"delete",
+    "match": (column, value)} with "values" for updates, or {"op": "increment",
+    "key": {...}, "values": {...}}, which adds to the counters of the row matching every
+    key column, appending the row if there is none.
+    """
+    op = mutation["op"]
+    if op == "append":
+        new_row = pd.DataFrame([mutation["row"]])
+        return new_row if table_df.empty else pd.concat([table_df, new_row], ignore_index=True)
+    if op == "increment":
+        matches = pd.Series(True, index=table_df.index)
+        for column, value in mutation["key"].items():
+            matches &= table_df[column] == value
+        if not matches.any():
+            return apply_mutation(table_df, {"op": "append", "row": {**mutation["key"], **mutation["values"]}})
+        table_df = table_df.copy()
+        for column, amount in mutation["values"].items():
+            table_df.loc[matches, column] = table_df.loc[matches, column] + amount
+        return table_df
+    column, value = mutation["match"]
+    matches = table_df[column] == value
+    if op == "update":
+        table_df = table_df.copy()
+        for key, new_value in mutation["values"].items():
+            if key not in table_df.columns:
+                table_df[key] = None
+            elif isinstance(new_value, str) and table_df[key].dtype != object:
+                # An all-blank column is read back as float; widen it before storing text
+                table_df[key] = table_df[key].astype(object)
+            table_df.loc[matches, key] = new_value
+        return table_df
+    if op == "delete":
+        return table_df[~matches].reset_index(drop=True)
+    raise ValueError(f"Unknown write operation: {op}")
+
+class WriteBehindQueue:
+    """
+    Background CSV writer shared by every session. submit() returns a sequence number
+    immediately; the writer thread drains the queue in batches (group commit), applies
+    each batch's mutations table by table and atomically replaces each touched file once.
+    A batch is applied in memory before any file is replaced; if that fails, its writes
+    are applied one at a time so only the offending write fails.
+
+    In-memory indexes registered with track_index() are patched as writes are submitted.
+    When a write fails, they are rebuilt from the committed files and the writes still
+    queued are replayed into them, so they never keep a change that was not saved.
+    """
+
+    def __init__(self):
+        self.pending = queue.Queue()
+        # Re-entrant, so a caller can hold it across a check and the submit() it leads to
+        self.lock = threading.RLock()
+        self.last_seq = 0
+        self.committed_seq = 0
+        self.failed_writes = OrderedDict()
+        self.outstanding = OrderedDict()
+        self.indexes = []
+        # Indexes a write could not be patched into; rebuilt once that write's batch is committed
+        self.stale_indexes = []
+        self.committing = False
+        self.batches_committed = 0
+        self.writes_committed = 0
+        self.last_commit_at = None
+        self.last_error = None
+        self.last_restaurant_id = 0
+        # Signalled after every commit, for submitters waiting for queue space
+        self.capacity = threading.Condition(self.lock)
+        self.thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, mutations):
+        """Queues a list of mutations that belong to one logical write and returns its sequence number."""
+        with self.lock:
+            self.last_seq += 1
+            seq = self.last_seq
+            # Enqueue under the lock so the queue order always matches sequence order
+            self.pending.put((seq, mutations))
+            self.outstanding[seq] = mutations
+            for index in self.indexes:
+                try:
+                    index.apply_writes(seq, mutations)
+                except Exception:
+                    if index not in self.stale_indexes:
+                        self.stale_indexes.append(index)
+        return seq
+
+    def track_index(self, build_index):
+        """
+        Builds a process-wide index from the committed files, replays the writes still
+        queued into it and registers it for patching by later writes. Returns the index.
+        """
+        with self.capacity:
+            # The committed files must not change between the build and the replay
+            self.capacity.wait_for(lambda: not self.committing)
+            index = build_index()
+            self._replay_outstanding(index)
+            self.indexes.append(index)
+        return index
+
+    def refresh_index(self, index):
+        """Rebuilds a registered index from the committed files and replays the writes still queued."""
+        with self.capacity:
+            self.capacity.wait_for(lambda: not self.committing)
+            index.rebuild()
+            self._replay_outstanding(index)
+
+    def _replay_outstanding(self, index):
+        for seq, mutations in self.outstanding.items():
+            try:
+                index.apply_writes(seq, mutations)
+            except Exception:
+                # Picked up by the rebuild after that write's batch is committed
+                if index not in self.stale_indexes:
+                    self.stale_indexes.append(index)
+
+    def wait_for_capacity(self, max_depth, timeout):
+        """Blocks until fewer than max_depth writes are outstanding; returns False on timeout."""
+        with self.capacity:
+            return self.capacity.wait_for(lambda: self.last_seq - self.committed_seq < max_depth, timeout)
+
+    def allocate_restaurant_id(self, current_max_id):
+        """Hands out restaurant IDs so concurrent sessions never queue the same one."""
+        with self.lock:
+            self.last_restaurant_id = max(self.last_restaurant_id, int(current_max_id)) + 1
+            return self.last_restaurant_id
+
+    def status(self):
+        """Returns queue depth and durability counters for display."""
+        with self.lock:
+            return {
+                "queue_depth": self.last_seq - self.committed_seq,
+                "committed_seq": self.committed_seq,
+                "last_seq": self.last_seq,
+                "batches_committed": self.batches_committed,
+                "writes_committed": self.writes_committed,
+                "last_commit_at": self.last_commit_at,
+                "last_error": self.last_error,
+            }
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + WRITE_BATCH_WINDOW_SECONDS
+            while len(batch) < WRITE_BATCH_MAX_WRITES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    @staticmethod
+    def _stage(batch):
+        """
+        Applies a batch's mutations in memory, table by table, and returns the files to
+        replace as ([(DataFrame, path)], manifest or None) without writing anything.
+        """
+        mutations_by_table = {}
+        for _, mutations in batch:
+            for mutation in mutations:
+                mutations_by_table.setdefault(mutation["table"], []).append(mutation)
+
+        staged, manifest = [], None
+        # Partitioned tables: restaurants first, so child rows follow relocated restaurants
+        if any(table in mutations_by_table for table in PARTITIONED_TABLES):
+            with open(PARTITION_MANIFEST_FILE) as manifest_file:
+                manifest = json.load(manifest_file)
+            moved = {}
+            if "restaurants" in mutations_by_table:
+                moved = commit_partitioned_table("restaurants", mutations_by_table["restaurants"], manifest, staged=staged)
+            for table in PARTITIONED_TABLES[1:]:
+                if table in mutations_by_table or moved:
+                    commit_partitioned_table(table, mutations_by_table.get(table, []), manifest, moved, staged=staged)
+        for table, table_mutations in mutations_by_table.items():
+            if table in PARTITIONED_TABLES:
+                continue
+            csv_file = TABLE_FILES[table]
+            table_df = pd.read_csv(csv_file)
+            for mutation in table_mutations:
+                table_df = apply_mutation(table_df, mutation)
+            staged.append((table_df, csv_file))
+        return staged, manifest
+
+    def _commit(self, batch):
+        with self.lock:
+            self.committing = True
+
+        failed = {}
+        try:
+            staged = self._stage(batch)
+        except Exception:
+            # Find the offending writes: keep each write only if the batch still applies with it
+            valid = []
+            for write in batch:
+                try:
+                    self._stage(valid + [write])
+                    valid.append(write)
+                except Exception as e:
+                    failed[write[0]] = str(e)
+            staged = None if valid else ([], None)
+
+        try:
+            table_files, manifest = staged or self._stage(valid)
+            for table_df, csv_file in table_files:
+                write_csv_atomically(table_df, csv_file)
+            if manifest is not None:
+                write_partition_manifest(manifest)
+        except Exception as e:
+            # The files could not be replaced, so none of the remaining writes are saved
+            failed.update({seq: str(e) for seq, _ in batch if seq not in failed})
+
+        with self.lock:
+            self.committing = False
+            for seq, _ in batch:
+                self.outstanding.pop(seq, None)
+            if failed:
+                self.last_error = next(reversed(failed.values()))
+                self.failed_writes.update(failed)
+                while len(self.failed_writes) > FAILED_WRITES_KEPT:
+                    self.failed_writes.popitem(last=False)
+            # Failed writes were patched into every index when submitted: rebuild them all to
+            # drop those patches (otherwise only indexes a write could not be patched into)
+            stale_indexes, self.stale_indexes = (self.indexes if failed else self.stale_indexes), []
+            for index in stale_indexes:
+                try:
+                    index.rebuild()
+                    self._replay_outstanding(index)
+                except Exception as e:
+                    self.last_error = f"Could not rebuild {type(index).__name__}: {e}"
+            if len(failed) < len(batch):
+                self.batches_committed += 1
+                self.writes_committed += len(batch) - len(failed)
+                self.last_commit_at = datetime.now()
+            self.committed_seq = batch[-1][0]
+            self.capacity.notify_all()
+
+@st.cache_resource
+def get_write_queue():
+    """Returns the process-wide write-behind queue, starting its writer thread on first use."""
+    return WriteBehindQueue()
+
+def build_write_indexes():
+    """
+    Builds the indexes that queued writes patch, if they do not exist yet. Call it before
+    holding the write queue's lock: building an index takes that lock. The image hash
+    index is not built here, since it decodes every image on first use; photo uploads
+    build it, and it then replays any writes still queued like the others.
+    """
+    get_autocomplete_index()
+    get_booking_index()
+    get_similar_restaurants_index()
+
+def submit_writes(mutations):
+    """
+    Queues mutations on behalf of the current session and remembers them, so this session
+    sees its own change straight away (read-your-writes) until the writer has committed it.
+    """
+    for mutation in mutations:
+        restaurant_ids = [mutation.get("row", {}).get(column) for column in ("ID", "restaurant_id")]
+        if mutation.get("match") and mutation["match"][0] in ("ID", "restaurant_id"):
+            restaurant_ids.append(mutation["match"][1])
+        if any(is_uploaded_only_restaurant(restaurant_id) for restaurant_id in restaurant_ids):
+            raise ValueError("this restaurant only exists in the uploaded file; add it to the database first")
+    build_write_indexes()
+    seq = get_write_queue().submit(mutations)
+    st.session_state.pending_writes.append((seq, mutations))
+    return seq
+
+def pending_session_writes(table):
+    """Returns this session's queued mutations for a table that are not yet committed."""
+    committed_seq = get_write_queue().committed_seq
+    return [
+        mutation
+        for seq, mutations in st.session_state.get('pending_writes', [])
+        if seq > committed_seq
+        for mutation in mutations
+        if mutation["table"] == table
+    ]
+
+def apply_pending_writes(table, table_df):
+    """Overlays this session's uncommitted mutations on a table loaded from disk."""
+    for mutation in pending_session_writes(table):
+        table_df = apply_mutation(table_df, mutation)
+    return table_df
+
+# --- Write Rate Limiting ---
+# Every write action draws a token from per-session buckets (and, for reviews, from a
+# per-reviewer-name bucket too), so one client spamming "Submit" is throttled without
+# affecting anyone else. On top of that, the write queue only accepts new writes while
+# fewer than WRITE_QUEUE_MAX_DEPTH are outstanding; a submitter waits briefly for space
+# and is otherwise asked to try again, so a write storm cannot build an unbounded backlog
+# of rewrites and cache clears that slows every reader.
+WRITE_RATE_LIMITS = {
+    # action: (burst capacity, tokens refilled per second)
+    "review": (5, 1 / 12),
+    "photo": (10, 1 / 6),
+    "menu": (10, 1 / 6),
+    "restaurant": (3, 1 / 30),
+}
+WRITE_QUEUE_MAX_DEPTH = 200
+WRITE_QUEUE_WAIT_SECONDS = 2.0
+RATE_LIMIT_MAX_BUCKETS = 10_000
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` tokens, refilled continuously."""
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def seconds_until_available(self):
+        return max(0.0, (1 - self.tokens) / self.refill_per_second)
+
+class WriteRateLimiter:
+    """Process-wide token buckets keyed by (action, identity), with throttling counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.stats = Counter()
+
+    def try_acquire(self, action, identities, spend=True):
+        """
+        Takes one token from the action's bucket for every identity, or none if any of them
+        is empty. Returns (allowed, seconds to wait before retrying). With spend=False it
+        only checks that a token is available.
+        """
+        capacity, refill_per_second = WRITE_RATE_LIMITS[action]
+        with self.lock:
+            if len(self.buckets) > RATE_LIMIT_MAX_BUCKETS:
+                self._prune()
+            buckets = []
+            for identity in identities:
+                bucket = self.buckets.setdefault((action, identity), TokenBucket(capacity, refill_per_second))
+                bucket.refill()
+                buckets.append(bucket)
+            if all(bucket.tokens >= 1 for bucket in buckets):
+                if spend:
+                    for bucket in buckets:
+                        bucket.tokens -= 1
+                    self.stats["allowed"] += 1
+                return True, 0.0
+            self.stats["throttled"] += 1
+            return False, max(bucket.seconds_until_available() for bucket in buckets)
+
+    def _prune(self):
+        # Full buckets carry no state worth keeping
+        for key, bucket in list(self.buckets.items()):
+            bucket.refill()
+            if bucket.tokens >= bucket.capacity:
+                del self.buckets[key]
+
+    def record(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+@st.cache_resource
+def get_write_rate_limiter():
+    """Returns the process-wide write rate limiter shared by every session."""
+    return WriteRateLimiter()
+
+def check_write_allowed(action, reviewer_name=None, spend=True):
+    """
+    Applies the write queue's capacity cap and the rate limits before a write is queued.
+    Shows a "try again shortly" message and returns False if the write should not go ahead.
+    Call it once the write is known to be valid, so rejected input never costs a token.
+    Uploads check first with spend=False, before the file is ingested, and spend the
+    token when the write itself is queued.
+    """
+    if "write_session_key" not in st.session_state:
+        st.session_state.write_session_key = uuid.uuid4().hex
+    identities = [("session", st.session_state.write_session_key)]
+    if reviewer_name and str(reviewer_name).strip():
+        identities.append(("reviewer", str(reviewer_name).strip().casefold()))
+
+    rate_limiter = get_write_rate_limiter()
+    write_queue = get_write_queue()
+    write_status = write_queue.status()
+    if write_status["queue_depth"] >= WRITE_QUEUE_MAX_DEPTH:
+        rate_limiter.record("queued")
+        with st.spinner("Waiting for other changes to be saved..."):
+            has_capacity = write_queue.wait_for_capacity(WRITE_QUEUE_MAX_DEPTH, WRITE_QUEUE_WAIT_SECONDS)
+        if not has_capacity:
+            rate_limiter.record("rejected")
+            st.warning("We're busy saving other changes right now. Please try again shortly.", icon="⏳")
+            return False
+
+    allowed, retry_after = rate_limiter.try_acquire(action, identities, spend=spend)
+    if not allowed:
+        st.warning(f"You're submitting faster than we can take changes. Please try again in {math.ceil(retry_after)} seconds.", icon="⏳")
+        return False
+    return True
+
+# --- Review Rollups ---
+# Analytics read pre-aggregated counters instead of the review history: one row per
+# (day, restaurant, reviewer department) with the review count and rating sum. Each saved
+# review queues an "increment" of its bucket in the same write as the review itself, so
+# the rollups never drift from the reviews, and their size grows with days rather than reviews.
+REVIEW_ROLLUP_KEYS = ["day", "restaurant_id", "reviewer_department"]
+UNSPECIFIED_DEPARTMENT = "Unspecified"
+
+def normalize_department(department):
+    """Buckets blank departments together so they can be counted and matched."""
+    if department is None or pd.isna(department) or not str(department).strip():
+        return UNSPECIFIED_DEPARTMENT
+    return str(department).strip()
+
+def build_review_rollups(reviews_df):
+    """Aggregates a reviews table into daily rollup rows in one vectorised pass."""
+    reviews = pd.DataFrame({
+        "day": pd.to_datetime(reviews_df['timestamp'], errors='coerce').dt.strftime("%Y-%m-%d"),
+        "restaurant_id": pd.to_numeric(reviews_df['restaurant_id'], errors='coerce'),
+        "reviewer_department": reviews_df['reviewer_department'].map(normalize_department),
+        "rating": pd.to_numeric(reviews_df['rating'], errors='coerce'),
+    }).dropna(subset=["day", "restaurant_id"])
+    rollups = reviews.groupby(REVIEW_ROLLUP_KEYS, as_index=False).agg(
+        review_count=("rating", "size"), rated_count=("rating", "count"), rating_sum=("rating", "sum")
+    )
+    rollups['restaurant_id'] = rollups['restaurant_id'].astype(np.int64)
+    return rollups
+
+def review_rollup_increment(review):
+    """Returns the rollup mutation that counts one new review."""
+    rating = pd.to_numeric(review.get("rating"), errors='coerce')
+    return {
+        "table": "review_rollups",
+        "op": "increment",
+        "key": {
+            "day": review["timestamp"][:10],
+            "restaurant_id": int(review["restaurant_id"]),
+            "reviewer_department": normalize_department(review.get("reviewer_department")),
+        },
+        "values": {
+            "review_count": 1,
+            "rated_count": int(pd.notna(rating)),
+            "rating_sum": float(rating) if pd.notna(rating) else 0.0,
+        },
+    }
+
+@st.cache_data(show_spinner=False)
+def load_review_rollups(version):
+    """Reads the rollup table once per version of review_rollups.csv."""
+    rollups = pd.read_csv(REVIEW_ROLLUPS_CSV_FILE)
+    rollups['day'] = pd.to_datetime(rollups['day'])
+    return rollups
+
 # --- Function to delete a restaurant entry and all related data ---
-def delete_restaurant(restaurant_name):
+def delete_restaurant(restaurant_id, restaurant_name):
     """
-    Deletes a restaurant and all its associated data from all four CSV files,
-    then forces a Streamlit re-run.
+    Queues the deletion of a restaurant and all its associated data from every CSV
+    file as a single write, then forces a Streamlit re-run.
     """
     try:
-        # Read all dataframes
-        restaurants_df = pd.read_csv(RESTAURANTS_CSV_FILE)
-        reviews_df = pd.read_csv(REVIEWS_CSV_FILE)
-        menus_df = pd.read_csv(MENUS_CSV_FILE)
-        gallery_df = pd.read_csv(GALLERY_CSV_FILE)
-
-        # Filter out the restaurant from each DataFrame
-        restaurants_df = restaurants_df[restaurants_df['Name'] != restaurant_name]
-        reviews_df = reviews_df[reviews_df['restaurant_name'] != restaurant_name]
-        menus_df = menus_df[menus_df['restaurant_name'] != restaurant_name]
-        gallery_df = gallery_df[gallery_df['restaurant_name'] != restaurant_name]
-
-        # Save the updated DataFrames back to CSV
-        restaurants_df.to_csv(RESTAURANTS_CSV_FILE, index=False)
-        reviews_df.to_csv(REVIEWS_CSV_FILE, index=False)
-        menus_df.to_csv(MENUS_CSV_FILE, index=False)
-        gallery_df.to_csv(GALLERY_CSV_FILE, index=False)
-
-        st.success(f"Successfully deleted {restaurant_name} and all associated data.")
+        submit_writes([
+            {"table": "restaurants", "op": "delete", "match": ("ID", restaurant_id)},
+            {"table": "reviews", "op": "delete", "match": ("restaurant_id", restaurant_id)},
+            {"table": "menus", "op": "delete", "match": ("restaurant_id", restaurant_id)},
+            {"table": "media", "op": "delete", "match": ("restaurant_id", restaurant_id)},
+            {"table": "bookings", "op": "delete", "match": ("restaurant_id", restaurant_id)},
+            {"table": "review_rollups", "op": "delete", "match": ("restaurant_id", restaurant_id)},
+        ])
+        st.toast(f"Successfully deleted {restaurant_name} and all associated data.", icon="✅")
         st.session_state.edit_restaurant_name = None
-        
-        # --- KEY CHANGE: Clear cache and force re-run ---
-        st.cache_data.clear() 
+        st.session_state.delete_confirm_restaurant = None
         st.rerun()
     except Exception as e:
         st.error(f"An error occurred while deleting the restaurant: {e}")
 
+# --- Seed preparation for the partitioning pass ---
+# The flat CSVs are read-only input: inline media, IDs and coordinates are resolved in
+# memory on the way into the partitions, so running the app never rewrites a seed file
+# and deleting data/partitions/ always reseeds from the original data.
+def migrate_inline_media(seed_tables):
+    """
+    Moves inline base64 payloads of the seed menus, gallery and restaurant images into the
+    content-hashed media folder, leaving a media key in their place in `seed_tables`.
+    """
+    for table in ["menus", "gallery"]:
+        table_df = seed_tables[table]
+        if 'media_key' not in table_df.columns:
+            table_df['media_key'] = None
+        table_df['media_key'] = table_df['media_key'].astype(object)
+        if 'base64_data' not in table_df.columns:
+            continue
+        pending = table_df['base64_data'].notna() & table_df['media_key'].isna()
+        for idx in table_df.index[pending]:
+            file_bytes = base64.b64decode(table_df.at[idx, 'base64_data'])
+            table_df.at[idx, 'media_key'] = store_media_bytes(file_bytes, table_df.at[idx, 'file_type'])
+        table_df.loc[pending, 'base64_data'] = None
+
+    restaurants_df = seed_tables["restaurants"]
+    inline_images = restaurants_df['Image'].astype(str).str.startswith("data:")
+    for idx in restaurants_df.index[inline_images]:
+        file_type, file_bytes = parse_data_uri(restaurants_df.at[idx, 'Image'])
+        restaurants_df.at[idx, 'Image'] = MEDIA_REFERENCE_PREFIX + store_media_bytes(file_bytes, file_type)
+
+def migrate_restaurant_ids(seed_tables):
+    """
+    Gives every seed restaurant an integer ID (and its coordinates, see
+    validate_and_update_dataframe) and backfills 'restaurant_id' in the seed reviews, menus
+    and gallery by matching the legacy 'restaurant_name' column. From then on, child rows
+    are joined on the ID, so renaming a restaurant only touches the restaurant row.
+    """
+    restaurants_df = validate_and_update_dataframe(seed_tables["restaurants"])
+    # Keep the ID as the first column so the partition files stay readable
+    seed_tables["restaurants"] = restaurants_df[['ID'] + [col for col in restaurants_df.columns if col != 'ID']]
+    name_to_id = dict(zip(restaurants_df['Name'], restaurants_df['ID']))
+
+    for table in ["reviews", "menus", "gallery"]:
+        table_df = seed_tables[table]
+        if 'restaurant_id' not in table_df.columns:
+            table_df.insert(0, 'restaurant_id', np.nan)
+        pending = table_df['restaurant_id'].isna() & table_df['restaurant_name'].isin(name_to_id.keys())
+        table_df.loc[pending, 'restaurant_id'] = table_df.loc[pending, 'restaurant_name'].map(name_to_id)
+        table_df['restaurant_id'] = pd.to_numeric(table_df['restaurant_id'], errors='coerce').astype('Int64')
+
+def read_seed_tables():
+    """Reads the flat seed CSVs and brings them up to the current schema, in memory only."""
+    seed_tables = {table: pd.read_csv(csv_file) for table, csv_file in SEED_FILES.items()}
+    migrate_inline_media(seed_tables)
+    migrate_restaurant_ids(seed_tables)
+    return seed_tables
+
+# --- One-off backfill of the review rollups ---
+@st.cache_resource
+def migrate_review_rollups():
+    """
+    Creates review_rollups.csv from the existing review history if it does not exist yet.
+    From then on it is maintained incrementally alongside each review write. The history
+    is read from the review partitions (reviews.csv is only their seed), so this runs
+    after migrate_to_partitions().
+    """
+    if not os.path.exists(REVIEW_ROLLUPS_CSV_FILE):
+        build_review_rollups(load_table("reviews")).to_csv(REVIEW_ROLLUPS_CSV_FILE, index=False)
+    return True
+
+# --- One-off split of the flat CSVs into location partitions ---
+@st.cache_resource
+def migrate_to_partitions():
+    """
+    Splits the prepared seed restaurants, reviews and menus (see read_seed_tables()) into
+    location partitions and writes the manifest. Runs only while no manifest exists; from
+    then on the partitions are the source of truth for these tables. The media table is
+    built from the seed gallery by migrate_media_catalogue().
+    """
+    if os.path.exists(PARTITION_MANIFEST_FILE):
+        return True
+    os.makedirs(PARTITIONS_DIR, exist_ok=True)
+    seed_tables = read_seed_tables()
+    manifest = {"partitions": {}, "restaurant_partitions": {}, "columns": {}}
+    for table in PARTITIONED_TABLES:
+        if table not in seed_tables:
+            continue
+        table_df = seed_tables[table]
+        assigned = row_partitions(table, table_df, manifest["restaurant_partitions"])
+        if table == "restaurants":
+            manifest["restaurant_partitions"] = {str(int(restaurant_id)): partition for restaurant_id, partition in zip(table_df['ID'], assigned)}
+        # Every partition gets a file for every table, even if it has no rows yet
+        write_table_partitions(table, table_df, assigned, set(assigned.unique()) | set(manifest["partitions"]), manifest)
+    write_partition_manifest(manifest)
+    return True
+
+# --- One-off merge of the image sources into the media catalogue ---
+@st.cache_resource
+def migrate_media_catalogue():
+    """
+    Folds the restaurants' Image column, the gallery rows (partitioned or still in
+    gallery_images.csv) and restaurant_images.csv into the partitioned media table. Each
+    restaurant's cover image comes first, followed by its photos in upload order; exact
+    copies of the same file are kept once. Runs once, while the manifest has no media table.
+    """
+    manifest = get_partition_manifest()
+    if "media" in manifest["columns"]:
+        return True
+    restaurants_df = load_table("restaurants")
+    name_to_id = dict(zip(restaurants_df['Name'], restaurants_df['ID']))
+
+    media_rows = []
+    for row in restaurants_df.to_dict(orient="records"):
+        cover = cover_media_row(row['ID'], row['Name'], row.get('Image'))
+        if cover is not None:
+            media_rows.append(cover)
+
+    gallery_dir = os.path.join(PARTITIONS_DIR, "gallery")
+    if os.path.isdir(gallery_dir):
+        gallery_files = [os.path.join(gallery_dir, name) for name in sorted(os.listdir(gallery_dir)) if name.endswith(".csv")]
+    else:
+        gallery_files = [GALLERY_CSV_FILE] if os.path.exists(GALLERY_CSV_FILE) else []
+    photo_rows = [row for csv_file in gallery_files for row in pd.read_csv(csv_file).to_dict(orient="records")]
+    if os.path.exists(RESTAURANT_IMAGES_CSV_FILE):
+        photo_rows += pd.read_csv(RESTAURANT_IMAGES_CSV_FILE).to_dict(orient="records")
+    for row in sorted(photo_rows, key=lambda row: str(row.get('timestamp', ''))):
+        restaurant_id = row.get('restaurant_id')
+        if restaurant_id is None or pd.isna(restaurant_id):
+            restaurant_id = name_to_id.get(row.get('restaurant_name'))
+        media_key = row.get('media_key')
+        if not isinstance(media_key, str) or not media_key:
+            if not isinstance(row.get('base64_data'), str):
+                continue
+            media_key = store_media_bytes(base64.b64decode(row['base64_data']), row.get('file_type'))
+        if restaurant_id is None or pd.isna(restaurant_id):
+            continue
+        media_rows.append({
+            "restaurant_id": int(restaurant_id),
+            "restaurant_name": row.get('restaurant_name'),
+            "is_cover": False,
+            "media_type": "image",
+            "file_name": row.get('file_name'),
+            "file_type": row.get('file_type'),
+            "media_key": media_key,
+            "url": None,
+            "timestamp": row.get('timestamp'),
+        })
+
+    media_df = pd.DataFrame(media_rows, columns=MEDIA_CATALOGUE_COLUMNS)
+    identity = media_df['media_key'].fillna(media_df['url'])
+    media_df = media_df[~pd.concat([media_df['restaurant_id'], identity], axis=1).duplicated()].reset_index(drop=True)
+    media_df['position'] = media_df.groupby('restaurant_id').cumcount()
+
+    assigned = row_partitions("media", media_df, manifest["restaurant_partitions"])
+    write_table_partitions("media", media_df, assigned, set(assigned.unique()) | set(manifest["partitions"]), manifest)
+    # The gallery partitions are superseded by the media table
+    manifest["columns"].pop("gallery", None)
+    for entry in manifest["partitions"].values():
+        entry["rows"].pop("gallery", None)
+    write_partition_manifest(manifest)
+    if os.path.isdir(gallery_dir):
+        shutil.rmtree(gallery_dir)
+    return True
+
 # Call the function to ensure all necessary CSVs exist before running the app
 initialize_csv_files()
+migrate_to_partitions()
+migrate_review_rollups()
+migrate_media_catalogue()
+if MEDIA_SERVER_PORT:
+    start_media_server(MEDIA_SERVER_HOST, MEDIA_SERVER_PORT)
 
 # --- Session State Initialization ---
 # Initialize session state variables to manage UI and data flow
@@ -133,23 +1542,54 @@ if 'edit_restaurant_name' not in st.session_state:
     st.session_state.edit_restaurant_name = None
 if 'delete_confirm_restaurant' not in st.session_state:
     st.session_state.delete_confirm_restaurant = None
+if 'pending_writes' not in st.session_state:
+    st.session_state.pending_writes = []
+
+# Forget writes the writer has committed, and surface any that failed
+write_queue = get_write_queue()
+for seq, _ in st.session_state.pending_writes:
+    if seq in write_queue.failed_writes:
+        st.error(f"A change could not be saved: {write_queue.failed_writes[seq]}", icon="⚠️")
+st.session_state.pending_writes = [
+    (seq, mutations) for seq, mutations in st.session_state.pending_writes if seq > write_queue.committed_seq
+]
 
 # --- Load restaurant data from CSV ---
-@st.cache_data
-def load_restaurants(file_path=RESTAURANTS_CSV_FILE):
-    """Loads all restaurant data from a specified CSV file path."""
+@st.cache_data(show_spinner=False)
+def read_restaurants(manifest_version, versions):
+    """
+    Reads and validates the restaurant partitions in `versions` (see partition_versions()).
+    The manifest and partition versions are the cache key, so a committed write is picked
+    up on the next run without clearing any other session's caches.
+    """
+    df_restaurants = load_partitions("restaurants", versions)
+    # Ensure the DataFrame has the correct columns, regardless of the source
+    return validate_and_update_dataframe(df_restaurants)
+
+def load_restaurants(location_filter="All"):
+    """
+    Loads the restaurant data a location filter needs: only that location's partition,
+    or every partition (read in parallel) for "All".
+    """
     try:
-        df_restaurants = pd.read_csv(file_path)
-        # Ensure the DataFrame has the correct columns, regardless of the source
-        df_restaurants = validate_and_update_dataframe(df_restaurants)
-        return df_restaurants
+        partitions = partitions_for_location_filter(location_filter)
+        return read_restaurants(file_version(PARTITION_MANIFEST_FILE), partition_versions("restaurants", partitions))
     except FileNotFoundError:
-        st.error(f"Restaurant data file not found at {file_path}. Please re-run the app or upload a new file.")
+        st.error("Restaurant data files not found. Please re-run the app or upload a new file.")
         return pd.DataFrame()
     except Exception as e:
         st.error(f"Error loading CSV file: {e}")
         return pd.DataFrame()
 
+def load_current_restaurants(location_filter="All"):
+    """Loads the restaurant table as this session should see it, including its queued writes."""
+    df_restaurants = load_restaurants(location_filter)
+    if pending_session_writes("restaurants"):
+        df_restaurants = validate_and_update_dataframe(apply_pending_writes("restaurants", df_restaurants))
+        if location_filter != "All":
+            df_restaurants = df_restaurants[df_restaurants['Location'].map(partition_for_location) == partition_for_location(location_filter)]
+    return df_restaurants
+
 # --- Streamlit App Configuration ---
 st.set_page_config(
     page_title="Singapore Restaurant Guide",
@@ -279,6 +1719,19 @@ st.markdown(
         color: #555;
     }
 
+    .review-entry {
+        padding: 0.5rem 0;
+        border-bottom: 1px solid #eee;
+        font-family: 'Inter', sans-serif;
+    }
+    .review-text {
+        margin: 0.25rem 0;
+    }
+    .review-meta {
+        font-size: 0.85em;
+        color: #777;
+    }
+
     .sidebar-message {
         font-size: 0.9em;
         color: #555;
@@ -291,11 +1744,16 @@ st.markdown(
 )
 
 # --- Function to Save Review to CSV ---
-def save_review_to_csv(restaurant_name, rating, review_text, reviewer_name, reviewer_department, reviewer_designation):
-    """Saves a review to the CSV file."""
+def save_review_to_csv(restaurant_id, restaurant_name, rating, review_text, reviewer_name, reviewer_department, reviewer_designation):
+    """
+    Saves a review to the CSV file. Reviews are joined to restaurants by ID; the name is
+    kept alongside only as a readable label for exports.
+    """
     try:
-        reviews_df = pd.read_csv(REVIEWS_CSV_FILE)
-        new_review = pd.DataFrame([{
+        if not check_write_allowed("review", reviewer_name=reviewer_name):
+            return False
+        new_review = {
+            "restaurant_id": restaurant_id,
             "restaurant_name": restaurant_name,
             "rating": rating,
             "review_text": review_text,
@@ -303,9 +1761,11 @@ def save_review_to_csv(restaurant_name, rating, review_text, reviewer_name, revi
             "reviewer_department": reviewer_department,
             "reviewer_designation": reviewer_designation,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }])
-        reviews_df = pd.concat([reviews_df, new_review], ignore_index=True)
-        reviews_df.to_csv(REVIEWS_CSV_FILE, index=False)
+        }
+        submit_writes([
+            {"table": "reviews", "op": "append", "row": new_review},
+            review_rollup_increment(new_review),
+        ])
         return True
     except Exception as e:
         st.error(f"Error saving review to CSV: {e}")
@@ -313,14 +1773,19 @@ def save_review_to_csv(restaurant_name, rating, review_text, reviewer_name, revi
 
 # --- Function to Add a New Restaurant to CSV ---
 def add_restaurant_to_csv(name, cuisine, location, rating, price_range, description, image, address, private_room, max_capacity):
-    """Adds a new restaurant to the restaurants.csv file."""
+    """Queues a new restaurant for the restaurants.csv file."""
     try:
-        restaurants_df = pd.read_csv(RESTAURANTS_CSV_FILE)
+        restaurants_df = load_current_restaurants()
         if name in restaurants_df['Name'].values:
             st.warning("A restaurant with this name already exists. Please use a unique name.")
             return False
+        if not check_write_allowed("restaurant"):
+            return False
 
-        new_restaurant = pd.DataFrame([{
+        # Assign the next surrogate ID; the write queue hands them out so they are never reused
+        new_id = get_write_queue().allocate_restaurant_id(restaurants_df['ID'].max() if not restaurants_df.empty else 0)
+        new_restaurant = {
+            "ID": new_id,
             "Name": name,
             "Cuisine": cuisine,
             "Location": location,
@@ -331,123 +1796,1249 @@ def add_restaurant_to_csv(name, cuisine, location, rating, price_range, descript
             "Address": address,
             "Private Room": private_room,
             "Max Capacity": max_capacity
-        }])
-        
-        restaurants_df = pd.concat([restaurants_df, new_restaurant], ignore_index=True)
-        restaurants_df.to_csv(RESTAURANTS_CSV_FILE, index=False)
+        }
+        coordinates = geocode_restaurant(location, address)
+        new_restaurant["Latitude"], new_restaurant["Longitude"] = coordinates if coordinates else (np.nan, np.nan)
+        mutations = [{"table": "restaurants", "op": "append", "row": new_restaurant}]
+        cover = cover_media_row(new_id, name, image)
+        if cover is not None:
+            mutations.append({"table": "media", "op": "append", "row": cover})
+        submit_writes(mutations)
         return True
     except Exception as e:
         st.error(f"Error saving new restaurant to CSV: {e}")
         return False
         
 # --- Function to Update an Existing Restaurant in CSV ---
-def update_restaurant_in_csv(original_name, new_details):
-    """Updates an existing restaurant's details in the restaurants.csv file."""
+def update_restaurant_in_csv(restaurant_id, new_details):
+    """
+    Updates an existing restaurant's details in the restaurants.csv file.
+    Reviews, menus and media rows reference the ID, so a rename needs no cascade.
+    """
     try:
-        restaurants_df = pd.read_csv(RESTAURANTS_CSV_FILE)
+        restaurants_df = load_current_restaurants()
         # Find the index of the row to update
-        idx_to_update = restaurants_df[restaurants_df['Name'] == original_name].index
+        idx_to_update = restaurants_df[restaurants_df['ID'] == restaurant_id].index
         if idx_to_update.empty:
-            st.error(f"Could not find restaurant '{original_name}' to update.")
+            st.error(f"Could not find restaurant with ID {restaurant_id} to update.")
+            return False
+        if new_details.get("Name") in restaurants_df.loc[restaurants_df['ID'] != restaurant_id, 'Name'].values:
+            st.warning("A restaurant with this name already exists. Please use a unique name.")
             return False
 
-        # Update the row with new details
-        restaurants_df.loc[idx_to_update, new_details.keys()] = new_details.values()
-        restaurants_df.to_csv(RESTAURANTS_CSV_FILE, index=False)
+        # Re-geocode when the place changes; unresolved places clear the old coordinates
+        if "Location" in new_details or "Address" in new_details:
+            current = restaurants_df.loc[idx_to_update[0]]
+            coordinates = geocode_restaurant(
+                new_details.get("Location", current['Location']), new_details.get("Address", current['Address'])
+            )
+            new_details = {**new_details, "Latitude": coordinates[0] if coordinates else np.nan,
+                           "Longitude": coordinates[1] if coordinates else np.nan}
+
+        # Queue the new details for the row
+        submit_writes([{"table": "restaurants", "op": "update", "match": ("ID", restaurant_id), "values": new_details}])
         return True
     except Exception as e:
         st.error(f"Error updating restaurant in CSV: {e}")
         return False
 
+# --- Group index over the child tables ---
+@st.cache_resource(max_entries=64, show_spinner=False)
+def load_grouped_table(csv_file, version):
+    """
+    Reads a child table (reviews, menus or media) and builds its group index: a mapping
+    from restaurant ID to an integer array of row positions. The file's version (see
+    file_version) is part of the cache key, so the table is only re-read after a write.
+    The result is shared by every session and card (not copied per call), so callers
+    must treat it as read-only and take rows with iloc.
+    """
+    table_df = pd.read_csv(csv_file)
+    restaurant_ids = pd.to_numeric(table_df['restaurant_id'], errors='coerce').to_numpy(dtype=float)
+    positions = np.flatnonzero(~np.isnan(restaurant_ids))
+    order = positions[np.argsort(restaurant_ids[positions], kind='stable')]
+    # The group arrays are views of `order`; freezing it keeps the shared index read-only
+    order.flags.writeable = False
+    group_index = {}
+    if len(order):
+        group_keys, group_starts = np.unique(restaurant_ids[order], return_index=True)
+        group_index = {int(key): rows for key, rows in zip(group_keys, np.split(order, group_starts[1:]))}
+    return table_df, group_index
+
+def load_table_rows(table, restaurant_id=None, partitions=None):
+    """
+    Returns a child table (limited to `partitions` if given), or the rows for one
+    restaurant via the group index of the partition holding it. While this session has
+    uncommitted writes to the table, they are overlaid first and the rows are filtered
+    directly, since the index does not cover them yet.
+    """
+    if restaurant_id is None:
+        table_df, group_index = load_table(table, partitions), {}
+    else:
+        csv_file = partition_file(table, restaurant_partition(restaurant_id))
+        if os.path.exists(csv_file):
+            table_df, group_index = load_grouped_table(csv_file, file_version(csv_file))
+        else:
+            table_df, group_index = pd.DataFrame(columns=get_partition_manifest()["columns"][table]), {}
+    if pending_session_writes(table):
+        table_df = apply_pending_writes(table, table_df)
+        if restaurant_id is None:
+            return table_df
+        return table_df[pd.to_numeric(table_df['restaurant_id'], errors='coerce') == int(restaurant_id)]
+    if restaurant_id is None:
+        return table_df
+    return table_df.iloc[group_index.get(int(restaurant_id), np.empty(0, dtype=np.int64))]
+
+# --- Review timeline index ---
+# Each restaurant's reviews are kept newest first, with their timestamps alongside, so a
+# page of the review history is a slice and a date range is two binary searches. Only the
+# rows of the requested page are turned into records.
+REVIEWS_PAGE_SIZE = 10
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def load_review_timeline(csv_file, version):
+    """
+    Builds the timeline index once per version of a reviews partition: per restaurant
+    ID, its row positions sorted newest first, plus timestamp (epoch ns, NaN if missing)
+    and rating arrays aligned with the table rows. Shared and read-only, like
+    load_grouped_table.
+    """
+    reviews_df, _ = load_grouped_table(csv_file, version)
+    timestamps = pd.to_datetime(reviews_df['timestamp'], errors='coerce')
+    timestamp_values = np.where(timestamps.isna(), np.nan, timestamps.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float))
+    ratings = pd.to_numeric(reviews_df['rating'], errors='coerce').to_numpy(dtype=float)
+    restaurant_ids = pd.to_numeric(reviews_df['restaurant_id'], errors='coerce').to_numpy(dtype=float)
+    positions = np.flatnonzero(~np.isnan(restaurant_ids))
+    # Newest first within each restaurant; reviews without a timestamp sort last
+    sort_keys = np.nan_to_num(-timestamp_values[positions], nan=np.inf)
+    order = positions[np.lexsort((sort_keys, restaurant_ids[positions]))]
+    for array in (order, timestamp_values, ratings):
+        array.flags.writeable = False
+    timeline = {}
+    if len(order):
+        group_keys, group_starts = np.unique(restaurant_ids[order], return_index=True)
+        timeline = {int(key): rows for key, rows in zip(group_keys, np.split(order, group_starts[1:]))}
+    return reviews_df, timeline, timestamp_values, ratings
+
+def load_review_page(restaurant_id, limit=None, min_rating=None, date_range=None):
+    """
+    Returns (reviews, total) for a restaurant: up to `limit` review records, newest
+    first, matching the optional minimum rating and (start_date, end_date) range, and the
+    number of reviews that match in all.
+    """
+    if pending_session_writes("reviews"):
+        # Uncommitted reviews are not in the index yet; the overlaid rows are filtered directly
+        restaurant_reviews = load_table_rows("reviews", restaurant_id).copy()
+        restaurant_reviews['_timestamp'] = pd.to_datetime(restaurant_reviews['timestamp'], errors='coerce')
+        if min_rating is not None:
+            restaurant_reviews = restaurant_reviews[pd.to_numeric(restaurant_reviews['rating'], errors='coerce') >= min_rating]
+        if date_range is not None:
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+            restaurant_reviews = restaurant_reviews[(restaurant_reviews['_timestamp'] >= start) & (restaurant_reviews['_timestamp'] < end)]
+        restaurant_reviews = restaurant_reviews.sort_values('_timestamp', ascending=False, na_position='last')
+        page = restaurant_reviews.drop(columns='_timestamp').head(limit) if limit else restaurant_reviews.drop(columns='_timestamp')
+        return page.to_dict(orient="records"), len(restaurant_reviews)
+
+    csv_file = partition_file("reviews", restaurant_partition(restaurant_id))
+    if not os.path.exists(csv_file):
+        return [], 0
+    reviews_df, timeline, timestamp_values, ratings = load_review_timeline(csv_file, file_version(csv_file))
+    rows = timeline.get(int(restaurant_id), np.empty(0, dtype=np.int64))
+    if date_range is not None:
+        # Negated timestamps ascend along the newest-first rows, so the range is a slice
+        negated = -timestamp_values[rows]
+        start = pd.Timestamp(date_range[0]).value
+        end = (pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)).value
+        rows = rows[np.searchsorted(negated, -end, side='right'):np.searchsorted(negated, -start, side='right')]
+    if min_rating is not None:
+        rows = rows[ratings[rows] >= min_rating]
+    page_rows = rows[:limit] if limit else rows
+    return reviews_df.iloc[page_rows].to_dict(orient="records"), len(rows)
+
+def build_reviews_html(reviews):
+    """Builds one HTML block for a page of reviews, escaping each value and skipping blanks."""
+    def text(value):
+        return "" if value is None or pd.isna(value) else html.escape(str(value).strip())
+
+    entries = []
+    for review in reviews:
+        rating = pd.to_numeric(review.get('rating'), errors='coerce')
+        rating_str = f"{rating:.1f}" if pd.notna(rating) else "N/A"
+        reviewer_info = [text(review.get(field)) for field in ['reviewer_name', 'reviewer_department', 'reviewer_designation']]
+        reviewer_line = ", ".join(info for info in reviewer_info if info) or "Anonymous"
+        review_text = text(review.get('review_text')).replace("\n", "<br>") or "No review text."
+        entries.append(
+            f'<div class="review-entry"><strong>Rating:</strong> {rating_str} ⭐'
+            f'<div class="review-text">{review_text}</div>'
+            f'<div class="review-meta">By {reviewer_line} on {text(review.get("timestamp")) or "N/A"}</div></div>'
+        )
+    return "".join(entries)
+
 # --- Function to Load Reviews from CSV ---
-def load_reviews_from_csv(restaurant_name=None):
-    """Loads reviews from the CSV file, optionally filtering for a specific restaurant."""
+def load_reviews_from_csv(restaurant_id=None, partitions=None):
+    """
+    Loads reviews, optionally for a specific restaurant ID (newest first) or limited to
+    some location partitions.
+    """
     try:
-        reviews_df = pd.read_csv(REVIEWS_CSV_FILE)
-        if restaurant_name:
-            restaurant_reviews = reviews_df[reviews_df["restaurant_name"] == restaurant_name]
-            restaurant_reviews = restaurant_reviews.sort_values(by="timestamp", ascending=False)
-            return restaurant_reviews.to_dict(orient="records")
-        return reviews_df
+        if restaurant_id is not None:
+            return load_review_page(restaurant_id)[0]
+        return load_table_rows("reviews", partitions=partitions)
     except FileNotFoundError:
-        return pd.DataFrame() if not restaurant_name else []
+        return pd.DataFrame() if restaurant_id is None else []
     except Exception as e:
         st.error(f"Error loading reviews from CSV: {e}")
-        return pd.DataFrame() if not restaurant_name else []
+        return pd.DataFrame() if restaurant_id is None else []
         
 # --- Function to Load Menus from CSV ---
-def load_menus_from_csv(restaurant_name=None):
-    """Loads menus from the CSV file, optionally filtering for a specific restaurant."""
+def load_menus_from_csv(restaurant_id=None):
+    """Loads menus from the CSV file, optionally filtering for a specific restaurant ID."""
     try:
-        menus_df = pd.read_csv(MENUS_CSV_FILE)
-        if restaurant_name:
-            restaurant_menus = menus_df[menus_df["restaurant_name"] == restaurant_name]
-            return restaurant_menus.to_dict(orient="records")
-        return menus_df
+        if restaurant_id is not None:
+            return load_table_rows("menus", restaurant_id).to_dict(orient="records")
+        return load_table_rows("menus")
     except FileNotFoundError:
-        return pd.DataFrame() if not restaurant_name else []
+        return pd.DataFrame() if restaurant_id is None else []
     except Exception as e:
         st.error(f"Error loading menus from CSV: {e}")
-        return pd.DataFrame() if not restaurant_name else []
+        return pd.DataFrame() if restaurant_id is None else []
         
 # --- Function to Add a New Menu Item (File) to CSV ---
-def add_menu_item_to_csv(restaurant_name, file_name, file_type, base64_data):
-    """Adds a new menu item file to the menus.csv file."""
+def add_menu_item_to_csv(restaurant_id, restaurant_name, file_name, file_type, media_key):
+    """Adds a new menu item file, already saved to the media folder, to the menus.csv file."""
     try:
-        menus_df = pd.read_csv(MENUS_CSV_FILE)
-        new_menu = pd.DataFrame([{
+        if not check_write_allowed("menu"):
+            return False
+        new_menu = {
+            "restaurant_id": restaurant_id,
             "restaurant_name": restaurant_name,
             "file_name": file_name,
             "file_type": file_type,
-            "base64_data": base64_data,
+            "media_key": media_key,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }])
-        menus_df = pd.concat([menus_df, new_menu], ignore_index=True)
-        menus_df.to_csv(MENUS_CSV_FILE, index=False)
+        }
+        submit_writes([{"table": "menus", "op": "append", "row": new_menu}])
         return True
     except Exception as e:
         st.error(f"Error saving new menu item file to CSV: {e}")
         return False
         
+# --- Function to Add a Structured Menu Item to CSV ---
+def add_structured_menu_item_to_csv(restaurant_id, restaurant_name, menu_name, menu_description, menu_price):
+    """Adds a named, priced menu item (rather than an uploaded file) to the menus.csv file."""
+    try:
+        if not check_write_allowed("menu"):
+            return False
+        new_menu = {
+            "restaurant_id": restaurant_id,
+            "restaurant_name": restaurant_name,
+            "menu_name": menu_name,
+            "menu_description": menu_description,
+            "menu_price": menu_price,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        submit_writes([{"table": "menus", "op": "append", "row": new_menu}])
+        return True
+    except Exception as e:
+        st.error(f"Error saving new menu item to CSV: {e}")
+        return False
+
+# --- Menu Catalogue ---
+# Structured menu items (rows of menus.csv with a menu_name) are indexed once per version
+# of the file: a price index holding the item rows sorted by price, and a token index from
+# each word of a dish name to the item rows containing it. A price bound is a binary
+# search and a dish query intersects a few posting arrays, so neither scans every row.
+def menu_tokens(text):
+    """Tokenizes dish names and queries alike, folding simple plurals ('menus' -> 'menu')."""
+    return [word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word for word in tokenize(text)]
+
+class MenuCatalogue:
+    """Sorted price index and dish-name token index over structured menu items."""
+
+    def __init__(self, menus_df):
+        menus_df = menus_df.reindex(columns=list(dict.fromkeys([*menus_df.columns, 'restaurant_id', 'menu_name', 'menu_price'])))
+        self.items = menus_df[menus_df['menu_name'].notna()].reset_index(drop=True)
+        self.restaurant_ids = pd.to_numeric(self.items['restaurant_id'], errors='coerce').to_numpy(dtype=float)
+        prices = pd.to_numeric(self.items['menu_price'], errors='coerce').to_numpy(dtype=float)
+        priced = np.flatnonzero(~np.isnan(prices))
+        self.rows_by_price = priced[np.argsort(prices[priced], kind='stable')]
+        self.sorted_prices = prices[self.rows_by_price]
+        postings = defaultdict(list)
+        for row_position, menu_name in enumerate(self.items['menu_name']):
+            for token in set(menu_tokens(menu_name)):
+                postings[token].append(row_position)
+        self.postings = {token: np.array(rows, dtype=np.int64) for token, rows in postings.items()}
+
+    def matching_rows(self, dish_query=None, min_price=None, max_price=None):
+        """Returns the item rows whose name has every query token and whose price is in range."""
+        rows = None
+        if min_price is not None or max_price is not None:
+            low = np.searchsorted(self.sorted_prices, min_price, side='left') if min_price is not None else 0
+            high = np.searchsorted(self.sorted_prices, max_price, side='right') if max_price is not None else len(self.sorted_prices)
+            rows = np.sort(self.rows_by_price[low:high])
+        for token in menu_tokens(dish_query or ""):
+            posting = self.postings.get(token, np.empty(0, dtype=np.int64))
+            rows = posting if rows is None else np.intersect1d(rows, posting, assume_unique=True)
+        return np.arange(len(self.items)) if rows is None else rows
+
+    def matches_by_restaurant(self, dish_query=None, min_price=None, max_price=None):
+        """Returns {restaurant ID: [item label, ...]} for the matching items."""
+        matches = defaultdict(list)
+        for row_position in self.matching_rows(dish_query, min_price, max_price):
+            restaurant_id = self.restaurant_ids[row_position]
+            if np.isnan(restaurant_id):
+                continue
+            item = self.items.iloc[row_position]
+            price = pd.to_numeric(item.get('menu_price'), errors='coerce')
+            matches[int(restaurant_id)].append(f"{item['menu_name']} (${price:,.0f})" if pd.notna(price) else str(item['menu_name']))
+        return dict(matches)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def build_menu_catalogue(versions):
+    """Builds the menu catalogue once per version of the menu partitions it covers."""
+    return MenuCatalogue(load_partitions("menus", versions))
+
+def get_menu_catalogue(partitions=None):
+    """Returns the catalogue over the given menu partitions (all of them by default)."""
+    if partitions is None:
+        partitions = sorted(get_partition_manifest()["partitions"])
+    return build_menu_catalogue(partition_versions("menus", partitions))
+
+def build_menu_items_html(menu_items):
+    """Builds one HTML block listing a restaurant's structured menu items with prices."""
+    entries = []
+    for item in menu_items:
+        price = pd.to_numeric(item.get('menu_price'), errors='coerce')
+        price_str = f" — ${price:,.2f}" if pd.notna(price) else ""
+        description = item.get('menu_description')
+        description_html = f'<div class="review-meta">{html.escape(str(description))}</div>' if pd.notna(description) and str(description).strip() else ""
+        entries.append(f'<div class="review-entry"><strong>{html.escape(str(item["menu_name"]))}</strong>{price_str}{description_html}</div>')
+    return "".join(entries)
+
+# --- Media Catalogue ---
+# Each media partition is indexed once per version into restaurant ID -> records in
+# position order, so "image i of restaurant r" (the gallery carousel) and the cover
+# position are list lookups rather than a filter and sort of the table on every rerun.
+@st.cache_resource(max_entries=32, show_spinner=False)
+def load_media_catalogue(csv_file, version):
+    """Reads a media partition and groups its records by restaurant, ordered by position."""
+    media_df = pd.read_csv(csv_file)
+    media_df = media_df[pd.to_numeric(media_df['restaurant_id'], errors='coerce').notna()]
+    media_df = media_df.sort_values(['restaurant_id', 'position'], kind='stable')
+    return {
+        int(restaurant_id): group.to_dict(orient="records")
+        for restaurant_id, group in media_df.groupby('restaurant_id', sort=False)
+    }
+
+def load_restaurant_media(restaurant_id):
+    """
+    Returns a restaurant's media records in position order; image i of the restaurant is
+    element i. This session's uncommitted media writes are overlaid first.
+    """
+    try:
+        if pending_session_writes("media"):
+            media_df = load_table_rows("media", restaurant_id)
+            return media_df.sort_values('position', kind='stable').to_dict(orient="records")
+        csv_file = partition_file("media", restaurant_partition(restaurant_id))
+        if not os.path.exists(csv_file):
+            return []
+        return load_media_catalogue(csv_file, file_version(csv_file)).get(int(restaurant_id), [])
+    except Exception as e:
+        st.error(f"Error loading the media catalogue: {e}")
+        return []
+
+def cover_position(media_records):
+    """Returns the position of the cover image, or 0 when no image is flagged as the cover."""
+    for position, record in enumerate(media_records):
+        if record.get('is_cover') in (True, "True"):
+            return position
+    return 0
+
 # --- Function to Add a New Gallery Image to CSV ---
-def add_gallery_image_to_csv(restaurant_name, file_name, file_type, base64_data):
-    """Adds a new gallery image to the gallery_images.csv file."""
+def add_gallery_image_to_csv(restaurant_id, restaurant_name, file_name, file_type, media_key):
+    """Adds a new gallery image, already saved to the media folder, to the end of the restaurant's media."""
     try:
-        gallery_df = pd.read_csv(GALLERY_CSV_FILE)
-        new_image = pd.DataFrame([{
+        if not check_write_allowed("photo"):
+            return False
+        new_image = {
+            "restaurant_id": restaurant_id,
             "restaurant_name": restaurant_name,
+            "position": len(load_restaurant_media(restaurant_id)),
+            "is_cover": False,
+            "media_type": "image",
             "file_name": file_name,
             "file_type": file_type,
-            "base64_data": base64_data,
+            "media_key": media_key,
+            "url": None,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }])
-        gallery_df = pd.concat([gallery_df, new_image], ignore_index=True)
-        gallery_df.to_csv(GALLERY_CSV_FILE, index=False)
+        }
+        submit_writes([{"table": "media", "op": "append", "row": new_image}])
         return True
     except Exception as e:
         st.error(f"Error saving new gallery image to CSV: {e}")
         return False
+        
+# --- Near-Duplicate Image Detection ---
+# Every image gets a 64-bit difference hash (dHash): the picture is shrunk to 9x8 grey
+# pixels and each bit records whether a pixel is brighter than its right-hand neighbour.
+# Resized or re-encoded copies land within a few bits of each other, and a BK-tree over the
+# hashes answers "which images are within k bits of this one" without comparing against all.
+# Hashes are remembered per content digest, so each distinct file is only decoded once.
+IMAGE_HASH_SIZE = 8
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+IMAGE_HASHES_FILE = os.path.join("data", "image_hashes.json")
+
+def difference_hash(image, hash_size=IMAGE_HASH_SIZE):
+    """Returns the dHash of a Pillow image as an integer of hash_size * hash_size bits."""
+    grey = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(grey, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count("1")
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes. Each child edge is labelled with its Hamming
+    distance to the parent, so a search only descends edges the triangle inequality allows.
+    Nodes are [hash, items, children].
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = node[2][distance]
+
+    def discard(self, value, item):
+        """Removes an item; its node stays in place as a routing node."""
+        node = self.root
+        while node is not None:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                if item in node[1]:
+                    node[1].remove(item)
+                return
+            node = node[2].get(distance)
+
+    def search(self, value, max_distance):
+        """Returns [(distance, item)] for every item within max_distance of the value."""
+        matches = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node_value, items, children = nodes.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    nodes.append(child)
+        return sorted(matches)
+
+# One stored image: cover or gallery photo, owning restaurant, original file name and content key
+ImageReference = namedtuple("ImageReference", ["source", "restaurant_id", "restaurant_name", "file_name", "media_key"])
+
+class ImageHashIndex:
+    """
+    Process-wide BK-tree over the perceptual hashes of every image in the media catalogue,
+    kept in step with queued writes.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.hashes_by_digest = {}
+        if os.path.exists(IMAGE_HASHES_FILE):
+            with open(IMAGE_HASHES_FILE) as hashes_file:
+                self.hashes_by_digest = {digest: int(value, 16) for digest, value in json.load(hashes_file).items()}
+        self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            self.tree = BKTree()
+            self.reference_hashes = {}
+            memo_size = len(self.hashes_by_digest)
+            for row in load_table("media").to_dict(orient="records"):
+                self._add_media_row(row)
+            if len(self.hashes_by_digest) != memo_size:
+                self._save_hashes()
+
+    def _add_media_row(self, row, restaurant_name=None):
+        media_key = row.get("media_key")
+        restaurant_id = row.get("restaurant_id")
+        if not isinstance(media_key, str) or not media_key or pd.isna(restaurant_id):
+            return
+        source = "cover" if row.get("is_cover") in (True, "True") else "gallery"
+        file_name = row.get("file_name") if isinstance(row.get("file_name"), str) else ""
+        reference = ImageReference(source, int(restaurant_id), restaurant_name or row.get("restaurant_name"), file_name, media_key)
+        if reference in self.reference_hashes:
+            return
+        digest = media_key.split(".")[0]
+        if digest not in self.hashes_by_digest:
+            try:
+                with Image.open(os.path.join(MEDIA_DIR, media_key)) as image:
+                    self.hashes_by_digest[digest] = difference_hash(image)
+            except Exception:
+                # Missing or undecodable files (e.g. PDFs) are simply left out of the index
+                return
+        value = self.hashes_by_digest[digest]
+        self.tree.add(value, reference)
+        self.reference_hashes[reference] = value
+
+    def _remove_references(self, predicate):
+        for reference in [ref for ref in self.reference_hashes if predicate(ref)]:
+            self.tree.discard(self.reference_hashes.pop(reference), reference)
+
+    def _save_hashes(self):
+        temp_path = f"{IMAGE_HASHES_FILE}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as hashes_file:
+            json.dump({digest: f"{value:016x}" for digest, value in self.hashes_by_digest.items()}, hashes_file)
+        os.replace(temp_path, IMAGE_HASHES_FILE)
+
+    def remember_media_hash(self, media_key, perceptual_hash):
+        """Records a hash computed at upload, so the file is not decoded again."""
+        with self.lock:
+            digest = media_key.split(".")[0]
+            if digest not in self.hashes_by_digest:
+                self.hashes_by_digest[digest] = perceptual_hash
+                self._save_hashes()
+
+    def near_duplicates(self, media_key, max_distance=NEAR_DUPLICATE_MAX_DISTANCE):
+        """Returns [(distance, ImageReference)] for indexed images that look like a stored media file."""
+        with self.lock:
+            digest = media_key.split(".")[0]
+            if digest not in self.hashes_by_digest:
+                try:
+                    with Image.open(os.path.join(MEDIA_DIR, media_key)) as image:
+                        self.hashes_by_digest[digest] = difference_hash(image)
+                except Exception:
+                    return []
+            return self.tree.search(self.hashes_by_digest[digest], max_distance)
+
+    def apply_writes(self, seq, mutations):
+        """Keeps the index in step with a write just queued on the write-behind queue."""
+        with self.lock:
+            for mutation in mutations:
+                table, op = mutation["table"], mutation["op"]
+                if table == "media" and op == "append":
+                    self._add_media_row(mutation["row"])
+                elif table == "media" and op == "delete" and mutation["match"][0] == "restaurant_id":
+                    restaurant_id = int(mutation["match"][1])
+                    self._remove_references(lambda ref: ref.restaurant_id == restaurant_id)
+                elif table == "restaurants" and op == "update" and mutation["match"][0] == "ID" and "Name" in mutation["values"]:
+                    # Keep the names shown in duplicate warnings current after a rename
+                    restaurant_id = int(mutation["match"][1])
+                    owned = [ref for ref in self.reference_hashes if ref.restaurant_id == restaurant_id]
+                    self._remove_references(lambda ref: ref in owned)
+                    for ref in owned:
+                        self._add_media_row({
+                            "restaurant_id": restaurant_id, "is_cover": ref.source == "cover",
+                            "file_name": ref.file_name, "media_key": ref.media_key,
+                        }, restaurant_name=mutation["values"]["Name"])
+
+    def duplicate_clusters(self, max_distance=NEAR_DUPLICATE_MAX_DISTANCE):
+        """
+        Batch pass over every indexed image: groups images connected by near-duplicate
+        links (union-find over BK-tree lookups). Returns a DataFrame with one row per image
+        in a cluster of two or more.
+        """
+        with self.lock:
+            references = list(self.reference_hashes)
+            parent = {ref: ref for ref in references}
+
+            def find(ref):
+                while parent[ref] != ref:
+                    parent[ref] = parent[parent[ref]]
+                    ref = parent[ref]
+                return ref
+
+            for ref in references:
+                for _, other in self.tree.search(self.reference_hashes[ref], max_distance):
+                    parent[find(other)] = find(ref)
+
+            clusters = defaultdict(list)
+            for ref in references:
+                clusters[find(ref)].append(ref)
+            rows = []
+            for cluster_number, members in enumerate(sorted((m for m in clusters.values() if len(m) > 1), key=len, reverse=True), start=1):
+                first_hash = self.reference_hashes[members[0]]
+                for ref in members:
+                    rows.append({
+                        "Cluster": cluster_number,
+                        "Restaurant": ref.restaurant_name,
+                        "Source": ref.source,
+                        "File Name": ref.file_name,
+                        "Distance": hamming_distance(first_hash, self.reference_hashes[ref]),
+                    })
+            return pd.DataFrame(rows, columns=["Cluster", "Restaurant", "Source", "File Name", "Distance"])
+
+@st.cache_resource(show_spinner="Indexing photos...")
+def get_image_hash_index():
+    """Returns the process-wide image hash index, built from every image table on first use."""
+    return get_write_queue().track_index(ImageHashIndex)
+
+def describe_image_reference(reference):
+    """Short label for an indexed image, for duplicate warnings."""
+    label = reference.file_name or "cover image"
+    return f"{label} ({reference.restaurant_name}, {reference.source.replace('_', ' ')})"
+
+# --- Fuzzy Search Index ---
+# Typo-tolerant matching uses a character trigram index over the distinct words in the
+# restaurant names, cuisines, locations and descriptions. A query word only visits the
+# posting lists of its own trigrams, so lookups never scan every row.
+FUZZY_SEARCH_FIELDS = ["Name", "Cuisine", "Location", "Description"]
+
+class FuzzySearchIndex:
+    """Trigram index over restaurant words, mapping fuzzy word matches back to restaurant IDs."""
+
+    def __init__(self):
+        self.word_index = TrigramIndex()
+        self.word_restaurants = defaultdict(set)
+
+    def add_restaurant(self, restaurant_id, texts):
+        for text in texts:
+            if pd.isna(text):
+                continue
+            for word in tokenize(text):
+                self.word_index.add(word, word)
+                self.word_restaurants[word].add(restaurant_id)
+
+    def search(self, query, min_similarity=FUZZY_MIN_SIMILARITY):
+        """
+        Returns [(restaurant_id, score)] for restaurants matching every word of the query
+        approximately, ranked by their average best word similarity.
+        """
+        scores = None
+        for query_word in tokenize(query):
+            word_scores = {}
+            for word, similarity in self.word_index.search(query_word, min_similarity):
+                for restaurant_id in self.word_restaurants[word]:
+                    word_scores[restaurant_id] = max(word_scores.get(restaurant_id, 0.0), similarity)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {rid: scores[rid] + score for rid, score in word_scores.items() if rid in scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        word_count = len(tokenize(query))
+        return sorted(((rid, total / word_count) for rid, total in scores.items()), key=lambda match: -match[1])
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def build_fuzzy_index(df_restaurants):
+    """Builds the fuzzy search index once per version of the restaurant table."""
+    fuzzy_index = FuzzySearchIndex()
+    columns = [col for col in FUZZY_SEARCH_FIELDS if col in df_restaurants.columns]
+    for restaurant_id, *texts in df_restaurants[['ID'] + columns].itertuples(index=False):
+        fuzzy_index.add_restaurant(int(restaurant_id), texts)
+    return fuzzy_index
+
+@st.cache_data(show_spinner=False)
+def suggest_facet_merges(df_restaurants, columns=("Cuisine", "Location"), min_similarity=FACET_MERGE_MIN_SIMILARITY):
+    """
+    Offline pass over the sidebar facets: finds near-duplicate values (typos, case
+    variants) with the trigram index and suggests folding each rarer variant into its
+    most common look-alike. Returns a DataFrame of suggested merges.
+    """
+    suggestions = []
+    for column in columns:
+        value_counts = df_restaurants[column].dropna().astype(str).value_counts()
+        value_index = TrigramIndex()
+        for value in value_counts.index:
+            value_index.add(value, value)
+        for variant, variant_count in value_counts.items():
+            candidates = {value for gram in trigrams(variant) for value in value_index.postings.get(gram, ())}
+            best_match, best_score = None, 0.0
+            for candidate in candidates - {variant}:
+                # Only fold a value into a more common one (ties go to the longer, then capitalised value)
+                if (value_counts[candidate], len(candidate), candidate[:1].isupper()) <= (variant_count, len(variant), variant[:1].isupper()):
+                    continue
+                score = facet_similarity(variant, candidate)
+                if score >= min_similarity and score > best_score:
+                    best_match, best_score = candidate, score
+            if best_match is not None:
+                suggestions.append({
+                    "Column": column,
+                    "Variant": variant,
+                    "Merge Into": best_match,
+                    "Similarity": round(best_score, 2),
+                    "Rows": int(variant_count),
+                })
+    return pd.DataFrame(suggestions, columns=["Column", "Variant", "Merge Into", "Similarity", "Rows"])
+
+# --- Autocomplete Prefix Index ---
+# Search-box and location suggestions come from weighted prefix tries. Every trie node
+# caches its own top-k completions, so a lookup walks only the typed prefix and returns
+# the cached list. Adding a restaurant or review updates the tries in place.
+AUTOCOMPLETE_TOP_K = 5
+AUTOCOMPLETE_MIN_REVIEW_TERM_LENGTH = 4
+AUTOCOMPLETE_STOPWORDS = {
+    "about", "after", "again", "also", "been", "being", "came", "come", "could", "does",
+    "even", "from", "good", "great", "have", "just", "like", "more", "much", "nice",
+    "only", "really", "some", "than", "that", "their", "them", "then", "there", "they",
+    "this", "very", "were", "what", "when", "which", "will", "with", "would", "your",
+}
+
+class PrefixTrie:
+    """Prefix trie over lower-cased keys whose nodes keep their top-k (weight, label) entries."""
+
+    def __init__(self, top_k=AUTOCOMPLETE_TOP_K):
+        self.top_k = top_k
+        self.root = {"children": {}, "top": []}
+        self.weights = {}
+
+    def add(self, key, label, weight=1):
+        """Adds weight to a label reachable under key, updating top-k lists along the path."""
+        key = key.lower()
+        if not key:
+            return
+        total = self.weights.get(label, 0) + weight
+        self.weights[label] = total
+        node = self.root
+        for char in key:
+            node = node["children"].setdefault(char, {"children": {}, "top": []})
+            top = [entry for entry in node["top"] if entry[1] != label]
+            top.append((total, label))
+            top.sort(key=lambda entry: (-entry[0], entry[1]))
+            node["top"] = top[:self.top_k]
+
+    def complete(self, prefix):
+        """Returns the cached [(weight, label)] completions for a prefix."""
+        node = self.root
+        for char in prefix.lower():
+            node = node["children"].get(char)
+            if node is None:
+                return []
+        return node["top"]
+
+class AutocompleteIndex:
+    """
+    Prefix tries for restaurant names, cuisines, locations and frequent review terms,
+    weighted by popularity (reviews per restaurant, restaurants per facet value, term
+    frequency). Appends update the tries in place; edits and deletions mark them stale so
+    they are rebuilt from disk once the write queue has committed the change.
+    """
+    CATEGORIES = ["name", "cuisine", "location", "review"]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tries = {}
+        self.stale_until_seq = None
+        self.rebuild()
+
+    def rebuild(self):
+        tries = {category: PrefixTrie() for category in self.CATEGORIES}
+        restaurants_df = load_table("restaurants")
+        reviews_df = load_table("reviews")
+        review_counts = pd.to_numeric(reviews_df['restaurant_id'], errors='coerce').value_counts()
+        for restaurant in restaurants_df.to_dict(orient="records"):
+            self._add_restaurant(tries, restaurant, 1 + int(review_counts.get(restaurant.get('ID'), 0)))
+        for review_text in reviews_df['review_text'].dropna():
+            self._add_review_terms(tries, review_text)
+        with self.lock:
+            self.tries = tries
+            self.stale_until_seq = None
+
+    @staticmethod
+    def _add_name(tries, name, weight=1):
+        """Adds weight to a restaurant name and refreshes it on every path it is indexed under."""
+        # Index every word start so 'dempsey' also completes 'The Dempsey Cookhouse & Bar'
+        words = name.split()
+        for start in range(len(words)):
+            tries["name"].add(" ".join(words[start:]), name, weight if start == 0 else 0)
+
+    @staticmethod
+    def _add_restaurant(tries, restaurant, weight=1):
+        name = restaurant.get('Name')
+        if isinstance(name, str) and name.strip():
+            AutocompleteIndex._add_name(tries, name, weight)
+        for category, column in [("cuisine", "Cuisine"), ("location", "Location")]:
+            value = restaurant.get(column)
+            if isinstance(value, str) and value.strip():
+                tries[category].add(value, value)
+
+    @staticmethod
+    def _add_review_terms(tries, review_text):
+        for term in tokenize(review_text):
+            if len(term) >= AUTOCOMPLETE_MIN_REVIEW_TERM_LENGTH and term not in AUTOCOMPLETE_STOPWORDS and not term.isdigit():
+                tries["review"].add(term, term)
 
-# --- Function to Load Gallery Images from CSV ---
-def load_gallery_images_from_csv(restaurant_name=None):
-    """Loads gallery images from the CSV file, optionally filtering for a specific restaurant."""
+    def apply_writes(self, seq, mutations):
+        """Keeps the tries in step with a write just queued on the write-behind queue."""
+        with self.lock:
+            for mutation in mutations:
+                if mutation["op"] == "append" and mutation["table"] == "restaurants":
+                    self._add_restaurant(self.tries, mutation["row"])
+                elif mutation["op"] == "append" and mutation["table"] == "reviews":
+                    self._add_review_terms(self.tries, mutation["row"].get("review_text", ""))
+                    restaurant_name = mutation["row"].get("restaurant_name")
+                    if restaurant_name in self.tries["name"].weights:
+                        self._add_name(self.tries, restaurant_name)
+                elif mutation["table"] == "restaurants":
+                    # Renames and deletions cannot be patched into the top-k lists; rebuild later
+                    self.stale_until_seq = seq
+
+    def complete(self, prefix, categories=None, limit=AUTOCOMPLETE_TOP_K):
+        """Returns up to `limit` suggestions for a prefix, merged across categories by weight."""
+        if self.stale_until_seq is not None and get_write_queue().committed_seq >= self.stale_until_seq:
+            get_write_queue().refresh_index(self)
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        with self.lock:
+            entries = [entry for category in (categories or self.CATEGORIES) for entry in self.tries[category].complete(prefix)]
+        suggestions = []
+        for _, label in sorted(entries, key=lambda entry: (-entry[0], entry[1])):
+            if label not in suggestions and label.lower() != prefix.lower():
+                suggestions.append(label)
+        return suggestions[:limit]
+
+@st.cache_resource
+def get_autocomplete_index():
+    """Returns the process-wide autocomplete index, built from the CSVs on first use."""
+    return get_write_queue().track_index(AutocompleteIndex)
+
+def apply_search_suggestion(prefix_text, suggestion):
+    """Button callback: replaces the term being typed in the search box with a suggestion."""
+    # '&' and ',' are query operators, so they are dropped from inserted names
+    st.session_state.search_query = prefix_text + re.sub(r"\s*[&,]\s*", " ", suggestion)
+
+def apply_location_suggestion(suggestion):
+    """Button callback: fills the new-location input with an existing location."""
+    st.session_state.new_location_text_input = suggestion
+
+# --- Similar Restaurants ---
+# Each restaurant is a sparse TF-IDF vector (a dict of term -> weight) over its description,
+# cuisine, price range and review text. Neighbours are found through an inverted index, so
+# a restaurant is only compared with restaurants sharing at least one term, and the top-k
+# lists are computed once per process. Saving a review or editing a restaurant refreshes
+# only that restaurant's vector and patches it into the other lists. IDF weights are taken
+# from the live document frequencies, so older vectors drift slightly until the next start.
+SIMILAR_RESTAURANTS_TOP_K = 5
+SIMILAR_MIN_TERM_LENGTH = 3
+
+def text_terms(text):
+    """Returns the term counts of a free-text field; blank (NaN) fields have none."""
+    if text is None or pd.isna(text):
+        return Counter()
+    return Counter(
+        term for term in tokenize(text)
+        if len(term) >= SIMILAR_MIN_TERM_LENGTH and term not in AUTOCOMPLETE_STOPWORDS
+    )
+
+def restaurant_terms(restaurant):
+    """Returns the term counts of a restaurant's own fields (reviews are added separately)."""
+    terms = text_terms(restaurant.get('Description'))
+    # Whole-field tokens make cuisine and price band matches count as a unit
+    for column in ['Cuisine', 'Price Range']:
+        value = restaurant.get(column)
+        if isinstance(value, str) and value.strip():
+            terms[f"{column.lower()}={value.strip().lower()}"] += 2
+    cuisine = restaurant.get('Cuisine')
+    if isinstance(cuisine, str):
+        terms.update(term for term in tokenize(cuisine) if len(term) >= SIMILAR_MIN_TERM_LENGTH)
+    return terms
+
+def review_terms(review_text):
+    """Returns the term counts of one review's text."""
+    return text_terms(review_text)
+
+class SimilarRestaurantsIndex:
+    """Sparse TF-IDF vectors with an inverted index and precomputed top-k neighbour lists."""
+
+    def __init__(self, k=SIMILAR_RESTAURANTS_TOP_K):
+        self.k = k
+        self.lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self):
+        restaurants_df = load_table("restaurants")
+        reviews_df = load_table("reviews")
+        with self.lock:
+            self.restaurants = {}
+            self.field_terms = {}
+            self.review_terms = defaultdict(Counter)
+            self.vectors = {}
+            self.postings = defaultdict(dict)
+            self.document_terms = {}
+            self.document_frequency = Counter()
+            self.neighbours = {}
+            for restaurant in restaurants_df.dropna(subset=['ID']).to_dict(orient="records"):
+                restaurant_id = int(restaurant['ID'])
+                self.restaurants[restaurant_id] = restaurant
+                self.field_terms[restaurant_id] = restaurant_terms(restaurant)
+            for restaurant_id, review_text in zip(pd.to_numeric(reviews_df['restaurant_id'], errors='coerce'), reviews_df['review_text']):
+                if pd.notna(restaurant_id) and int(restaurant_id) in self.restaurants:
+                    self.review_terms[int(restaurant_id)].update(review_terms(review_text))
+            for restaurant_id in self.restaurants:
+                self.document_terms[restaurant_id] = set(self._terms(restaurant_id))
+                self.document_frequency.update(self.document_terms[restaurant_id])
+            for restaurant_id in self.restaurants:
+                self._set_vector(restaurant_id, self._vectorize(restaurant_id))
+            for restaurant_id in self.restaurants:
+                self.neighbours[restaurant_id] = self._top_k(self._scores(restaurant_id))
+
+    def _terms(self, restaurant_id):
+        return self.field_terms[restaurant_id] + self.review_terms[restaurant_id]
+
+    def _vectorize(self, restaurant_id):
+        """Builds the L2-normalised TF-IDF vector of a restaurant as a term -> weight dict."""
+        document_count = max(len(self.restaurants), 1)
+        vector = {
+            term: (1 + math.log(count)) * math.log((1 + document_count) / (1 + self.document_frequency[term]))
+            for term, count in self._terms(restaurant_id).items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items() if weight > 0} if norm else {}
+
+    def _set_vector(self, restaurant_id, vector):
+        for term in self.vectors.get(restaurant_id, {}):
+            self.postings[term].pop(restaurant_id, None)
+        self.vectors[restaurant_id] = vector
+        for term, weight in vector.items():
+            self.postings[term][restaurant_id] = weight
+
+    def _scores(self, restaurant_id):
+        """Cosine similarity to every restaurant sharing a term, via the inverted index."""
+        scores = defaultdict(float)
+        for term, weight in self.vectors.get(restaurant_id, {}).items():
+            for other_id, other_weight in self.postings[term].items():
+                if other_id != restaurant_id:
+                    scores[other_id] += weight * other_weight
+        return scores
+
+    def _top_k(self, scores):
+        return heapq.nlargest(self.k, ((score, other_id) for other_id, score in scores.items() if score > 0))
+
+    def _refresh(self, restaurant_id):
+        """Recomputes one restaurant's vector and neighbours and patches the other lists."""
+        old_terms = self.document_terms.get(restaurant_id, set())
+        new_terms = set(self._terms(restaurant_id))
+        self.document_frequency.subtract(old_terms - new_terms)
+        self.document_frequency.update(new_terms - old_terms)
+        self.document_terms[restaurant_id] = new_terms
+        self._set_vector(restaurant_id, self._vectorize(restaurant_id))
+        scores = self._scores(restaurant_id)
+        self.neighbours[restaurant_id] = self._top_k(scores)
+        for other_id, other_neighbours in self.neighbours.items():
+            if other_id == restaurant_id:
+                continue
+            old_score = next((listed_score for listed_score, listed_id in other_neighbours if listed_id == restaurant_id), None)
+            if old_score is None and other_id not in scores:
+                continue
+            remaining = [entry for entry in other_neighbours if entry[1] != restaurant_id]
+            score = scores.get(other_id, 0.0)
+            if old_score is not None and score < old_score and len(other_neighbours) == self.k:
+                # A listed neighbour scoring lower may now be outranked by an unlisted restaurant
+                self.neighbours[other_id] = self._top_k(self._scores(other_id))
+            elif score > 0 and (len(remaining) < self.k or score > remaining[-1][0]):
+                self.neighbours[other_id] = heapq.nlargest(self.k, remaining + [(score, restaurant_id)])
+            elif old_score is not None:
+                self.neighbours[other_id] = remaining
+
+    def _remove(self, restaurant_id):
+        self._set_vector(restaurant_id, {})
+        self.document_frequency.subtract(self.document_terms.get(restaurant_id, set()))
+        for store in (self.restaurants, self.field_terms, self.review_terms, self.document_terms, self.vectors, self.neighbours):
+            store.pop(restaurant_id, None)
+        for other_id, other_neighbours in list(self.neighbours.items()):
+            if any(listed_id == restaurant_id for _, listed_id in other_neighbours):
+                self.neighbours[other_id] = self._top_k(self._scores(other_id))
+
+    def apply_writes(self, seq, mutations):
+        """Refreshes only the restaurants touched by a write just queued on the write-behind queue."""
+        with self.lock:
+            for mutation in mutations:
+                if mutation["table"] == "reviews" and mutation["op"] == "append":
+                    restaurant_id = int(mutation["row"]["restaurant_id"])
+                    if restaurant_id in self.restaurants:
+                        self.review_terms[restaurant_id].update(review_terms(mutation["row"].get("review_text", "")))
+                        self._refresh(restaurant_id)
+                elif mutation["table"] == "restaurants" and mutation["op"] == "append":
+                    restaurant_id = int(mutation["row"]["ID"])
+                    self.restaurants[restaurant_id] = dict(mutation["row"])
+                    self.field_terms[restaurant_id] = restaurant_terms(mutation["row"])
+                    self._refresh(restaurant_id)
+                elif mutation["table"] == "restaurants":
+                    column, value = mutation["match"]
+                    matched_ids = [rid for rid, restaurant in self.restaurants.items() if restaurant.get(column) == value]
+                    for restaurant_id in matched_ids:
+                        if mutation["op"] == "delete":
+                            self._remove(restaurant_id)
+                        else:
+                            self.restaurants[restaurant_id].update(mutation["values"])
+                            self.field_terms[restaurant_id] = restaurant_terms(self.restaurants[restaurant_id])
+                            self._refresh(restaurant_id)
+
+    def similar(self, restaurant_id):
+        """Returns [(name, similarity)] of a restaurant's precomputed neighbours, best first."""
+        with self.lock:
+            return [
+                (self.restaurants[other_id]['Name'], score)
+                for score, other_id in self.neighbours.get(int(restaurant_id), [])
+                if other_id in self.restaurants
+            ]
+
+@st.cache_resource
+def get_similar_restaurants_index():
+    """Returns the process-wide similar-restaurants index, built from the CSVs on first use."""
+    return get_write_queue().track_index(SimilarRestaurantsIndex)
+
+# --- Spatial Index ---
+# Restaurant coordinates are bucketed into a uniform grid of ~1 km cells. A radius query
+# only visits the cells overlapping the circle's bounding box, and a nearest-k query visits
+# rings of cells outward from the query point until no unvisited cell can hold a closer
+# restaurant, so neither scans the whole table.
+SPATIAL_CELL_DEGREES = 0.01
+KM_PER_DEGREE = 111.32
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat_a, lon_a, lat_b, lon_b):
+    """Great-circle distance in kilometres between two points given in degrees."""
+    lat_a, lon_a, lat_b, lon_b = map(np.radians, (lat_a, lon_a, lat_b, lon_b))
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return float(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)))
+
+class SpatialGridIndex:
+    """Uniform latitude/longitude grid over restaurant coordinates for radius and nearest-k queries."""
+
+    def __init__(self, cell_degrees=SPATIAL_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = defaultdict(list)
+        self.size = 0
+
+    def _cell(self, lat, lon):
+        return int(np.floor(lat / self.cell_degrees)), int(np.floor(lon / self.cell_degrees))
+
+    def add(self, key, lat, lon):
+        self.cells[self._cell(lat, lon)].append((key, lat, lon))
+        self.size += 1
+
+    def _ring(self, center, radius):
+        """Yields the cells at exactly `radius` cells (Chebyshev distance) from the center cell."""
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for offset in range(-radius, radius + 1):
+            yield (row - radius, col + offset)
+            yield (row + radius, col + offset)
+        for offset in range(-radius + 1, radius):
+            yield (row + offset, col - radius)
+            yield (row + offset, col + radius)
+
+    def within_radius(self, lat, lon, radius_km):
+        """Returns {key: distance_km} for every point within radius_km of (lat, lon)."""
+        row, col = self._cell(lat, lon)
+        row_span = int(np.ceil(radius_km / (KM_PER_DEGREE * self.cell_degrees)))
+        col_span = int(np.ceil(radius_km / (KM_PER_DEGREE * self.cell_degrees * max(np.cos(np.radians(lat)), 0.01))))
+        distances = {}
+        for cell_row in range(row - row_span, row + row_span + 1):
+            for cell_col in range(col - col_span, col + col_span + 1):
+                for key, point_lat, point_lon in self.cells.get((cell_row, cell_col), ()):
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    if distance <= radius_km:
+                        distances[key] = distance
+        return distances
+
+    def nearest(self, lat, lon, k, allowed_keys=None):
+        """
+        Returns {key: distance_km} for the k points nearest to (lat, lon), optionally
+        restricted to allowed_keys so other filters can be applied first.
+        """
+        center = self._cell(lat, lon)
+        # Everything outside the rings visited so far is at least this far per ring
+        ring_km = KM_PER_DEGREE * self.cell_degrees * max(np.cos(np.radians(abs(lat) + 1)), 0.01)
+        candidates = []
+        visited = 0
+        radius = 0
+        while visited < self.size:
+            for cell in self._ring(center, radius):
+                for key, point_lat, point_lon in self.cells.get(cell, ()):
+                    visited += 1
+                    if allowed_keys is None or key in allowed_keys:
+                        candidates.append((haversine_km(lat, lon, point_lat, point_lon), key))
+            candidates = sorted(candidates)[:k]
+            if len(candidates) == k and candidates[-1][0] <= radius * ring_km:
+                break
+            radius += 1
+        return {key: distance for distance, key in candidates}
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def build_spatial_index(df_restaurants):
+    """Builds the spatial index once per version of the restaurant table."""
+    spatial_index = SpatialGridIndex()
+    located = df_restaurants.dropna(subset=['Latitude', 'Longitude'])
+    for restaurant_id, lat, lon in located[['ID', 'Latitude', 'Longitude']].itertuples(index=False):
+        spatial_index.add(int(restaurant_id), float(lat), float(lon))
+    return spatial_index
+
+# --- Private Room Bookings ---
+# Bookings live in bookings.csv and are mirrored by a process-wide interval index, which
+# is the authority for conflict checks: a booking is checked and queued under the index
+# lock, so two sessions cannot take the same slot. Each restaurant has one private room
+# today; the room column leaves space for more.
+PRIVATE_ROOM_NAME = "Private Room"
+BOOKING_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+class BookingIndex:
+    """
+    Sorted-interval index of private-room bookings, one sorted list per room. Bookings in
+    a room never overlap, so sorting them by start also sorts their ends, and a conflict
+    check is a single binary search: only the last booking starting before the requested
+    end can overlap the requested slot.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.rooms = defaultdict(lambda: ([], []))
+        self.bookings = {}
+        self.next_booking_id = 1
+        self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            self.rooms.clear()
+            self.bookings.clear()
+            bookings_df = pd.read_csv(BOOKINGS_CSV_FILE)
+            for booking in bookings_df.to_dict(orient="records"):
+                self._insert(booking)
+            self.next_booking_id = int(bookings_df['booking_id'].max()) + 1 if not bookings_df.empty else 1
+
+    @staticmethod
+    def _room_key(restaurant_id, room=PRIVATE_ROOM_NAME):
+        return int(restaurant_id), room
+
+    def _insert(self, booking):
+        booking_id = int(booking["booking_id"])
+        start = datetime.strptime(booking["start"], BOOKING_TIME_FORMAT)
+        end = datetime.strptime(booking["end"], BOOKING_TIME_FORMAT)
+        starts, entries = self.rooms[self._room_key(booking["restaurant_id"], booking["room"])]
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        entries.insert(position, (end, booking_id))
+        self.bookings[booking_id] = booking
+
+    def _remove(self, booking_id):
+        booking = self.bookings.pop(booking_id)
+        starts, entries = self.rooms[self._room_key(booking["restaurant_id"], booking["room"])]
+        start = datetime.strptime(booking["start"], BOOKING_TIME_FORMAT)
+        position = bisect.bisect_left(starts, start)
+        while entries[position][1] != booking_id:
+            position += 1
+        del starts[position], entries[position]
+
+    def apply_writes(self, seq, mutations):
+        """Keeps the index in step with booking writes queued on the write-behind queue."""
+        with self.lock:
+            for mutation in mutations:
+                if mutation["table"] != "bookings":
+                    continue
+                if mutation["op"] == "append":
+                    self._insert(mutation["row"])
+                    self.next_booking_id = max(self.next_booking_id, int(mutation["row"]["booking_id"]) + 1)
+                elif mutation["op"] == "delete":
+                    column, value = mutation["match"]
+                    for booking_id in [bid for bid, booking in self.bookings.items() if booking[column] == value]:
+                        self._remove(booking_id)
+
+    def conflict(self, restaurant_id, start, end, room=PRIVATE_ROOM_NAME):
+        """Returns the booking overlapping [start, end) in the room, or None if it is free."""
+        starts, entries = self.rooms.get(self._room_key(restaurant_id, room), ([], []))
+        position = bisect.bisect_left(starts, end)
+        if position and entries[position - 1][0] > start:
+            return self.bookings[entries[position - 1][1]]
+        return None
+
+    def is_free(self, restaurant_id, start, end, room=PRIVATE_ROOM_NAME):
+        return self.conflict(restaurant_id, start, end, room) is None
+
+    def upcoming(self, restaurant_id, after, limit=5, room=PRIVATE_ROOM_NAME):
+        """Returns the next bookings in the room that end after `after`, earliest first."""
+        starts, entries = self.rooms.get(self._room_key(restaurant_id, room), ([], []))
+        position = bisect.bisect_right(entries, (after, float("inf")))
+        return [self.bookings[booking_id] for _, booking_id in entries[position:position + limit]]
+
+@st.cache_resource
+def get_booking_index():
+    """Returns the process-wide booking index, loaded from bookings.csv on first use."""
+    return get_write_queue().track_index(BookingIndex)
+
+def book_private_room(restaurant_id, restaurant_name, start, end, party_size, booked_by, max_capacity):
+    """
+    Checks the requested slot against the booking index and queues the booking if the
+    room is free. Returns True on success; warns and returns False otherwise.
+    """
     try:
-        gallery_df = pd.read_csv(GALLERY_CSV_FILE)
-        if restaurant_name:
-            restaurant_images = gallery_df[gallery_df["restaurant_name"] == restaurant_name]
-            return restaurant_images.to_dict(orient="records")
-        return gallery_df
-    except FileNotFoundError:
-        return pd.DataFrame() if not restaurant_name else []
+        if end <= start:
+            st.warning("The booking must end after it starts.")
+            return False
+        if start < datetime.now():
+            st.warning("Bookings cannot start in the past.")
+            return False
+        if pd.notna(max_capacity) and party_size > max_capacity:
+            st.warning(f"The private room holds at most {int(max_capacity)} guests.")
+            return False
+        build_write_indexes()
+        booking_index = get_booking_index()
+        # The index is only patched under the write queue's lock, so holding it makes the
+        # conflict check and the queued booking atomic
+        with get_write_queue().lock:
+            conflict = booking_index.conflict(restaurant_id, start, end)
+            if conflict is not None:
+                st.warning(f"The room is already booked from {conflict['start']} to {conflict['end']}.")
+                return False
+            new_booking = {
+                "booking_id": booking_index.next_booking_id,
+                "restaurant_id": int(restaurant_id),
+                "restaurant_name": restaurant_name,
+                "room": PRIVATE_ROOM_NAME,
+                "start": start.strftime(BOOKING_TIME_FORMAT),
+                "end": end.strftime(BOOKING_TIME_FORMAT),
+                "party_size": int(party_size),
+                "booked_by": booked_by,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            submit_writes([{"table": "bookings", "op": "append", "row": new_booking}])
+        return True
     except Exception as e:
-        st.error(f"Error loading gallery images from CSV: {e}")
-        return pd.DataFrame() if not restaurant_name else []
-        
+        st.error(f"Error saving booking to CSV: {e}")
+        return False
+
+def cancel_booking(booking_id):
+    """Queues the cancellation of a booking, which frees its slot immediately."""
+    try:
+        submit_writes([{"table": "bookings", "op": "delete", "match": ("booking_id", int(booking_id))}])
+        return True
+    except Exception as e:
+        st.error(f"Error cancelling booking: {e}")
+        return False
+
 # --- Function to find restaurants based on filters ---
-def find_restaurants(df_restaurants, df_reviews, search_query, selected_cuisine, selected_location_filter, selected_price_range, min_rating, selected_private_room_filter, min_capacity_filter):
+def find_restaurants(df_restaurants, df_reviews, search_query, selected_cuisine, selected_location_filter, selected_price_range, min_rating, selected_private_room_filter, min_capacity_filter, fuzzy_index=None, spatial_index=None, near_point=None, radius_km=None, nearest_k=None, booking_index=None, availability_window=None, menu_catalogue=None, dish_query=None, max_menu_price=None):
     """
     Finds restaurants based on the provided filters and an improved search query,
     now including support for exact phrases (""), AND (&), and OR (,) conditions.
+    Unquoted terms also match approximately through the fuzzy index, with fuzzy-only
+    matches ranked after exact ones by similarity.
+    With a near_point (latitude, longitude), results are limited to those within
+    radius_km or to the nearest_k matches, sorted by a 'Distance (km)' column.
+    With an availability_window (start, end), only restaurants whose private room is
+    free for the whole window are kept.
+    With a dish_query and/or max_menu_price, only restaurants with a matching structured
+    menu item are kept, and the items are listed in a 'Menu Matches' column.
     """
     filtered_df = df_restaurants.copy()
     
@@ -479,12 +3070,12 @@ def find_restaurants(df_restaurants, df_reviews, search_query, selected_cuisine,
                 ]
                 
                 # Find matching restaurants based on review text
-                matching_review_names = df_reviews[
+                matching_review_ids = df_reviews[
                     df_reviews['review_text'].str.contains(re.escape(exact_phrase), case=False, na=False)
-                ]['restaurant_name'].unique()
-                review_matches = filtered_df[filtered_df['Name'].isin(matching_review_names)]
+                ]['restaurant_id'].unique()
+                review_matches = filtered_df[filtered_df['ID'].isin(matching_review_ids)]
                 
-                current_matches = pd.concat([name_desc_matches, review_matches]).drop_duplicates(subset=["Name"])
+                current_matches = pd.concat([name_desc_matches, review_matches]).drop_duplicates(subset=["ID"])
                 
             else:
                 # Regular substring search for the term
@@ -494,22 +3085,28 @@ def find_restaurants(df_restaurants, df_reviews, search_query, selected_cuisine,
                 ]
                 
                 # Find matching restaurants based on review text
-                matching_review_names = df_reviews[
+                matching_review_ids = df_reviews[
                     df_reviews['review_text'].str.contains(term, case=False, na=False)
-                ]['restaurant_name'].unique()
-                review_matches = filtered_df[filtered_df['Name'].isin(matching_review_names)]
+                ]['restaurant_id'].unique()
+                review_matches = filtered_df[filtered_df['ID'].isin(matching_review_ids)]
+
+                # Typo-tolerant matches on names, cuisines, locations and descriptions
+                fuzzy_matches = filtered_df.iloc[0:0]
+                if fuzzy_index is not None:
+                    fuzzy_rank = {restaurant_id: rank for rank, (restaurant_id, _) in enumerate(fuzzy_index.search(term))}
+                    fuzzy_matches = filtered_df[filtered_df['ID'].isin(fuzzy_rank)].sort_values(by='ID', key=lambda ids: ids.map(fuzzy_rank))
                 
-                current_matches = pd.concat([name_desc_matches, review_matches]).drop_duplicates(subset=["Name"])
+                current_matches = pd.concat([name_desc_matches, review_matches, fuzzy_matches]).drop_duplicates(subset=["ID"])
             
             if operator == 'OR':
-                combined_matches = pd.concat([combined_matches, current_matches]).drop_duplicates(subset=["Name"])
+                combined_matches = pd.concat([combined_matches, current_matches]).drop_duplicates(subset=["ID"])
             elif operator == 'AND':
                 if first_term:
                     combined_matches = current_matches
                     first_term = False
                 else:
                     # Keep only restaurants that are in both the previous and current matches
-                    combined_matches = combined_matches.merge(current_matches, on=filtered_df.columns.tolist())
+                    combined_matches = combined_matches[combined_matches['ID'].isin(current_matches['ID'])]
         
         # Apply the search results for subsequent filtering
         filtered_df = combined_matches.reset_index(drop=True)
@@ -532,9 +3129,419 @@ def find_restaurants(df_restaurants, df_reviews, search_query, selected_cuisine,
             # Check for NaN values before filtering
             filtered_df = filtered_df[pd.to_numeric(filtered_df['Max Capacity'], errors='coerce').notna()]
             filtered_df = filtered_df[filtered_df["Max Capacity"] >= min_capacity_filter]
-    
+        if selected_private_room_filter == "Yes" and booking_index is not None and availability_window is not None:
+            # One binary search per room rather than a scan of every booking
+            is_free = filtered_df['ID'].map(lambda restaurant_id: booking_index.is_free(restaurant_id, *availability_window))
+            filtered_df = filtered_df[is_free.astype(bool)]
+
+    if menu_catalogue is not None and (dish_query or max_menu_price is not None):
+        menu_matches = menu_catalogue.matches_by_restaurant(dish_query, max_price=max_menu_price)
+        filtered_df = filtered_df[filtered_df['ID'].isin(menu_matches.keys())].copy()
+        filtered_df['Menu Matches'] = filtered_df['ID'].map(lambda restaurant_id: ", ".join(menu_matches[restaurant_id]))
+
+    # 3. Apply the distance filter last, so "nearest" means nearest among the other matches
+    if spatial_index is not None and near_point is not None and (radius_km or nearest_k):
+        if nearest_k:
+            distances = spatial_index.nearest(*near_point, int(nearest_k), allowed_keys=set(filtered_df['ID'].astype(int)))
+        else:
+            distances = spatial_index.within_radius(*near_point, radius_km)
+        filtered_df = filtered_df[filtered_df['ID'].isin(distances.keys())].copy()
+        filtered_df['Distance (km)'] = filtered_df['ID'].map(distances)
+        filtered_df = filtered_df.sort_values('Distance (km)', kind='stable')
+
     return filtered_df
-    
+
+# --- Search Result Cache ---
+# Every rerun used to recompute find_restaurants, even when only an unrelated widget
+# changed. Results are kept as ordered restaurant IDs (plus any computed columns) in a
+# process-wide LRU keyed by the normalised query, the filter values and the data version,
+# so repeated filter combinations from any session skip the search entirely.
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_TTL_SECONDS = 300
+
+def normalize_search_query(search_query):
+    """
+    Canonical form of a search query: trimmed, case-folded, whitespace collapsed, empty
+    terms dropped and the '&' or ',' terms in sorted order, so equivalent queries share a key.
+    """
+    search_query = re.sub(r"\s+", " ", (search_query or "").strip().casefold())
+    separator = "&" if "&" in search_query else ","
+    terms = sorted({term.strip() for term in search_query.split(separator) if term.strip()})
+    return f" {separator} ".join(terms) if separator == "&" else ", ".join(terms)
+
+class QueryResultCache:
+    """Thread-safe LRU of search results with TTL expiry and hit-rate counters."""
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the cached (restaurant_ids, extra_columns) for a key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Returns size and hit-rate counters for display."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+@st.cache_resource
+def get_query_cache():
+    """Returns the process-wide search result cache shared by every session."""
+    return QueryResultCache()
+
+def find_restaurants_cached(df_restaurants, df_reviews, menu_partitions=None, cacheable=True, **filters):
+    """
+    Runs find_restaurants through the shared result cache. The key includes the write
+    queue's submitted and committed sequence numbers, so any write invalidates older
+    entries. Sessions with uncommitted writes of their own (or an uploaded file) bypass
+    the cache, since their tables differ from everyone else's. Only the key uses the
+    normalised query; find_restaurants always runs the query as typed.
+    """
+    write_status = get_write_queue().status()
+    cacheable = cacheable and not any(
+        pending_session_writes(table) for table in ("restaurants", "reviews", "menus")
+    )
+    key_filters = {**filters, "search_query": normalize_search_query(filters.get("search_query"))}
+    key = (
+        tuple(sorted(key_filters.items())),
+        tuple(menu_partitions or ()),
+        write_status["committed_seq"],
+        write_status["last_seq"],
+    )
+    query_cache = get_query_cache()
+
+    cached = query_cache.get(key) if cacheable else None
+    if cached is not None:
+        restaurant_ids, extra_columns = cached
+        positions = pd.Index(df_restaurants['ID']).get_indexer(restaurant_ids)
+        if (positions >= 0).all():
+            filtered_df = df_restaurants.iloc[positions].copy()
+            for column, values in extra_columns.items():
+                filtered_df[column] = values
+            return filtered_df
+
+    filtered_df = find_restaurants(
+        df_restaurants=df_restaurants,
+        df_reviews=df_reviews,
+        fuzzy_index=build_fuzzy_index(df_restaurants),
+        spatial_index=build_spatial_index(df_restaurants),
+        booking_index=get_booking_index(),
+        menu_catalogue=get_menu_catalogue(menu_partitions),
+        **filters
+    )
+    if cacheable:
+        extra_columns = {
+            column: filtered_df[column].tolist()
+            for column in filtered_df.columns if column not in df_restaurants.columns
+        }
+        query_cache.put(key, (filtered_df['ID'].tolist(), extra_columns))
+    return filtered_df
+
+# --- Card HTML Rendering ---
+# Least recently used fragments are dropped beyond this many, so sessions viewing
+# different locations never evict each other's cards
+CARD_FRAGMENT_CACHE_ENTRIES = 2048
+
+@st.cache_resource
+def get_card_fragment_cache():
+    """
+    Returns the process-wide LRU of rendered card fragments, shared by every session.
+    Fragments are keyed by (restaurant ID, row version), so an edited row simply gets a
+    new key and untouched rows keep their rendered HTML.
+    """
+    return {"lock": threading.Lock(), "fragments": OrderedDict()}
+
+def build_card_html(row):
+    """Builds the HTML block for a restaurant card, escaping each value exactly once."""
+    def escape_value(value, default="N/A"):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return default
+        return html.escape(str(value))
+
+    private_room = row.get('Private Room', 'N/A')
+    private_room_info = f"<strong>Private Room:</strong> {escape_value(private_room)}"
+    if private_room == "Yes" and pd.notna(row.get('Max Capacity')):
+        private_room_info += f" (Max Capacity: {int(row['Max Capacity'])})"
+
+    rating = pd.to_numeric(row.get('Rating'), errors='coerce')
+    rating_str = f"{rating:.1f}" if pd.notna(rating) else "N/A"
+
+    return f"""
+    <div class="restaurant-card">
+        <div class="restaurant-name">{escape_value(row['Name'])}</div>
+        <div class="restaurant-details">
+            <strong>Cuisine:</strong> {escape_value(row.get('Cuisine'))}<br>
+            <strong>Location:</strong> {escape_value(row.get('Location'))}<br>
+            <strong>Address:</strong> {escape_value(row.get('Address'))}<br>
+            <strong>Rating:</strong> {rating_str} ⭐<br>
+            <strong>Price:</strong> {escape_value(row.get('Price Range'))}<br>
+            {private_room_info}
+        </div>
+        <div class="restaurant-description">{escape_value(row.get('Description'), default="")}</div>
+    </div>
+    """
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def precompute_card_html(df_restaurants):
+    """
+    Batch step run once per version of the restaurant table. Renders any card fragment
+    that is not already cached and returns an ID -> HTML lookup, so drawing a page of
+    cards is a dictionary lookup per card.
+    """
+    if df_restaurants.empty:
+        return {}
+    cache = get_card_fragment_cache()
+    row_versions = pd.util.hash_pandas_object(df_restaurants, index=False).to_numpy()
+    lookup = {}
+    with cache["lock"]:
+        fragments = cache["fragments"]
+        for row, row_version in zip(df_restaurants.to_dict(orient="records"), row_versions):
+            key = (int(row['ID']), int(row_version))
+            if key not in fragments:
+                fragments[key] = build_card_html(row)
+            fragments.move_to_end(key)
+            lookup[int(row['ID'])] = fragments[key]
+        while len(fragments) > CARD_FRAGMENT_CACHE_ENTRIES:
+            fragments.popitem(last=False)
+    return lookup
+
+# --- Results Pagination and Prefetching ---
+# Results are shown a page at a time. After each render, a per-session prefetcher warms
+# the next page's card data (media and menu records, and the review timelines of their
+# partitions) on a small shared thread pool, and the page lists the neighbouring gallery
+# images and the next page's cover images as <link rel="prefetch"> hints, so the browser
+# already holds them when ◀/▶ or "Next page" is clicked. A new result set cancels any
+# prefetches still queued for the old one.
+RESULTS_PAGE_SIZE = 9
+PREFETCH_WORKERS = 2
+PREFETCH_CACHE_ENTRIES = 64
+
+@st.cache_resource
+def get_prefetch_pool():
+    """Returns the prefetch worker pool shared by every session, with hit-rate counters."""
+    return {
+        "executor": ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch"),
+        "lock": threading.Lock(),
+        "stats": Counter(),
+    }
+
+def record_prefetch_stat(name, amount=1):
+    pool = get_prefetch_pool()
+    with pool["lock"]:
+        pool["stats"][name] += amount
+
+def card_data_version(partition):
+    """Versions of the media and menus partition files a card reads (None if missing)."""
+    return tuple(
+        file_version(csv_file) if os.path.exists(csv_file) else None
+        for csv_file in (partition_file("media", partition), partition_file("menus", partition))
+    )
+
+def load_committed_card_data(restaurant_id, partition, version):
+    """
+    Reads a card's media and menu records from the committed partition files and warms the
+    partition's review timeline. Uses only the shared caches, never session state, so it
+    can run on the prefetch pool.
+    """
+    media_version, menus_version = version
+    media = []
+    if media_version is not None:
+        media = load_media_catalogue(partition_file("media", partition), media_version).get(int(restaurant_id), [])
+    menus = []
+    if menus_version is not None:
+        menus_df, group_index = load_grouped_table(partition_file("menus", partition), menus_version)
+        menus = menus_df.iloc[group_index.get(int(restaurant_id), np.empty(0, dtype=np.int64))].to_dict(orient="records")
+    reviews_file = partition_file("reviews", partition)
+    if os.path.exists(reviews_file):
+        load_review_timeline(reviews_file, file_version(reviews_file))
+    return {"media": media, "menus": menus}
+
+class ResultsPrefetcher:
+    """
+    Per-session prefetcher: a bounded LRU of card data, filled in the background for the
+    next page of results and checked by the render path before loading anything itself.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # restaurant ID -> (version, card data, prefetched and not yet shown)
+        self.card_data = OrderedDict()
+        self.futures = {}
+        self.result_signature = None
+        self.image_urls = set()
+
+    def _store(self, restaurant_id, version, data, prefetched):
+        with self.lock:
+            self.card_data[restaurant_id] = (version, data, prefetched)
+            self.card_data.move_to_end(restaurant_id)
+            while len(self.card_data) > PREFETCH_CACHE_ENTRIES:
+                self.card_data.popitem(last=False)
+
+    def _prefetch(self, restaurant_id, partition, version):
+        self._store(restaurant_id, version, load_committed_card_data(restaurant_id, partition, version), True)
+
+    def schedule(self, result_signature, restaurants):
+        """
+        Queues card data for [(restaurant ID, partition)] on the prefetch pool. When the
+        result set has changed, prefetches still waiting for a worker are cancelled first.
+        """
+        if result_signature != self.result_signature:
+            cancelled = sum(future.cancel() for future in self.futures.values())
+            if cancelled:
+                record_prefetch_stat("cancelled", cancelled)
+            self.futures = {}
+            self.result_signature = result_signature
+        self.futures = {restaurant_id: future for restaurant_id, future in self.futures.items() if not future.done()}
+        executor = get_prefetch_pool()["executor"]
+        for restaurant_id, partition in restaurants:
+            version = card_data_version(partition)
+            with self.lock:
+                cached = self.card_data.get(restaurant_id)
+            if (cached is not None and cached[0] == version) or restaurant_id in self.futures:
+                continue
+            self.futures[restaurant_id] = executor.submit(self._prefetch, restaurant_id, partition, version)
+            record_prefetch_stat("scheduled")
+
+    def peek(self, restaurant_id):
+        """Returns card data already in the cache, without loading or counting anything."""
+        with self.lock:
+            cached = self.card_data.get(restaurant_id)
+        return cached[1] if cached is not None else None
+
+    def get_card_data(self, restaurant_id, partition):
+        """Returns a card's data, from the cache when it is still current, otherwise loaded now."""
+        version = card_data_version(partition)
+        with self.lock:
+            cached = self.card_data.get(restaurant_id)
+            if cached is not None and cached[0] == version:
+                self.card_data[restaurant_id] = (version, cached[1], False)
+                self.card_data.move_to_end(restaurant_id)
+        if cached is not None and cached[0] == version:
+            # Only the first use of a prefetched entry counts, not every rerun that reuses it
+            if cached[2]:
+                record_prefetch_stat("card_hits")
+            return cached[1]
+        record_prefetch_stat("card_misses")
+        data = load_committed_card_data(restaurant_id, partition, version)
+        self._store(restaurant_id, version, data, False)
+        return data
+
+    def record_image_navigation(self, url):
+        """Counts whether a gallery image opened with ◀/▶ had been hinted for prefetch."""
+        record_prefetch_stat("image_hits" if url in self.image_urls else "image_misses")
+
+def get_session_prefetcher():
+    if "prefetcher" not in st.session_state:
+        st.session_state.prefetcher = ResultsPrefetcher()
+    return st.session_state.prefetcher
+
+def load_card_data(restaurant_id):
+    """
+    Returns {"media": [...], "menus": [...]} for a card. This session's uncommitted media
+    or menu writes are overlaid directly; otherwise the prefetch cache is used.
+    """
+    if pending_session_writes("media") or pending_session_writes("menus"):
+        return {"media": load_restaurant_media(restaurant_id), "menus": load_menus_from_csv(restaurant_id)}
+    try:
+        return get_session_prefetcher().get_card_data(int(restaurant_id), restaurant_partition(restaurant_id))
+    except Exception as e:
+        st.error(f"Error loading restaurant details: {e}")
+        return {"media": [], "menus": []}
+
+def prefetch_links_html(urls):
+    """Browser prefetch hints for images the next click is likely to show."""
+    return "".join(f'<link rel="prefetch" as="image" href="{html.escape(url)}">' for url in urls)
+
+# --- Review Analytics Page ---
+REVIEW_ANALYTICS_DIMENSIONS = {"Cuisine": "Cuisine", "Location": "Location", "Price Band": "Price Range"}
+
+def render_review_analytics(df_restaurants):
+    """
+    Admin dashboard over the review rollups: review volume over time, average rating by
+    cuisine, location or price band, and activity by reviewer department. It only reads
+    the rollup table, whose size depends on the number of days, restaurants and
+    departments, not on the number of reviews.
+    """
+    st.markdown('<h2 class="subheader">Review Analytics</h2>', unsafe_allow_html=True)
+    rollups = load_review_rollups(file_version(REVIEW_ROLLUPS_CSV_FILE))
+    if rollups.empty:
+        st.info("No reviews yet.")
+        return
+
+    first_day, last_day = rollups['day'].min().date(), rollups['day'].max().date()
+    range_col, granularity_col = st.columns([2, 1])
+    with range_col:
+        selected_range = st.date_input("Period", value=(first_day, last_day), min_value=first_day, max_value=last_day, key="analytics_period")
+    with granularity_col:
+        granularity = st.radio("Bucket", ["Day", "Week"], horizontal=True, key="analytics_granularity")
+    if len(selected_range) == 2:
+        in_period = (rollups['day'] >= pd.Timestamp(selected_range[0])) & (rollups['day'] <= pd.Timestamp(selected_range[1]))
+        rollups = rollups[in_period]
+    if rollups.empty:
+        st.info("No reviews in this period.")
+        return
+
+    total_reviews = int(rollups['review_count'].sum())
+    rated_reviews = rollups['rated_count'].sum()
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Reviews", total_reviews)
+    metric_cols[1].metric("Average Rating", f"{rollups['rating_sum'].sum() / rated_reviews:.2f}" if rated_reviews else "N/A")
+    metric_cols[2].metric("Restaurants Reviewed", rollups['restaurant_id'].nunique())
+
+    st.markdown("**Reviews over time**")
+    volume = rollups.groupby('day')['review_count'].sum()
+    if granularity == "Week":
+        volume = volume.resample('W-MON', label='left', closed='left').sum()
+    st.bar_chart(volume.rename("Reviews"))
+
+    st.markdown("**Average rating**")
+    dimension = st.radio("Group by", list(REVIEW_ANALYTICS_DIMENSIONS), horizontal=True, key="analytics_dimension")
+    dimension_column = REVIEW_ANALYTICS_DIMENSIONS[dimension]
+    restaurant_dimension = df_restaurants.set_index('ID')[dimension_column]
+    by_restaurant = rollups.groupby('restaurant_id')[['rated_count', 'rating_sum']].sum()
+    by_restaurant[dimension] = restaurant_dimension.reindex(by_restaurant.index).fillna("Unknown").to_numpy()
+    by_dimension = by_restaurant.groupby(dimension)[['rated_count', 'rating_sum']].sum()
+    by_dimension = by_dimension[by_dimension['rated_count'] > 0]
+    st.bar_chart((by_dimension['rating_sum'] / by_dimension['rated_count']).rename("Average Rating"))
+
+    st.markdown("**Activity by department**")
+    by_department = rollups.groupby('reviewer_department')['review_count'].sum().sort_values(ascending=False)
+    st.bar_chart(by_department.rename("Reviews"))
+
 # --- App Title and Header ---
 st.markdown('<h1 class="main-header">🍽️ Singapore Restaurant Guide</h1>', unsafe_allow_html=True)
 st.markdown('<p style="text-align: center; color: #666; font-size: 1.1em; font-family: \'Inter\', sans-serif;">Discover and add the best dining experiences in Singapore!</p>', unsafe_allow_html=True)
@@ -545,6 +3552,14 @@ st.sidebar.caption("For admin use only")
 st.session_state.is_admin = st.sidebar.checkbox("Enable Admin mode")
 st.sidebar.markdown("---")
 
+# Only the partitions the location filter needs are loaded; the filter's value is kept
+# in session state, so it is known before the sidebar widgets are drawn again
+location_scope = st.session_state.get("location_filter", "All")
+if location_scope not in partition_locations():
+    location_scope = "All"
+scope_partitions = partitions_for_location_filter(location_scope)
+uploaded_file = None
+
 if st.session_state.is_admin:
     st.sidebar.header("Data Source")
         
@@ -552,20 +3567,19 @@ if st.session_state.is_admin:
         
     if uploaded_file is not None:
         # Load and validate the uploaded file
-        df_uploaded = pd.read_csv(uploaded_file)
+        df_uploaded = resolve_uploaded_restaurant_ids(pd.read_csv(uploaded_file), load_current_restaurants())
         st.session_state.df = validate_and_update_dataframe(df_uploaded)
         st.cache_data.clear()
     else:
-        if st.session_state.df is None:
-            st.session_state.df = load_restaurants()
-        elif 'uploaded_file' in st.session_state and st.session_state.uploaded_file is None:
-            st.session_state.df = load_restaurants()
-            st.cache_data.clear()
+        # Reload on every run (served from cache) so queued and committed writes show up
+        st.session_state.df = load_current_restaurants(location_scope)
 
     df = st.session_state.df
+    # Exports and data quality checks always cover every location
+    all_restaurants_df = load_current_restaurants() if uploaded_file is None else df
 
-    if not df.empty:
-        csv_restaurants = df.to_csv(index=False).encode('utf-8')
+    if not all_restaurants_df.empty:
+        csv_restaurants = all_restaurants_df.to_csv(index=False).encode('utf-8')
         st.sidebar.download_button(
             label="Download Restaurants",
             data=csv_restaurants,
@@ -596,32 +3610,120 @@ if st.session_state.is_admin:
             help="Click here to download all submitted menus as a CSV file."
         )
             
-    gallery_df = load_gallery_images_from_csv()
-    if not gallery_df.empty:
-        csv_gallery = gallery_df.to_csv(index=False).encode('utf-8')
+    media_df = load_table_rows("media")
+    if not media_df.empty:
+        csv_media = media_df.to_csv(index=False).encode('utf-8')
         st.sidebar.download_button(
-            label="Download All Gallery Images",
-            data=csv_gallery,
-            file_name='restaurant_gallery.csv',
+            label="Download Media Catalogue",
+            data=csv_media,
+            file_name='restaurant_media.csv',
             mime='text/csv',
-            help="Click here to download all submitted gallery images as a CSV file."
+            help="Click here to download the catalogue of restaurant images as a CSV file."
         )
+
+    # Durability status of the shared write-behind queue
+    write_status = write_queue.status()
+    with st.sidebar.expander("Write Queue Status"):
+        st.metric("Queued writes", write_status["queue_depth"])
+        st.metric("Writes committed", write_status["writes_committed"], help=f"In {write_status['batches_committed']} batches")
+        last_commit = write_status["last_commit_at"]
+        st.caption(f"Last commit: {last_commit.strftime('%Y-%m-%d %H:%M:%S') if last_commit else 'none yet'}")
+        write_limits = get_write_rate_limiter().stats
+        st.metric("Writes throttled", write_limits["throttled"], help=f"Refused by the per-session or per-reviewer rate limits, out of {write_limits['allowed'] + write_limits['throttled']} attempts")
+        st.metric("Writes queued for space", write_limits["queued"], help=f"Waited for the queue to drop below {WRITE_QUEUE_MAX_DEPTH} outstanding writes; {write_limits['rejected']} gave up")
+        if write_status["last_error"]:
+            st.error(f"Last write error: {write_status['last_error']}")
+
+    query_cache_stats = get_query_cache().stats()
+    with st.sidebar.expander("Search Cache Status"):
+        st.metric("Hit rate", f"{query_cache_stats['hit_rate']:.0%}", help=f"{query_cache_stats['hits']} hits, {query_cache_stats['misses']} misses")
+        st.metric("Cached searches", f"{query_cache_stats['entries']} / {QUERY_CACHE_MAX_ENTRIES}")
+        st.caption(f"Evicted: {query_cache_stats['evictions']} · Expired: {query_cache_stats['expirations']}")
+
+    prefetch_stats = get_prefetch_pool()["stats"]
+    with st.sidebar.expander("Prefetch Status"):
+        card_lookups = prefetch_stats["card_hits"] + prefetch_stats["card_misses"]
+        image_lookups = prefetch_stats["image_hits"] + prefetch_stats["image_misses"]
+        st.metric("Card data hit rate", f"{prefetch_stats['card_hits'] / card_lookups:.0%}" if card_lookups else "N/A", help=f"{prefetch_stats['card_hits']} prefetched, {prefetch_stats['card_misses']} loaded on demand")
+        st.metric("Gallery image hit rate", f"{prefetch_stats['image_hits'] / image_lookups:.0%}" if image_lookups else "N/A", help="Share of ◀/▶ clicks whose photo had been hinted to the browser")
+        st.caption(f"Scheduled: {prefetch_stats['scheduled']} · Cancelled: {prefetch_stats['cancelled']}")
+
+    ingestion_pool = get_ingestion_pool()
+    with st.sidebar.expander("Upload Ingestion Status"):
+        st.metric("Uploads in progress", len(ingestion_pool["active_jobs"]))
+        st.metric("Upload memory reserved", f"{ingestion_pool['budget'].in_use_bytes / (1024 * 1024):.0f} / {UPLOAD_MEMORY_BUDGET_BYTES // (1024 * 1024)} MB")
+
+    with st.sidebar.expander("Duplicate Photos"):
+        st.caption("Finds resized or re-encoded copies of the same picture across every restaurant's photos and cover images.")
+        if st.button("Scan all photos", key="scan_duplicate_photos"):
+            duplicate_photos = get_image_hash_index().duplicate_clusters()
+            if duplicate_photos.empty:
+                st.caption("No near-duplicate photos found.")
+            else:
+                st.caption(f"{duplicate_photos['Cluster'].nunique()} groups of near-duplicate photos:")
+                st.dataframe(duplicate_photos, hide_index=True)
+
+    st.sidebar.toggle("📊 Review Analytics", key="show_review_analytics", help="Show the review analytics page instead of the restaurant list.")
+
+    if not all_restaurants_df.empty:
+        with st.sidebar.expander("Data Quality"):
+            facet_merges = suggest_facet_merges(all_restaurants_df)
+            if facet_merges.empty:
+                st.caption("No near-duplicate cuisine or location values found.")
+            else:
+                st.caption("Near-duplicate filter values that could be merged. Tick the ones to apply:")
+                reviewed_merges = st.data_editor(
+                    facet_merges.assign(Apply=False),
+                    hide_index=True,
+                    disabled=["Column", "Variant", "Merge Into", "Similarity", "Rows"],
+                    key="facet_merge_editor"
+                )
+                selected_merges = reviewed_merges[reviewed_merges["Apply"]]
+                # Merges are restaurant updates, so they draw on the same limits as adding restaurants
+                if st.button("Apply selected merges", key="apply_facet_merges", disabled=selected_merges.empty) and check_write_allowed("restaurant"):
+                    submit_writes([
+                        {"table": "restaurants", "op": "update", "match": (merge["Column"], merge["Variant"]), "values": {merge["Column"]: merge["Merge Into"]}}
+                        for merge in selected_merges.to_dict(orient="records")
+                    ])
+                    st.toast(f"Merged {len(selected_merges)} filter values.", icon="✅")
+                    st.rerun()
+
 else:
-    if st.session_state.df is None:
-        st.session_state.df = load_restaurants()
+    st.session_state.df = load_current_restaurants(location_scope)
     df = st.session_state.df
-    reviews_df = load_reviews_from_csv()
+
+# Reviews are only needed for the locations in view (they are searched by find_restaurants)
+reviews_df = load_reviews_from_csv(partitions=scope_partitions)
+
+if st.session_state.pending_writes:
+    st.sidebar.caption(f"Saving {len(st.session_state.pending_writes)} change(s)...")
 
 st.sidebar.header("Filter Restaurants")
 
-search_query = st.sidebar.text_input("Search by Restaurant Name, Description, or Reviews", "")
+search_query = st.sidebar.text_input("Search by Restaurant Name, Description, or Reviews", "", key="search_query")
+
+# Suggest completions for the term currently being typed (after the last ',' or '&')
+term_start = max(search_query.rfind(","), search_query.rfind("&")) + 1
+typed_term = search_query[term_start:].strip().strip('"')
+search_suggestions = get_autocomplete_index().complete(typed_term) if len(typed_term) >= 2 else []
+if search_suggestions:
+    st.sidebar.caption("Suggestions:")
+    search_prefix = search_query[:term_start] + (" " if term_start else "")
+    for suggestion_index, suggestion in enumerate(search_suggestions):
+        st.sidebar.button(
+            suggestion,
+            key=f"search_suggestion_{suggestion_index}",
+            on_click=apply_search_suggestion,
+            args=(search_prefix, suggestion)
+        )
 
 if not df.empty:   
     cuisine_options = ["All"] + sorted(df["Cuisine"].unique().tolist())
     selected_cuisine = st.sidebar.selectbox("Select Cuisine", cuisine_options)
 
-    location_options = ["All"] + sorted(df["Location"].unique().tolist())
-    selected_location_filter = st.sidebar.selectbox("Select Location", location_options)
+    # Locations come from the partition manifest, since df may hold only one location
+    location_options = ["All"] + (partition_locations() if uploaded_file is None else sorted(df["Location"].unique().tolist()))
+    selected_location_filter = st.sidebar.selectbox("Select Location", location_options, key="location_filter")
 
     price_range_options = ["All", "$", "$$", "$$$", "$$$$"]
     selected_price_range = st.sidebar.selectbox("Select Price Range", price_range_options)
@@ -642,26 +3744,71 @@ if not df.empty:
         else:
             st.sidebar.info("No restaurants with private rooms have a capacity specified.")
 
+    availability_window = None
+    if selected_private_room_filter == "Yes" and st.sidebar.checkbox("Only rooms free at a given time"):
+        availability_date = st.sidebar.date_input("Date", value=datetime.now().date())
+        availability_start = st.sidebar.time_input("From", value=datetime.strptime("19:00", "%H:%M").time())
+        availability_end = st.sidebar.time_input("Until", value=datetime.strptime("21:00", "%H:%M").time())
+        if availability_end > availability_start:
+            availability_window = (
+                datetime.combine(availability_date, availability_start),
+                datetime.combine(availability_date, availability_end),
+            )
+        else:
+            st.sidebar.warning("The end time must be after the start time.")
+
+    # Structured menu item filters, answered from the menu catalogue
+    dish_query = st.sidebar.text_input("Dish or Menu", "", placeholder="e.g. tasting menu, chili crab")
+    if st.sidebar.checkbox("Limit menu price"):
+        max_menu_price = st.sidebar.number_input("Maximum Menu Price ($)", min_value=0, value=150, step=10)
+    else:
+        max_menu_price = None
+
+    # Distance filter around a gazetteer area
+    gazetteer_areas = load_gazetteer()["areas"]
+    selected_near_area = st.sidebar.selectbox("Near", ["Anywhere"] + sorted(gazetteer_areas))
+    near_point = radius_km = nearest_k = None
+    if selected_near_area != "Anywhere":
+        near_point = gazetteer_areas[selected_near_area]
+        distance_mode = st.sidebar.radio("Distance Filter", ["Within distance", "Nearest"], horizontal=True)
+        if distance_mode == "Within distance":
+            radius_km = st.sidebar.slider("Within (km)", 0.5, 20.0, 2.0, 0.5)
+        else:
+            nearest_k = st.sidebar.number_input("Number of Nearest Restaurants", min_value=1, max_value=50, value=5)
+
     # --- Apply Filters ---
     filtered_df = df.copy()
     reviews_df = reviews_df.copy()
 
-    filtered_df = find_restaurants(
+    filtered_df = find_restaurants_cached(
         df_restaurants=df,
         df_reviews=reviews_df,
+        menu_partitions=scope_partitions,
+        cacheable=uploaded_file is None,
         search_query=search_query,
         selected_cuisine=selected_cuisine,
         selected_location_filter=selected_location_filter,
         selected_price_range=selected_price_range,
         min_rating=min_rating,
         selected_private_room_filter=selected_private_room_filter,
-        min_capacity_filter=min_capacity_filter
+        min_capacity_filter=min_capacity_filter,
+        near_point=near_point,
+        radius_km=radius_km,
+        nearest_k=nearest_k,
+        availability_window=availability_window,
+        dish_query=dish_query.strip(),
+        max_menu_price=max_menu_price
     )
         
 else:
     filtered_df = pd.DataFrame()
         
     
+# --- Review Analytics Page (Admin) ---
+if st.session_state.is_admin and st.session_state.get("show_review_analytics"):
+    render_review_analytics(all_restaurants_df)
+    st.stop()
+
 # --- Add New Restaurant Button (Regular user) ---
 st.write("Have a new restaurant to include? ")
 if st.button("➕ Add a New Restaurant"):
@@ -677,7 +3824,7 @@ if st.session_state.show_add_restaurant_form:
         new_name = st.text_input("Restaurant Name", help="The name of the restaurant.")
         new_cuisine = st.text_input("Cuisine", help="e.g., Italian, Japanese, Local Hawker.")
             
-        existing_locations = sorted(df["Location"].unique().tolist()) if not df.empty else []
+        existing_locations = partition_locations() if uploaded_file is None else sorted(df["Location"].unique().tolist())
         locations = existing_locations + ["Add new location..."]
             
         def handle_location_change():
@@ -697,6 +3844,14 @@ if st.session_state.show_add_restaurant_form:
             
         if st.session_state.new_location_selected:
             final_location = st.text_input("Enter New Location", key="new_location_text_input", help="Type in a new location.")
+            # Offer existing locations that match, to avoid near-duplicate spellings
+            location_suggestions = get_autocomplete_index().complete(final_location, categories=["location"]) if final_location else []
+            if location_suggestions:
+                st.caption("Existing locations:")
+                suggestion_cols = st.columns(len(location_suggestions))
+                for suggestion_col, suggestion in zip(suggestion_cols, location_suggestions):
+                    with suggestion_col:
+                        st.button(suggestion, key=f"location_suggestion_{suggestion}", on_click=apply_location_suggestion, args=(suggestion,))
         else:
             final_location = selected_location
             
@@ -720,26 +3875,31 @@ if st.session_state.show_add_restaurant_form:
 
         with col1:
             if st.button("Add", key="add_restaurant_button"):
-                if new_name and new_cuisine and final_location and new_description and new_address:
+                if not (new_name and new_cuisine and final_location and new_description and new_address):
+                    st.error("Please fill in all required fields (Name, Cuisine, Location, Address, Description).", icon="⚠️")
+                elif new_name in load_current_restaurants()['Name'].values:
+                    st.warning("A restaurant with this name already exists. Please use a unique name.")
+                elif check_write_allowed("restaurant", spend=False):
                     image_data = None
                     if new_image_file is not None:
-                        # Read file as bytes and encode to base64
-                        file_bytes = new_image_file.getvalue()
-                        base64_data = base64.b64encode(file_bytes).decode('utf-8')
-                        image_data = f"data:{new_image_file.type};base64,{base64_data}"
+                        # Stream the file into the media folder and keep only a reference in the CSV
+                        try:
+                            media_key = ingest_upload_with_progress(new_image_file, ["image/png", "image/jpeg"])
+                            image_data = MEDIA_REFERENCE_PREFIX + media_key
+                            near_duplicates = get_image_hash_index().near_duplicates(media_key)
+                            if near_duplicates:
+                                st.toast(f"The image looks like {describe_image_reference(near_duplicates[0][1])}.", icon="⚠️")
+                        except ValueError as e:
+                            st.error(f"Image rejected: {e}", icon="⚠️")
                     else:
                         # Use a default placeholder if no image is uploaded
                         image_data = "https://placehold.co/600x400/CCCCCC/000000?text=Image+Not+Available"
 
-                    if add_restaurant_to_csv(new_name, new_cuisine, final_location, new_rating, new_price, new_description, image_data, new_address, new_private_room, new_capacity):
+                    if image_data is not None and add_restaurant_to_csv(new_name, new_cuisine, final_location, new_rating, new_price, new_description, image_data, new_address, new_private_room, new_capacity):
                         st.session_state.add_restaurant_submitted = True
                         st.session_state.show_add_restaurant_form = False
-                        st.success(f"Restaurant '{new_name}' added successfully!", icon="✅")
-                        st.cache_data.clear()
-                        time.sleep(2)
+                        st.toast(f"Restaurant '{new_name}' added successfully!", icon="✅")
                         st.rerun()
-                else:
-                    st.error("Please fill in all required fields (Name, Cuisine, Location, Address, Description).", icon="⚠️")
 
         with col3:
             _, button_col = st.columns([1, 0.5])
@@ -752,10 +3912,23 @@ if st.session_state.show_add_restaurant_form:
 st.markdown('<h2 class="subheader">Available Restaurants</h2>', unsafe_allow_html=True)
 
 if not filtered_df.empty:
+    card_html_lookup = precompute_card_html(df)
+    prefetcher = get_session_prefetcher()
+    prefetch_urls = []
+
+    # Start again from the first page whenever the result set changes
+    result_signature = hash(tuple(filtered_df['ID'].astype(int)))
+    if st.session_state.get("results_signature") != result_signature:
+        st.session_state.results_signature = result_signature
+        st.session_state.results_page = 0
+    page_count = math.ceil(len(filtered_df) / RESULTS_PAGE_SIZE)
+    results_page = min(st.session_state.results_page, page_count - 1)
+    page_df = filtered_df.iloc[results_page * RESULTS_PAGE_SIZE:(results_page + 1) * RESULTS_PAGE_SIZE]
+
     cols = st.columns(3)
     col_index = 0
 
-    for index, row in filtered_df.iterrows():
+    for index, row in page_df.iterrows():
         with cols[col_index]:
             # Conditional rendering: show edit form if this is the restaurant to be edited
             if st.session_state.edit_restaurant_name == row['Name']:
@@ -800,11 +3973,9 @@ if not filtered_df.empty:
                                 "Private Room": edit_private_room,
                                 "Max Capacity": edit_capacity
                             }
-                            if update_restaurant_in_csv(row['Name'], updated_details):
-                                st.success(f"Restaurant '{edit_name}' updated successfully!", icon="✅")
+                            if update_restaurant_in_csv(row['ID'], updated_details):
+                                st.toast(f"Restaurant '{edit_name}' updated successfully!", icon="✅")
                                 st.session_state.edit_restaurant_name = None
-                                st.cache_data.clear()
-                                time.sleep(2)
                                 st.rerun()
                             else:
                                 st.error("Failed to save changes.", icon="⚠️")
@@ -823,7 +3994,7 @@ if not filtered_df.empty:
                         col_confirm, col_cancel_delete = st.columns(2)
                         with col_confirm:
                             if st.button("Confirm Delete", key=f"confirm_delete_{row['Name']}"):
-                                delete_restaurant(row['Name'])
+                                delete_restaurant(row['ID'], row['Name'])
                         with col_cancel_delete:
                             if st.button("Cancel", key=f"cancel_delete_confirm_{row['Name']}"):
                                 st.session_state.delete_confirm_restaurant = None
@@ -833,20 +4004,24 @@ if not filtered_df.empty:
                 # Original restaurant card display logic
                 with st.container(border=True):
                     restaurant_name = row['Name']
+                    restaurant_id = int(row['ID'])
 
-                    # Load gallery images for the current restaurant
-                    gallery_images = load_gallery_images_from_csv(restaurant_name)
+                    # The restaurant's images (in position order) and menus, usually prefetched
+                    card_data = load_card_data(restaurant_id)
+                    gallery_images = card_data["media"]
                     
-                    # Check if a gallery index exists for this restaurant, if not, initialize it to 0
-                    if f'gallery_index_{restaurant_name}' not in st.session_state:
-                        st.session_state[f'gallery_index_{restaurant_name}'] = 0
+                    # Open the gallery on the cover image, and keep the index valid if images were removed
+                    if f'gallery_index_{restaurant_id}' not in st.session_state:
+                        st.session_state[f'gallery_index_{restaurant_id}'] = cover_position(gallery_images)
+                    if gallery_images and st.session_state[f'gallery_index_{restaurant_id}'] >= len(gallery_images):
+                        st.session_state[f'gallery_index_{restaurant_id}'] = len(gallery_images) - 1
 
                     # Display the photo gallery
                     with st.container():
                         # The gallery buttons and image are placed in a container for a cohesive look
                         st.markdown('<div class="fixed-gallery-container">', unsafe_allow_html=True)
                         if gallery_images:
-                            current_image_index = st.session_state[f'gallery_index_{restaurant_name}']
+                            current_image_index = st.session_state[f'gallery_index_{restaurant_id}']
                             current_image_data = gallery_images[current_image_index]
                                 
                             # Use columns to place the buttons on the sides of the image
@@ -855,46 +4030,45 @@ if not filtered_df.empty:
                             with btn_col_prev:
                                 # Button to go to the previous image, disabled at the first image
                                 if st.button("◀", key=f"prev_{restaurant_name}", disabled=(current_image_index == 0), help="Previous photo"):
-                                    st.session_state[f'gallery_index_{restaurant_name}'] -= 1
+                                    prefetcher.record_image_navigation(media_record_url(gallery_images[current_image_index - 1]))
+                                    st.session_state[f'gallery_index_{restaurant_id}'] -= 1
                                     st.rerun()
                                         
                             with img_col:
                                 # Display the current image in the central column
-                                st.image(
-                                    f"data:{current_image_data['file_type']};base64,{current_image_data['base64_data']}", 
-                                    use_container_width=True
-                                )
+                                st.image(media_record_url(current_image_data), use_container_width=True)
                                 
                             with btn_col_next:
                                 # Button to go to the next image, disabled at the last image
                                 if st.button("▶", key=f"next_{restaurant_name}", disabled=(current_image_index == len(gallery_images) - 1), help="Next photo"):
-                                    st.session_state[f'gallery_index_{restaurant_name}'] += 1
+                                    prefetcher.record_image_navigation(media_record_url(gallery_images[current_image_index + 1]))
+                                    st.session_state[f'gallery_index_{restaurant_id}'] += 1
                                     st.rerun()
                                 
                             st.markdown(f'<p style="text-align:center; margin-top: 10px;">{current_image_index + 1} of {len(gallery_images)}</p>', unsafe_allow_html=True)
+                            # Hint the photos either side of this one to the browser
+                            prefetch_urls += [
+                                media_record_url(gallery_images[neighbour])
+                                for neighbour in (current_image_index - 1, current_image_index + 1)
+                                if 0 <= neighbour < len(gallery_images)
+                            ]
 
                         else:
                             # If no images, show a placeholder inside the fixed container
-                            st.image("https://placehold.co/1600x900/CCCCCC/000000?text=Image+Not+Available", use_container_width=True)
-
-                    private_room_info = f"<strong>Private Room:</strong> {row.get('Private Room', 'N/A')}"
-                    if row.get('Private Room', 'N/A') == "Yes" and pd.notna(row.get('Max Capacity')):
-                        private_room_info += f" (Max Capacity: {int(row['Max Capacity'])})"
-
-                    st.markdown(f"""
-                    <div class="restaurant-card">
-                        <div class="restaurant-name">{row['Name']}</div>
-                        <div class="restaurant-details">
-                            <strong>Cuisine:</strong> {row['Cuisine']}<br>
-                            <strong>Location:</strong> {row['Location']}<br>
-                            <strong>Address:</strong> {row['Address']}<br>
-                            <strong>Rating:</strong> {row['Rating']:.1f} ⭐<br>
-                            <strong>Price:</strong> {row['Price Range']}<br>
-                            {private_room_info}
-                        </div>
-                        <div class="restaurant-description">{row['Description']}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                            st.image(PLACEHOLDER_IMAGE_URL, use_container_width=True)
+
+                    # The card body is pre-rendered once per row version; only look it up here
+                    card_html = card_html_lookup.get(restaurant_id)
+                    if card_html is None:
+                        card_html = build_card_html(row)
+                    st.markdown(card_html, unsafe_allow_html=True)
+                    if pd.notna(row.get('Distance (km)')):
+                        st.caption(f"📍 {row['Distance (km)']:.1f} km from {selected_near_area}")
+                    if isinstance(row.get('Menu Matches'), str) and row['Menu Matches']:
+                        st.caption(f"🍴 {row['Menu Matches']}")
+                    similar_restaurants = get_similar_restaurants_index().similar(restaurant_id)
+                    if similar_restaurants:
+                        st.caption("Similar: " + " · ".join(name for name, _ in similar_restaurants))
 
                     if st.session_state.is_admin:    
                         # Create a four-column layout for the buttons
@@ -943,6 +4117,19 @@ if not filtered_df.empty:
                     # Display the 'Upload Menu' form if the button was clicked
                     if st.session_state.is_admin and st.session_state.add_menu_for_restaurant == row['Name']:
                         with st.container(border=True):
+                            st.markdown(f"**Add a menu item for {row['Name']}:**")
+                            item_name = st.text_input("Item Name", key=f"menu_item_name_{row['Name']}")
+                            item_description = st.text_input("Item Description", key=f"menu_item_description_{row['Name']}")
+                            item_price = st.number_input("Price ($)", min_value=0.0, value=0.0, step=1.0, key=f"menu_item_price_{row['Name']}")
+                            if st.button("Add item", key=f"submit_menu_item_{row['Name']}"):
+                                if item_name.strip():
+                                    if add_structured_menu_item_to_csv(restaurant_id, row['Name'], item_name.strip(), item_description.strip() or None, item_price or None):
+                                        st.toast(f"Menu item '{item_name.strip()}' added to {row['Name']}!", icon="✅")
+                                        st.session_state.add_menu_for_restaurant = None
+                                        st.rerun()
+                                else:
+                                    st.warning("Please enter the item name.", icon="⚠️")
+                            st.markdown("---")
                             st.markdown(f"**Upload a new menu for {row['Name']}:**")
                             uploaded_menu_file = st.file_uploader(
                                 "Upload a menu file (PDF or Image)",
@@ -953,23 +4140,20 @@ if not filtered_df.empty:
                             upload_col, cancel_col = st.columns(2)
                             with upload_col:
                                 if st.button("Upload menu", key=f"submit_menu_upload_{row['Name']}"):
-                                    if uploaded_menu_file is not None:
+                                    if uploaded_menu_file is None:
+                                        st.warning("Please select a file to upload.", icon="⚠️")
+                                    elif check_write_allowed("menu", spend=False):
                                         try:
-                                            file_bytes = uploaded_menu_file.getvalue()
-                                            base64_data = base64.b64encode(file_bytes).decode('utf-8')
                                             file_name = uploaded_menu_file.name
                                             file_type = uploaded_menu_file.type
+                                            media_key = ingest_upload_with_progress(uploaded_menu_file, ["application/pdf", "image/png", "image/jpeg"])
 
-                                            if add_menu_item_to_csv(row['Name'], file_name, file_type, base64_data):
-                                                st.success(f"Menu '{file_name}' uploaded successfully to {row['Name']}!", icon="✅")
+                                            if add_menu_item_to_csv(restaurant_id, row['Name'], file_name, file_type, media_key):
+                                                st.toast(f"Menu '{file_name}' uploaded successfully to {row['Name']}!", icon="✅")
                                                 st.session_state.add_menu_for_restaurant = None
-                                                st.cache_data.clear()
-                                                time.sleep(2)
                                                 st.rerun()
                                         except Exception as e:
                                             st.error(f"Error processing file: {e}")
-                                    else:
-                                        st.warning("Please select a file to upload.", icon="⚠️")
                             with cancel_col:
                                 if st.button("Cancel", key=f"cancel_menu_upload_{row['Name']}"):
                                     st.session_state.add_menu_for_restaurant = None
@@ -984,27 +4168,32 @@ if not filtered_df.empty:
                                 type=["png", "jpg", "jpeg"],
                                 key=f"photo_uploader_{row['Name']}"
                             )
+                            allow_duplicate_photo = st.checkbox(
+                                "Upload even if a similar photo already exists",
+                                key=f"allow_duplicate_photo_{row['Name']}"
+                            )
                                 
                             upload_col, cancel_col = st.columns(2)
                             with upload_col:
                                 if st.button("Upload photo", key=f"submit_photo_upload_{row['Name']}"):
-                                    if uploaded_photo_file is not None:
+                                    if uploaded_photo_file is None:
+                                        st.warning("Please select a file to upload.", icon="⚠️")
+                                    elif check_write_allowed("photo", spend=False):
                                         try:
-                                            file_bytes = uploaded_photo_file.getvalue()
-                                            base64_data = base64.b64encode(file_bytes).decode('utf-8')
                                             file_name = uploaded_photo_file.name
                                             file_type = uploaded_photo_file.type
+                                            media_key = ingest_upload_with_progress(uploaded_photo_file, ["image/png", "image/jpeg"])
 
-                                            if add_gallery_image_to_csv(row['Name'], file_name, file_type, base64_data):
-                                                st.success(f"Photo '{file_name}' uploaded successfully to {row['Name']}'s gallery!", icon="✅")
+                                            near_duplicates = get_image_hash_index().near_duplicates(media_key)
+                                            if near_duplicates and not allow_duplicate_photo:
+                                                similar_images = ", ".join(describe_image_reference(ref) for _, ref in near_duplicates[:3])
+                                                st.warning(f"This photo looks like one already stored: {similar_images}. Tick the box above to upload it anyway.", icon="⚠️")
+                                            elif add_gallery_image_to_csv(restaurant_id, row['Name'], file_name, file_type, media_key):
+                                                st.toast(f"Photo '{file_name}' uploaded successfully to {row['Name']}'s gallery!", icon="✅")
                                                 st.session_state.add_photo_for_restaurant = None
-                                                st.cache_data.clear()
-                                                time.sleep(2)
                                                 st.rerun()
                                         except Exception as e:
                                             st.error(f"Error processing file: {e}")
-                                    else:
-                                        st.warning("Please select a file to upload.", icon="⚠️")
                             with cancel_col:
                                 if st.button("Cancel", key=f"cancel_photo_upload_{row['Name']}"):
                                     st.session_state.add_photo_for_restaurant = None
@@ -1023,7 +4212,7 @@ if not filtered_df.empty:
                         with submit_col:
                             if st.button("Submit", key=f"submit_review_form_{row['Name']}"):
                                 if review_text and reviewer_name:
-                                    if save_review_to_csv(row['Name'], review_rating, review_text, reviewer_name, reviewer_department, reviewer_designation):
+                                    if save_review_to_csv(restaurant_id, row['Name'], review_rating, review_text, reviewer_name, reviewer_department, reviewer_designation):
                                         st.session_state.review_submitted_message = f"Thank you for your review of {row['Name']}! Rating: {review_rating} ⭐"
                                         st.session_state.review_restaurant_name = None
                                         st.rerun()
@@ -1040,69 +4229,129 @@ if not filtered_df.empty:
                             st.success(st.session_state.review_submitted_message, icon="✅")
                             st.session_state.review_submitted_message = None
 
+                    if row['Private Room'] == 'Yes':
+                        with st.expander("Book the Private Room"):
+                            booking_index = get_booking_index()
+                            upcoming_bookings = booking_index.upcoming(restaurant_id, datetime.now())
+                            if upcoming_bookings:
+                                for booking in upcoming_bookings:
+                                    booking_col, cancel_col = st.columns([3, 1])
+                                    with booking_col:
+                                        st.caption(f"{booking['start']} – {booking['end'][-5:]} · {booking['party_size']} guests · {booking['booked_by']}")
+                                    if st.session_state.is_admin:
+                                        with cancel_col:
+                                            if st.button("Cancel", key=f"cancel_booking_{booking['booking_id']}"):
+                                                if cancel_booking(booking['booking_id']):
+                                                    st.toast("Booking cancelled.", icon="✅")
+                                                    st.rerun()
+                            else:
+                                st.caption("No upcoming bookings.")
+
+                            with st.form(key=f"booking_form_{restaurant_id}"):
+                                booking_date = st.date_input("Date", value=datetime.now().date(), key=f"booking_date_{restaurant_id}")
+                                booking_start = st.time_input("From", value=datetime.strptime("19:00", "%H:%M").time(), key=f"booking_start_{restaurant_id}")
+                                booking_end = st.time_input("Until", value=datetime.strptime("21:00", "%H:%M").time(), key=f"booking_end_{restaurant_id}")
+                                max_party = int(row['Max Capacity']) if pd.notna(row['Max Capacity']) else 100
+                                party_size = st.number_input("Party Size", min_value=1, max_value=max_party, value=min(10, max_party), key=f"booking_party_{restaurant_id}")
+                                booked_by = st.text_input("Booked By", key=f"booking_by_{restaurant_id}")
+                                if st.form_submit_button("Book"):
+                                    if not booked_by:
+                                        st.warning("Please enter who the booking is for.", icon="⚠️")
+                                    elif book_private_room(
+                                        restaurant_id, row['Name'],
+                                        datetime.combine(booking_date, booking_start),
+                                        datetime.combine(booking_date, booking_end),
+                                        party_size, booked_by, row['Max Capacity']
+                                    ):
+                                        st.toast(f"Private room at {row['Name']} booked.", icon="✅")
+                                        st.rerun()
+
                     with st.expander(f"Past Curated Menus"):
-                        menus = load_menus_from_csv(row['Name'])
+                        all_menus = card_data["menus"]
+                        # Structured items are listed as one block; uploaded files are shown below
+                        menu_items = [menu for menu in all_menus if isinstance(menu.get('menu_name'), str) and not isinstance(menu.get('media_key'), str) and not isinstance(menu.get('base64_data'), str)]
+                        menus = [menu for menu in all_menus if menu not in menu_items]
+                        if menu_items:
+                            st.markdown(build_menu_items_html(menu_items), unsafe_allow_html=True)
                         if menus:
                             menu_cols = st.columns(3)
                             menu_col_index = 0
                             for menu in menus:
                                 with menu_cols[menu_col_index]:
                                     file_type = menu.get('file_type')
-                                    base64_data = menu.get('base64_data')
+                                    has_media = isinstance(menu.get('media_key'), str) or isinstance(menu.get('base64_data'), str)
 
                                     # Safely check for file type before processing
-                                    if file_type and isinstance(file_type, str) and file_type.startswith('image/'):
+                                    if has_media and file_type and isinstance(file_type, str) and file_type.startswith('image/'):
                                         st.write(f"**{menu.get('file_name', 'Menu File')}**")
-                                        st.image(f"data:{file_type};base64,{base64_data}", use_container_width=True)
+                                        st.image(media_record_url(menu), use_container_width=True)
                                     # Also apply the same check for PDF files
-                                    elif file_type and isinstance(file_type, str) and file_type == 'application/pdf':
+                                    elif has_media and file_type and isinstance(file_type, str) and file_type == 'application/pdf':
                                         st.write(f"**{menu.get('file_name', 'Menu File')}**")
-                                        # Create a download button for the PDF
-                                        st.download_button(
-                                            label="Download PDF",
-                                            data=base64.b64decode(base64_data),
-                                            file_name=menu.get('file_name', 'menu.pdf'),
-                                            mime="application/pdf",
-                                            key=f"download_{menu.get('file_name', 'menu')}_{row['Name']}"
-                                        )
+                                        # Link to the cached media URL rather than re-sending the PDF bytes on every rerun
+                                        st.link_button("Download PDF", media_record_url(menu))
                                     else:
                                         # Handle cases where file_type is None or an unsupported format
                                         st.warning(f"Could not display '{menu.get('file_name', 'Menu File')}'. Unsupported file type or missing data.")
                                 menu_col_index = (menu_col_index + 1) % 3
-                        else:
+                        elif not menu_items:
                             st.info("No curated menus uploaded for this restaurant.")
                         
                     with st.expander(f"Past Reviews for {row['Name']}"):
-                        reviews = load_reviews_from_csv(row['Name'])
+                        rating_col, date_col = st.columns(2)
+                        with rating_col:
+                            review_min_rating = st.selectbox(
+                                "Minimum Rating", [0, 1, 2, 3, 4, 5],
+                                format_func=lambda rating: "Any" if rating == 0 else f"{rating}+ ⭐",
+                                key=f"review_min_rating_{restaurant_id}"
+                            )
+                        with date_col:
+                            review_dates = st.date_input("Date Range", value=[], key=f"review_dates_{restaurant_id}")
+
+                        # Reviews are shown a page at a time, newest first, as one HTML block per load
+                        review_pages_key = f"review_pages_{restaurant_id}"
+                        reviews, total_reviews = load_review_page(
+                            restaurant_id,
+                            limit=st.session_state.get(review_pages_key, 1) * REVIEWS_PAGE_SIZE,
+                            min_rating=review_min_rating or None,
+                            date_range=tuple(review_dates) if len(review_dates) == 2 else None
+                        )
                         if reviews:
-                            for review in reviews:
-                                # Safely handle the rating to avoid the float format error
-                                review_rating = review.get('rating', 'N/A')
-                                if isinstance(review_rating, (int, float)):
-                                    review_rating_str = f"{review_rating:.1f}"
-                                else:
-                                    review_rating_str = str(review_rating)
-                                        
-                                st.markdown(f"**Rating:** {review_rating_str} ⭐")
-                                st.write(f"**Review:** {review.get('review_text', 'No review text.')}")
-                                    
-                                reviewer_info = []
-                                if review.get('reviewer_name'):
-                                    reviewer_info.append(review['reviewer_name'])
-                                if review.get('reviewer_department'):
-                                    reviewer_info.append(review['reviewer_department'])
-                                if review.get('reviewer_designation'):
-                                    reviewer_info.append(review['reviewer_designation'])
-                                    
-                                reviewer_line = ", ".join(reviewer_info) if reviewer_info else "Anonymous"
-                                    
-                                timestamp = review.get('timestamp', 'N/A')
-                                st.caption(f"By {reviewer_line} on {timestamp}")
-                                st.markdown("---")
+                            st.markdown(build_reviews_html(reviews), unsafe_allow_html=True)
+                            if total_reviews > len(reviews):
+                                if st.button(f"Load more ({total_reviews - len(reviews)} older)", key=f"load_more_reviews_{restaurant_id}"):
+                                    st.session_state[review_pages_key] = st.session_state.get(review_pages_key, 1) + 1
+                                    st.rerun()
+                        elif review_min_rating or len(review_dates) == 2:
+                            st.info("No reviews match these filters.")
                         else:
                             st.info("No reviews yet for this restaurant.")
                                 
         col_index = (col_index + 1) % 3
+
+    if page_count > 1:
+        prev_page_col, page_label_col, next_page_col = st.columns([1, 2, 1])
+        with prev_page_col:
+            if st.button("◀ Previous page", key="results_prev_page", disabled=results_page == 0):
+                st.session_state.results_page = results_page - 1
+                st.rerun()
+        with page_label_col:
+            st.markdown(f'<p style="text-align:center;">Page {results_page + 1} of {page_count} · {len(filtered_df)} restaurants</p>', unsafe_allow_html=True)
+        with next_page_col:
+            if st.button("Next page ▶", key="results_next_page", disabled=results_page == page_count - 1):
+                st.session_state.results_page = results_page + 1
+                st.rerun()
+
+    # Warm the next page's card data in the background, and hint its cover images to the browser
+    next_page_ids = filtered_df['ID'].iloc[(results_page + 1) * RESULTS_PAGE_SIZE:(results_page + 2) * RESULTS_PAGE_SIZE].astype(int).tolist()
+    prefetcher.schedule(result_signature, [(restaurant_id, restaurant_partition(restaurant_id)) for restaurant_id in next_page_ids])
+    for restaurant_id in next_page_ids:
+        next_card_data = prefetcher.peek(restaurant_id)
+        if next_card_data and next_card_data["media"]:
+            prefetch_urls.append(media_record_url(next_card_data["media"][cover_position(next_card_data["media"])]))
+    prefetcher.image_urls = set(prefetch_urls)
+    if prefetch_urls:
+        st.markdown(prefetch_links_html(dict.fromkeys(prefetch_urls)), unsafe_allow_html=True)
 else:
     st.info("No restaurants found matching your criteria. Please adjust your filters.")
 
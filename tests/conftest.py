@@ -0,0 +1,105 @@
+"""
+Shared fixtures. streamlit_app.py is a single Streamlit script, so importing it would
+draw the UI and migrate the data files; the `app` fixture instead executes only its
+imports, constants, classes and functions, which is all the unit tests need.
+"""
+import ast
+import base64
+import logging
+import pathlib
+import shutil
+import types
+
+import pandas as pd
+import pytest
+
+APP_FILE = pathlib.Path(__file__).resolve().parents[1] / "streamlit_app.py"
+
+def is_definition(node):
+    """True for the top-level statements the tests need: imports, constants, functions and classes."""
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+        return True
+    if isinstance(node, ast.Assign) and all(isinstance(target, ast.Name) for target in node.targets):
+        is_constant = all(target.id.isupper() for target in node.targets)
+        is_namedtuple = isinstance(node.value, ast.Call) and getattr(node.value.func, "id", None) == "namedtuple"
+        return is_constant or is_namedtuple
+    return False
+
+@pytest.fixture(scope="session")
+def app():
+    """The app's definitions, as attributes of a namespace object."""
+    tree = ast.parse(APP_FILE.read_text(), filename=str(APP_FILE))
+    tree.body = [node for node in tree.body if is_definition(node)]
+    namespace = {"__name__": "streamlit_app_definitions"}
+    # Streamlit warns about every cached function used outside `streamlit run`
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    exec(compile(tree, str(APP_FILE), "exec"), namespace)
+    return types.SimpleNamespace(**namespace)
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n test image"
+PDF_BYTES = b"%PDF-1.4 test menu"
+
+def seed_tables():
+    """Small seed CSVs in the legacy layout: no IDs, child rows joined by restaurant name, inline media."""
+    png = base64.b64encode(PNG_BYTES).decode()
+    return {
+        "restaurants.csv": [
+            {"Name": "Alpha", "Cuisine": "Chinese", "Location": "Orchard", "Rating": 4.0, "Price Range": "$$",
+             "Description": "Noodles and dumplings", "Image": f"data:image/png;base64,{png}", "Address": None,
+             "Private Room": "Yes", "Max Capacity": 20},
+            {"Name": "Beta", "Cuisine": "Japanese", "Location": "Orchard", "Rating": 4.5, "Price Range": "$$$",
+             "Description": "Sushi bar", "Image": "https://example.com/beta.jpg", "Address": None,
+             "Private Room": "No", "Max Capacity": None},
+            {"Name": "Gamma", "Cuisine": "French", "Location": "Dempsey Hill", "Rating": 5.0, "Price Range": "$$$$",
+             "Description": "Tasting menus", "Image": None, "Address": None, "Private Room": "No", "Max Capacity": None},
+        ],
+        "reviews.csv": [
+            {"restaurant_name": "Alpha", "rating": 4.0, "review_text": "Good noodles", "reviewer_name": "Ann",
+             "reviewer_department": "Sales", "reviewer_designation": "Manager", "timestamp": "2030-01-01 12:00:00"},
+            {"restaurant_name": "Alpha", "rating": 2.0, "review_text": "Slow service", "reviewer_name": "Ben",
+             "reviewer_department": "IT", "reviewer_designation": "Engineer", "timestamp": "2030-01-02 19:00:00"},
+            {"restaurant_name": "Alpha", "rating": 5.0, "review_text": "Great dumplings", "reviewer_name": "Cat",
+             "reviewer_department": "sales ", "reviewer_designation": "Director", "timestamp": "2030-01-03 13:00:00"},
+            {"restaurant_name": "Gamma", "rating": 5.0, "review_text": "Lovely tasting menu", "reviewer_name": "Dan",
+             "reviewer_department": "HR", "reviewer_designation": "Analyst", "timestamp": "2030-01-02 20:00:00"},
+        ],
+        "menus.csv": [
+            {"restaurant_name": "Alpha", "menu_name": "Beef Noodles", "menu_description": None, "menu_price": 18,
+             "file_name": None, "file_type": None, "base64_data": None, "timestamp": "2030-01-01 00:00:00"},
+            {"restaurant_name": "Gamma", "menu_name": None, "menu_description": None, "menu_price": None,
+             "file_name": "menu.pdf", "file_type": "application/pdf",
+             "base64_data": base64.b64encode(PDF_BYTES).decode(), "timestamp": "2030-01-01 00:00:00"},
+        ],
+        "gallery_images.csv": [
+            {"restaurant_name": "Beta", "file_name": "room.png", "file_type": "image/png", "base64_data": png,
+             "timestamp": "2030-01-01 00:00:00"},
+        ],
+    }
+
+@pytest.fixture
+def data_dir(app, tmp_path, monkeypatch):
+    """
+    A scratch working directory with the seed CSVs of seed_tables(), migrated into
+    partitions the way the app's first start does. Returns its path.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    shutil.copy(APP_FILE.parent / app.GAZETTEER_CSV_FILE, tmp_path / app.GAZETTEER_CSV_FILE)
+    for csv_file, rows in seed_tables().items():
+        pd.DataFrame(rows).to_csv(csv_file, index=False)
+    app.initialize_csv_files()
+    # The migrations are cached once per process; clear them so each scratch directory is migrated
+    for migration in (app.migrate_to_partitions, app.migrate_review_rollups, app.migrate_media_catalogue):
+        migration.clear()
+        migration()
+    return tmp_path
+
+@pytest.fixture
+def write_queue(app, data_dir):
+    """A write-behind queue of its own, committing to the scratch data directory."""
+    return app.WriteBehindQueue()
+
+def wait_for_commit(write_queue, seq, timeout=10):
+    """Blocks until the queue's writer has committed (or failed) write `seq`."""
+    with write_queue.capacity:
+        assert write_queue.capacity.wait_for(lambda: write_queue.committed_seq >= seq, timeout)
@@ -0,0 +1,319 @@
+"""Unit tests for the in-memory indexes and the write-queue mutations in streamlit_app.py."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BOOKING_COLUMNS = ["booking_id", "restaurant_id", "restaurant_name", "room", "start", "end", "party_size", "booked_by", "timestamp"]
+
+# --- Booking index ---
+@pytest.fixture
+def booking_index(app, tmp_path, monkeypatch):
+    """An empty booking index, backed by a bookings.csv in a scratch directory."""
+    monkeypatch.chdir(tmp_path)
+    pd.DataFrame(columns=BOOKING_COLUMNS).to_csv(app.BOOKINGS_CSV_FILE, index=False)
+    return app.BookingIndex()
+
+def book(app, index, restaurant_id, start, end):
+    """Patches a booking into the index the way a queued write does."""
+    booking = {
+        "booking_id": index.next_booking_id, "restaurant_id": restaurant_id, "restaurant_name": "Test",
+        "room": app.PRIVATE_ROOM_NAME, "start": start.strftime(app.BOOKING_TIME_FORMAT),
+        "end": end.strftime(app.BOOKING_TIME_FORMAT), "party_size": 4, "booked_by": "Tester",
+        "timestamp": "2030-01-01 00:00:00",
+    }
+    index.apply_writes(1, [{"table": "bookings", "op": "append", "row": booking}])
+    return booking
+
+def at(day, hour, minute=0):
+    return datetime(2030, 1, day, hour, minute)
+
+def test_back_to_back_bookings_do_not_conflict(app, booking_index):
+    book(app, booking_index, 1, at(1, 19), at(1, 21))
+    assert booking_index.is_free(1, at(1, 21), at(1, 22))
+    assert booking_index.is_free(1, at(1, 17), at(1, 19))
+
+@pytest.mark.parametrize("start, end", [
+    (at(1, 20), at(1, 22)),
+    (at(1, 18), at(1, 19, 30)),
+    (at(1, 19, 30), at(1, 20, 30)),
+    (at(1, 18), at(1, 22)),
+    (at(1, 19), at(1, 21)),
+])
+def test_overlapping_bookings_conflict(app, booking_index, start, end):
+    booked = book(app, booking_index, 1, at(1, 19), at(1, 21))
+    assert booking_index.conflict(1, start, end) == booked
+
+def test_bookings_are_per_restaurant(app, booking_index):
+    book(app, booking_index, 1, at(1, 19), at(1, 21))
+    assert booking_index.is_free(2, at(1, 19), at(1, 21))
+
+def test_cross_midnight_booking(app, booking_index):
+    book(app, booking_index, 1, at(1, 23), at(2, 1))
+    assert not booking_index.is_free(1, at(2, 0, 30), at(2, 2))
+    assert not booking_index.is_free(1, at(1, 22), at(1, 23, 30))
+    assert booking_index.is_free(1, at(2, 1), at(2, 2))
+    assert booking_index.is_free(1, at(1, 22), at(1, 23))
+
+def test_cancelled_booking_frees_the_slot(app, booking_index):
+    booked = book(app, booking_index, 1, at(1, 19), at(1, 21))
+    booking_index.apply_writes(2, [{"table": "bookings", "op": "delete", "match": ("booking_id", booked["booking_id"])}])
+    assert booking_index.is_free(1, at(1, 19), at(1, 21))
+
+def test_upcoming_lists_bookings_in_start_order(app, booking_index):
+    later = book(app, booking_index, 1, at(3, 19), at(3, 21))
+    earlier = book(app, booking_index, 1, at(2, 12), at(2, 14))
+    book(app, booking_index, 1, at(1, 12), at(1, 14))
+    assert booking_index.upcoming(1, at(1, 18)) == [earlier, later]
+
+def test_replayed_booking_advances_next_booking_id(app, booking_index):
+    booked = book(app, booking_index, 1, at(1, 19), at(1, 21))
+    assert booking_index.next_booking_id == booked["booking_id"] + 1
+
+def test_past_bookings_are_rejected(app):
+    start = datetime.now() - timedelta(days=1)
+    assert app.book_private_room(1, "Test", start, start + timedelta(hours=2), 4, "Tester", np.nan) is False
+
+# --- BK-tree ---
+def test_bk_tree_finds_items_within_distance(app):
+    tree = app.BKTree()
+    for value, item in [(0b0000, "a"), (0b0001, "b"), (0b0011, "c"), (0b1111, "d"), (0b0000, "a2")]:
+        tree.add(value, item)
+    assert tree.search(0b0000, 0) == [(0, "a"), (0, "a2")]
+    assert tree.search(0b0000, 2) == [(0, "a"), (0, "a2"), (1, "b"), (2, "c")]
+    assert tree.search(0b1110, 1) == [(1, "d")]
+
+def test_bk_tree_discard_keeps_routing_node(app):
+    tree = app.BKTree()
+    tree.add(0b0000, "root")
+    tree.add(0b0111, "child")
+    tree.discard(0b0000, "root")
+    assert tree.search(0b0000, 0) == []
+    assert tree.search(0b0110, 1) == [(1, "child")]
+
+def test_bk_tree_search_on_empty_tree(app):
+    assert app.BKTree().search(0, 64) == []
+
+# --- Prefix trie ---
+def test_prefix_trie_ranks_by_weight_then_label(app):
+    trie = app.PrefixTrie(top_k=2)
+    trie.add("Dempsey Grill", "Dempsey Grill", 2)
+    trie.add("Dempsey Bar", "Dempsey Bar", 2)
+    trie.add("Den", "Den", 1)
+    assert trie.complete("de") == [(2, "Dempsey Bar"), (2, "Dempsey Grill")]
+    assert trie.complete("DEN") == [(1, "Den")]
+    assert trie.complete("x") == []
+
+def test_prefix_trie_accumulates_weight(app):
+    trie = app.PrefixTrie()
+    trie.add("laksa", "laksa")
+    trie.add("lamb", "lamb", 2)
+    trie.add("laksa", "laksa", 2)
+    assert trie.complete("la") == [(3, "laksa"), (2, "lamb")]
+
+# --- Trigram index ---
+def test_trigram_index_tolerates_typos(app):
+    index = app.TrigramIndex()
+    for key in ["dempsey", "dumpling", "tiong"]:
+        index.add(key, key)
+    matches = index.search("demsey")
+    assert matches[0][0] == "dempsey"
+    assert "tiong" not in [key for key, _ in matches]
+
+def test_trigram_index_respects_limit_and_threshold(app):
+    index = app.TrigramIndex()
+    for key in ["noodle", "noodles", "noodle bar"]:
+        index.add(key, key)
+    assert len(index.search("noodle", limit=2)) == 2
+    assert all(similarity >= 0.9 for _, similarity in index.search("noodle", min_similarity=0.9))
+
+# --- Query result cache ---
+def test_query_cache_evicts_least_recently_used(app):
+    cache = app.QueryResultCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", ([1], {}))
+    cache.put("b", ([2], {}))
+    assert cache.get("a") == ([1], {})
+    cache.put("c", ([3], {}))
+    assert cache.get("b") is None
+    assert cache.get("a") == ([1], {})
+    assert cache.stats()["evictions"] == 1
+
+def test_query_cache_expires_entries(app, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    cache = app.QueryResultCache(max_entries=4, ttl_seconds=10)
+    cache.put("a", ([1], {}))
+    now[0] += 11
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["expirations"], stats["misses"], stats["entries"]) == (1, 1, 0)
+
+def test_normalize_search_query_orders_terms(app):
+    assert app.normalize_search_query("  Laksa &  Chicken   Rice ") == "chicken rice & laksa"
+    assert app.normalize_search_query("b, A,,") == "a, b"
+    assert app.normalize_search_query(None) == ""
+
+def test_cached_search_runs_the_query_as_typed(app, data_dir, monkeypatch):
+    executed = []
+    def fake_find_restaurants(df_restaurants, search_query, **filters):
+        executed.append(search_query)
+        return df_restaurants.head(1)
+    monkeypatch.setitem(app.find_restaurants_cached.__globals__, "find_restaurants", fake_find_restaurants)
+    df_restaurants = app.load_restaurants()
+    first = app.find_restaurants_cached(df_restaurants, pd.DataFrame(), search_query="  Zebra & Noodles ")
+    second = app.find_restaurants_cached(df_restaurants, pd.DataFrame(), search_query="noodles & zebra")
+    assert executed == ["  Zebra & Noodles "]
+    assert first['ID'].tolist() == second['ID'].tolist()
+
+# --- Menu catalogue ---
+@pytest.fixture
+def menu_catalogue(app):
+    return app.MenuCatalogue(pd.DataFrame([
+        {"restaurant_id": 1, "menu_name": "Beef Noodles", "menu_price": 18},
+        {"restaurant_id": 1, "menu_name": "Chicken Rice", "menu_price": 8},
+        {"restaurant_id": 2, "menu_name": "Noodle Soup", "menu_price": 25},
+        {"restaurant_id": 2, "menu_name": "Seasonal Special", "menu_price": np.nan},
+        {"restaurant_id": 3, "menu_name": None, "menu_price": np.nan, "file_name": "menu.pdf"},
+    ]))
+
+def test_menu_catalogue_matches_dish_tokens_and_plurals(app, menu_catalogue):
+    assert menu_catalogue.matches_by_restaurant("noodle") == {1: ["Beef Noodles ($18)"], 2: ["Noodle Soup ($25)"]}
+    assert menu_catalogue.matches_by_restaurant("beef noodles") == {1: ["Beef Noodles ($18)"]}
+
+def test_menu_catalogue_price_bounds(app, menu_catalogue):
+    assert menu_catalogue.matches_by_restaurant("noodles", max_price=20) == {1: ["Beef Noodles ($18)"]}
+    assert menu_catalogue.matches_by_restaurant(min_price=8, max_price=18) == {1: ["Beef Noodles ($18)", "Chicken Rice ($8)"]}
+
+def test_menu_catalogue_skips_file_menus(app, menu_catalogue):
+    assert len(menu_catalogue.items) == 4
+    assert menu_catalogue.matches_by_restaurant("special") == {2: ["Seasonal Special"]}
+
+# --- Spatial index ---
+@pytest.fixture
+def spatial_points(app):
+    rng = np.random.default_rng(7)
+    points = {key: (1.25 + rng.random() * 0.2, 103.7 + rng.random() * 0.25) for key in range(300)}
+    index = app.SpatialGridIndex()
+    for key, (lat, lon) in points.items():
+        index.add(key, lat, lon)
+    return index, points
+
+def brute_force_distances(app, points, lat, lon):
+    return {key: app.haversine_km(lat, lon, *point) for key, point in points.items()}
+
+@pytest.mark.parametrize("radius_km", [0.5, 2.0, 7.5])
+def test_within_radius_matches_brute_force(app, spatial_points, radius_km):
+    index, points = spatial_points
+    distances = brute_force_distances(app, points, 1.33, 103.84)
+    assert index.within_radius(1.33, 103.84, radius_km) == {key: d for key, d in distances.items() if d <= radius_km}
+
+@pytest.mark.parametrize("lat, lon, k", [(1.33, 103.84, 5), (1.30, 103.60, 3), (1.35, 103.80, 300)])
+def test_nearest_matches_brute_force(app, spatial_points, lat, lon, k):
+    index, points = spatial_points
+    expected = sorted((d, key) for key, d in brute_force_distances(app, points, lat, lon).items())[:k]
+    assert index.nearest(lat, lon, k) == {key: d for d, key in expected}
+
+def test_nearest_respects_allowed_keys(app, spatial_points):
+    index, points = spatial_points
+    allowed = set(range(0, 300, 10))
+    distances = brute_force_distances(app, {key: points[key] for key in allowed}, 1.33, 103.84)
+    expected = sorted((d, key) for key, d in distances.items())[:4]
+    assert index.nearest(1.33, 103.84, 4, allowed_keys=allowed) == {key: d for d, key in expected}
+    assert index.nearest(1.33, 103.84, 4, allowed_keys=set()) == {}
+
+def test_geocoding_matches_locations_fuzzily_and_falls_back_to_postcodes(app, data_dir):
+    assert app.geocode_restaurant("Demsey", None) == (1.3050, 103.8097)
+    assert app.geocode_restaurant("Somewhere", "1 Orchard Road") == (1.3048, 103.8318)
+    assert app.geocode_restaurant(None, "10 Main Street, Singapore 018956") == (1.2840, 103.8510)
+    assert app.geocode_restaurant("Atlantis", "No postcode") is None
+
+# --- Write-queue mutations ---
+def test_apply_mutation_append_to_empty_table(app):
+    table_df = app.apply_mutation(pd.DataFrame(columns=["ID", "Name"]), {"op": "append", "row": {"ID": 1, "Name": "A"}})
+    assert table_df.to_dict(orient="records") == [{"ID": 1, "Name": "A"}]
+
+def test_apply_mutation_update_widens_blank_columns(app):
+    table_df = pd.DataFrame({"ID": [1, 2], "Notes": [np.nan, np.nan]})
+    table_df = app.apply_mutation(table_df, {"op": "update", "match": ("ID", 2), "values": {"Notes": "quiet", "Rating": 4.5}})
+    assert table_df.loc[1, "Notes"] == "quiet"
+    assert pd.isna(table_df.loc[0, "Notes"])
+    assert table_df.loc[1, "Rating"] == 4.5
+
+def test_apply_mutation_delete(app):
+    table_df = pd.DataFrame({"restaurant_id": [1, 2, 1], "text": ["a", "b", "c"]})
+    table_df = app.apply_mutation(table_df, {"op": "delete", "match": ("restaurant_id", 1)})
+    assert table_df.to_dict(orient="records") == [{"restaurant_id": 2, "text": "b"}]
+
+def test_apply_mutation_increment_existing_and_new_rows(app):
+    table_df = pd.DataFrame({"day": ["2030-01-01"], "restaurant_id": [1], "review_count": [2], "rating_sum": [9.0]})
+    increment = {"op": "increment", "key": {"day": "2030-01-01", "restaurant_id": 1}, "values": {"review_count": 1, "rating_sum": 4.0}}
+    table_df = app.apply_mutation(table_df, increment)
+    assert table_df[["review_count", "rating_sum"]].values.tolist() == [[3, 13.0]]
+    table_df = app.apply_mutation(table_df, {**increment, "key": {"day": "2030-01-02", "restaurant_id": 1}})
+    assert table_df[["day", "review_count"]].values.tolist() == [["2030-01-01", 3], ["2030-01-02", 1]]
+
+def test_apply_mutation_rejects_unknown_operations(app):
+    with pytest.raises(ValueError):
+        app.apply_mutation(pd.DataFrame({"ID": [1]}), {"op": "upsert", "match": ("ID", 1)})
+
+# --- Similar restaurants ---
+def test_blank_fields_add_no_terms(app):
+    terms = app.restaurant_terms({"Description": np.nan, "Cuisine": np.nan, "Price Range": "$$"})
+    assert terms == {"price range=$$": 2}
+    assert app.review_terms(np.nan) == {}
+
+def rounded_neighbours(neighbours):
+    return {restaurant_id: [(round(score, 9), other_id) for score, other_id in listed] for restaurant_id, listed in neighbours.items()}
+
+def assert_neighbours_match_full_recompute(index):
+    """The patched top-k lists must equal the lists recomputed from the index's current vectors."""
+    recomputed = {restaurant_id: index._top_k(index._scores(restaurant_id)) for restaurant_id in index.restaurants}
+    assert rounded_neighbours(index.neighbours) == rounded_neighbours(recomputed)
+
+def test_review_makes_restaurants_similar(app, data_dir):
+    index = app.SimilarRestaurantsIndex(k=2)
+    ids = dict(zip(app.load_table("restaurants")['Name'], app.load_table("restaurants")['ID']))
+    assert "Gamma" not in [name for name, _ in index.similar(ids["Alpha"])]
+    index.apply_writes(1, [{"table": "reviews", "op": "append", "row": {"restaurant_id": ids["Gamma"], "review_text": "Handmade noodles and dumplings"}}])
+    assert "Gamma" in [name for name, _ in index.similar(ids["Alpha"])]
+
+def test_incremental_updates_match_full_recompute(app, data_dir):
+    rng = np.random.default_rng(11)
+    words = ["noodles", "dumplings", "sushi", "omakase", "steak", "wine", "curry", "laksa", "pasta", "tapas", "grill", "bakery"]
+    cuisines = ["Chinese", "Japanese", "Italian", "Spanish"]
+    def description():
+        return " ".join(rng.choice(words, size=rng.integers(1, 5)))
+
+    index = app.SimilarRestaurantsIndex(k=3)
+    for seq, restaurant_id in enumerate(range(10, 30), start=1):
+        index.apply_writes(seq, [{"table": "restaurants", "op": "append", "row": {
+            "ID": restaurant_id, "Name": f"R{restaurant_id}", "Description": description(),
+            "Cuisine": str(rng.choice(cuisines)), "Price Range": "$$"}}])
+        assert_neighbours_match_full_recompute(index)
+    for seq in range(100, 160):
+        restaurant_id = int(rng.choice(list(index.restaurants)))
+        action = rng.integers(3)
+        if action == 0:
+            mutation = {"table": "reviews", "op": "append", "row": {"restaurant_id": restaurant_id, "review_text": description()}}
+        elif action == 1:
+            mutation = {"table": "restaurants", "op": "update", "match": ("ID", restaurant_id), "values": {"Description": description()}}
+        else:
+            mutation = {"table": "restaurants", "op": "update", "match": ("ID", restaurant_id), "values": {"Cuisine": str(rng.choice(cuisines))}}
+        index.apply_writes(seq, [mutation])
+        assert_neighbours_match_full_recompute(index)
+    index.apply_writes(200, [{"table": "restaurants", "op": "delete", "match": ("ID", 10)}])
+    assert_neighbours_match_full_recompute(index)
+    assert all(other_id != 10 for listed in index.neighbours.values() for _, other_id in listed)
+
+# --- Write rate limiting ---
+def test_rate_limiter_check_does_not_spend_tokens(app):
+    limiter = app.WriteRateLimiter()
+    identities = [("session", "abc")]
+    burst = app.WRITE_RATE_LIMITS["restaurant"][0]
+    for _ in range(burst + 2):
+        assert limiter.try_acquire("restaurant", identities, spend=False) == (True, 0.0)
+    for _ in range(burst):
+        assert limiter.try_acquire("restaurant", identities)[0]
+    allowed, retry_after = limiter.try_acquire("restaurant", identities, spend=False)
+    assert not allowed and retry_after > 0
@@ -0,0 +1,188 @@
+"""Tests for the partitioned storage and the loaders that read it, run against a scratch data directory."""
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from conftest import PDF_BYTES, PNG_BYTES, seed_tables, wait_for_commit
+
+def restaurant_ids(app):
+    restaurants = app.load_table("restaurants")
+    return dict(zip(restaurants['Name'], restaurants['ID']))
+
+# --- Seed migration ---
+def test_migration_leaves_seed_files_untouched(app, data_dir):
+    for csv_file, rows in seed_tables().items():
+        assert (data_dir / csv_file).read_text() == pd.DataFrame(rows).to_csv(index=False)
+
+def test_migration_moves_inline_media_and_joins_child_rows_by_id(app, data_dir):
+    ids = restaurant_ids(app)
+    assert sorted(ids) == ["Alpha", "Beta", "Gamma"]
+    reviews = app.load_table("reviews")
+    assert reviews.groupby('restaurant_id').size().to_dict() == {ids["Alpha"]: 3, ids["Gamma"]: 1}
+
+    menus = app.load_table("menus")
+    file_menu = menus[menus['file_name'] == "menu.pdf"].iloc[0]
+    assert file_menu['restaurant_id'] == ids["Gamma"] and pd.isna(file_menu['base64_data'])
+    assert (data_dir / app.MEDIA_DIR / file_menu['media_key']).read_bytes() == PDF_BYTES
+
+    media = app.load_table("media")
+    alpha_cover = media[(media['restaurant_id'] == ids["Alpha"]) & media['is_cover']].iloc[0]
+    assert (data_dir / app.MEDIA_DIR / alpha_cover['media_key']).read_bytes() == PNG_BYTES
+    beta_media = media[media['restaurant_id'] == ids["Beta"]].sort_values('position')
+    assert beta_media['url'].iloc[0] == "https://example.com/beta.jpg"
+    assert beta_media['file_name'].iloc[1] == "room.png"
+
+# --- Review timeline ---
+def review_texts(page):
+    reviews, total = page
+    return [review['review_text'] for review in reviews], total
+
+def test_review_page_is_newest_first(app, data_dir):
+    alpha = restaurant_ids(app)["Alpha"]
+    assert review_texts(app.load_review_page(alpha)) == (["Great dumplings", "Slow service", "Good noodles"], 3)
+    assert review_texts(app.load_review_page(alpha, limit=2)) == (["Great dumplings", "Slow service"], 3)
+
+def test_review_page_date_range_includes_whole_end_day(app, data_dir):
+    alpha = restaurant_ids(app)["Alpha"]
+    assert review_texts(app.load_review_page(alpha, date_range=(date(2030, 1, 2), date(2030, 1, 2)))) == (["Slow service"], 1)
+    assert review_texts(app.load_review_page(alpha, limit=1, date_range=(date(2030, 1, 1), date(2030, 1, 2)))) == (["Slow service"], 2)
+    assert review_texts(app.load_review_page(alpha, date_range=(date(2029, 1, 1), date(2029, 12, 31)))) == ([], 0)
+
+def test_review_page_combines_rating_and_date_filters(app, data_dir):
+    alpha = restaurant_ids(app)["Alpha"]
+    page = app.load_review_page(alpha, min_rating=4, date_range=(date(2030, 1, 1), date(2030, 1, 3)))
+    assert review_texts(page) == (["Great dumplings", "Good noodles"], 2)
+
+def test_file_version_changes_on_rewrite_within_one_mtime_tick(app, data_dir):
+    csv_file = app.partition_file("reviews", "orchard")
+    before = app.file_version(csv_file)
+    app.write_csv_atomically(pd.read_csv(csv_file), csv_file)
+    os.utime(csv_file, ns=(before[0], before[0]))
+    assert app.file_version(csv_file) != before
+
+# --- Cache invalidation ---
+def test_committed_write_reaches_cached_restaurants_without_a_cache_clear(app, write_queue):
+    ids = restaurant_ids(app)
+    assert "Alpha" in app.load_restaurants("Orchard")['Name'].tolist()
+    seq = write_queue.submit([{"table": "restaurants", "op": "update", "match": ("ID", ids["Alpha"]), "values": {"Name": "Alpha Prime"}}])
+    wait_for_commit(write_queue, seq)
+    assert app.load_restaurants("Orchard")['Name'].tolist() == ["Alpha Prime", "Beta"]
+    assert "Alpha Prime" in app.load_restaurants("All")['Name'].tolist()
+
+# --- Uploaded restaurant CSVs ---
+def test_uploaded_rows_keep_only_ids_that_match_by_name(app):
+    stored = pd.DataFrame({"ID": [1, 2, 3], "Name": ["Alpha", "Beta", "Gamma"]})
+    uploaded = pd.DataFrame({
+        "ID": [1, 2, None, 1, 3, 7],
+        "Name": [" alpha", "Gamma", "Beta", "Unknown", "Gamma", None],
+    })
+    resolved = app.resolve_uploaded_restaurant_ids(uploaded, stored)
+    # Row 2 claims Beta's ID under Gamma's name; the second Gamma row cannot reuse ID 3
+    assert resolved['ID'].tolist() == [1, 3, 2, -1, -2, -3]
+
+def test_uploaded_only_restaurants_cannot_be_written(app):
+    assert app.is_uploaded_only_restaurant(-1) and not app.is_uploaded_only_restaurant(1)
+    with pytest.raises(ValueError):
+        app.submit_writes([{"table": "reviews", "op": "append", "row": {"restaurant_id": -1, "rating": 5}}])
+    with pytest.raises(ValueError):
+        app.submit_writes([{"table": "restaurants", "op": "update", "match": ("ID", -2), "values": {"Name": "X"}}])
+
+# --- Review rollups ---
+def rollups_on_disk(app):
+    return pd.read_csv(app.REVIEW_ROLLUPS_CSV_FILE).sort_values(app.REVIEW_ROLLUP_KEYS).reset_index(drop=True)
+
+def rollups_from_reviews(app):
+    return app.build_review_rollups(app.load_table("reviews")).sort_values(app.REVIEW_ROLLUP_KEYS).reset_index(drop=True)
+
+def new_review(restaurant_id, rating, department, timestamp):
+    return {"restaurant_id": restaurant_id, "restaurant_name": "Alpha", "rating": rating, "review_text": "Nice",
+            "reviewer_name": "Eve", "reviewer_department": department, "reviewer_designation": "Lead", "timestamp": timestamp}
+
+def test_rollups_are_backfilled_from_the_review_partitions(app, data_dir):
+    rollups = rollups_on_disk(app)
+    pd.testing.assert_frame_equal(rollups, rollups_from_reviews(app), check_dtype=False)
+    assert rollups['review_count'].sum() == 4
+
+def test_rollup_increments_track_the_reviews(app, write_queue):
+    alpha = restaurant_ids(app)["Alpha"]
+    writes = [
+        new_review(alpha, 3.0, "Sales", "2030-01-01 18:00:00"),
+        new_review(alpha, None, " ", "2030-01-01 19:00:00"),
+        new_review(alpha, 5.0, "Legal", "2030-01-05 09:00:00"),
+    ]
+    for review in writes:
+        seq = write_queue.submit([{"table": "reviews", "op": "append", "row": review}, app.review_rollup_increment(review)])
+    wait_for_commit(write_queue, seq)
+    assert not write_queue.failed_writes
+    rollups = rollups_on_disk(app)
+    pd.testing.assert_frame_equal(rollups, rollups_from_reviews(app), check_dtype=False)
+    sales = rollups[(rollups['day'] == "2030-01-01") & (rollups['reviewer_department'] == "Sales")].iloc[0]
+    assert (sales['review_count'], sales['rated_count'], sales['rating_sum']) == (2, 2, 7.0)
+    unrated = rollups[rollups['reviewer_department'] == app.UNSPECIFIED_DEPARTMENT].iloc[0]
+    assert (unrated['review_count'], unrated['rated_count'], unrated['rating_sum']) == (1, 0, 0.0)
+
+def test_deleting_a_restaurant_deletes_its_rollups(app, write_queue):
+    ids = restaurant_ids(app)
+    seq = write_queue.submit([
+        {"table": "reviews", "op": "delete", "match": ("restaurant_id", ids["Alpha"])},
+        {"table": "review_rollups", "op": "delete", "match": ("restaurant_id", ids["Alpha"])},
+    ])
+    wait_for_commit(write_queue, seq)
+    rollups = rollups_on_disk(app)
+    assert rollups['restaurant_id'].tolist() == [ids["Gamma"]]
+    pd.testing.assert_frame_equal(rollups, rollups_from_reviews(app), check_dtype=False)
+
+# --- Partition moves ---
+def partition_rows(app, table, partition):
+    csv_file = app.partition_file(table, partition)
+    return pd.read_csv(csv_file) if os.path.exists(csv_file) else pd.DataFrame()
+
+def assert_manifest_matches_files(app):
+    manifest = app.get_partition_manifest()
+    for partition, entry in manifest["partitions"].items():
+        for table, rows in entry["rows"].items():
+            assert len(partition_rows(app, table, partition)) == rows, (partition, table)
+        restaurants = partition_rows(app, "restaurants", partition)
+        expected_locations = sorted(restaurants['Location'].dropna().unique().tolist()) if len(restaurants) else []
+        assert entry["locations"] == expected_locations, partition
+        for restaurant_id in restaurants.get('ID', []):
+            assert manifest["restaurant_partitions"][str(restaurant_id)] == partition
+
+def test_relocated_restaurant_moves_with_its_child_rows(app, write_queue):
+    alpha = restaurant_ids(app)["Alpha"]
+    review = new_review(alpha, 4.0, "Sales", "2030-02-01 12:00:00")
+    # The review is queued after the move in the same batch, so it must follow the restaurant
+    with write_queue.lock:
+        write_queue.submit([{"table": "restaurants", "op": "update", "match": ("ID", alpha), "values": {"Location": "Dempsey Hill"}}])
+        seq = write_queue.submit([{"table": "reviews", "op": "append", "row": review}])
+    wait_for_commit(write_queue, seq)
+    assert not write_queue.failed_writes
+
+    assert app.restaurant_partition(alpha) == "dempsey-hill"
+    assert partition_rows(app, "restaurants", "orchard")['Name'].tolist() == ["Beta"]
+    assert sorted(partition_rows(app, "restaurants", "dempsey-hill")['Name']) == ["Alpha", "Gamma"]
+    for table, count in [("reviews", 4), ("menus", 1), ("media", 1)]:
+        assert (partition_rows(app, table, "dempsey-hill")['restaurant_id'] == alpha).sum() == count, table
+        assert (partition_rows(app, table, "orchard")['restaurant_id'] == alpha).sum() == 0, table
+    assert_manifest_matches_files(app)
+
+def test_restaurant_moved_to_a_new_location_gets_a_new_partition(app, write_queue):
+    beta = restaurant_ids(app)["Beta"]
+    seq = write_queue.submit([{"table": "restaurants", "op": "update", "match": ("ID", beta), "values": {"Location": "Tiong Bahru"}}])
+    wait_for_commit(write_queue, seq)
+    assert app.partitions_for_location_filter("Tiong Bahru") == ["tiong-bahru"]
+    assert app.load_restaurants("Tiong Bahru")['Name'].tolist() == ["Beta"]
+    assert (partition_rows(app, "media", "tiong-bahru")['restaurant_id'] == beta).sum() == 2
+    assert "Tiong Bahru" in app.partition_locations()
+    assert_manifest_matches_files(app)
+
+def test_rename_and_location_case_change_stay_in_the_partition(app, write_queue):
+    alpha = restaurant_ids(app)["Alpha"]
+    seq = write_queue.submit([{"table": "restaurants", "op": "update", "match": ("ID", alpha), "values": {"Name": "Alpha Prime", "Location": "orchard"}}])
+    wait_for_commit(write_queue, seq)
+    assert app.restaurant_partition(alpha) == "orchard"
+    assert sorted(partition_rows(app, "restaurants", "orchard")['Name']) == ["Alpha Prime", "Beta"]
+    assert (partition_rows(app, "reviews", "orchard")['restaurant_id'] == alpha).sum() == 3
+    assert_manifest_matches_files(app)
@@ -0,0 +1,77 @@
+"""Tests for upload validation and the ingestion worker."""
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+class FakeUpload(io.BytesIO):
+    """Stands in for Streamlit's UploadedFile: a byte stream with a name and a claimed type."""
+
+    def __init__(self, data, file_type, name="upload"):
+        super().__init__(data)
+        self.name = name
+        self.type = file_type
+        self.size = len(data)
+
+def ingest(app, upload):
+    job = app.UploadJob(upload.name, upload.type, upload.size)
+    return job, app.ingest_upload_worker(job, upload)
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def media_dir(app, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / app.MEDIA_DIR
+
+@pytest.mark.parametrize("file_type, size, allowed", [
+    ("image/gif", 100, ["image/gif"]),
+    ("image/png", 100, ["image/jpeg"]),
+    ("image/png", 0, ["image/png"]),
+    ("image/png", 10 * 1024 * 1024 + 1, ["image/png"]),
+])
+def test_validate_upload_rejects_type_and_size(app, file_type, size, allowed):
+    with pytest.raises(ValueError):
+        app.validate_upload(file_type, size, allowed)
+
+def test_stores_upload_under_its_content_hash(app, media_dir):
+    data = b"%PDF-1.4 a menu"
+    job, media_key = ingest(app, FakeUpload(data, "application/pdf"))
+    assert media_key == hashlib.sha256(data).hexdigest() + ".pdf"
+    assert (media_dir / media_key).read_bytes() == data
+    assert os.listdir(media_dir) == [media_key]
+    assert job.stage == "Done" and job.progress == 1.0
+
+def test_image_upload_is_verified_and_hashed(app, media_dir):
+    job, media_key = ingest(app, FakeUpload(png_bytes(), "image/png"))
+    assert media_key.endswith(".png")
+    assert isinstance(job.perceptual_hash, int)
+
+@pytest.mark.parametrize("data, file_type", [
+    (b"%PDF-1.4 not an image", "image/png"),
+    (b"\x89PNG\r\n\x1a\n not a pdf", "application/pdf"),
+    (b"GIF89a", "image/jpeg"),
+])
+def test_rejects_content_that_does_not_match_its_type(app, media_dir, data, file_type):
+    with pytest.raises(ValueError, match="does not match"):
+        ingest(app, FakeUpload(data, file_type))
+    assert os.listdir(media_dir) == []
+
+def test_rejects_a_file_that_grows_past_the_limit(app, media_dir, monkeypatch):
+    monkeypatch.setitem(app.MAX_UPLOAD_BYTES, "application/pdf", 16)
+    upload = FakeUpload(b"%PDF-1.4 " + b"x" * 32, "application/pdf")
+    # The claimed size passes validation; the bytes actually read do not
+    upload.size = 10
+    with pytest.raises(ValueError, match="size limit"):
+        ingest(app, upload)
+    assert os.listdir(media_dir) == []
+
+def test_rejects_a_corrupt_image(app, media_dir):
+    with pytest.raises(Exception):
+        ingest(app, FakeUpload(png_bytes()[:40], "image/png"))
+    assert os.listdir(media_dir) == []
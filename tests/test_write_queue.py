@@ -0,0 +1,82 @@
+"""Tests for the write-behind queue: failure isolation, index rollback and read-your-writes."""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from conftest import wait_for_commit
+
+def review(restaurant_id, text):
+    return {"table": "reviews", "op": "append", "row": {
+        "restaurant_id": restaurant_id, "restaurant_name": "Alpha", "rating": 4.0, "review_text": text,
+        "reviewer_name": "Eve", "reviewer_department": "Ops", "reviewer_designation": "Lead",
+        "timestamp": "2030-02-01 12:00:00"}}
+
+def booking(booking_id, hour):
+    return {"table": "bookings", "op": "append", "row": {
+        "booking_id": booking_id, "restaurant_id": 1, "restaurant_name": "Alpha", "room": "Private Room",
+        "start": f"2030-02-01 {hour:02d}:00", "end": f"2030-02-01 {hour + 1:02d}:00", "party_size": 4,
+        "booked_by": "Eve", "timestamp": "2030-01-01 00:00:00"}}
+
+BAD_DELETE = {"table": "bookings", "op": "delete", "match": ("no_such_column", 1)}
+
+def submit_batch(write_queue, writes):
+    """Submits the writes while holding the lock, so the writer takes them as one batch."""
+    with write_queue.lock:
+        seqs = [write_queue.submit(mutations) for mutations in writes]
+    wait_for_commit(write_queue, seqs[-1])
+    return seqs
+
+def test_only_the_offending_write_fails(app, write_queue):
+    good, bad, later = submit_batch(write_queue, [[review(1, "first")], [booking(1, 10), BAD_DELETE], [review(1, "second")]])
+    assert list(write_queue.failed_writes) == [bad]
+    assert write_queue.status()["writes_committed"] == 2
+    assert app.load_table("reviews")['review_text'].tolist()[-2:] == ["first", "second"]
+    # The failed write is dropped as a whole, including its valid booking
+    assert pd.read_csv(app.BOOKINGS_CSV_FILE).empty
+
+def test_failed_write_is_rolled_back_out_of_the_indexes(app, write_queue):
+    bookings = write_queue.track_index(app.BookingIndex)
+    with write_queue.lock:
+        write_queue.submit([booking(1, 10), BAD_DELETE])
+        seq = write_queue.submit([booking(2, 12)])
+        # Patched in as soon as they are submitted
+        assert not bookings.is_free(1, datetime(2030, 2, 1, 10), datetime(2030, 2, 1, 11))
+    wait_for_commit(write_queue, seq)
+    assert bookings.is_free(1, datetime(2030, 2, 1, 10), datetime(2030, 2, 1, 11))
+    assert not bookings.is_free(1, datetime(2030, 2, 1, 12), datetime(2030, 2, 1, 13))
+    assert pd.read_csv(app.BOOKINGS_CSV_FILE)['booking_id'].tolist() == [2]
+
+def test_malformed_write_leaves_the_files_untouched(app, write_queue):
+    before = app.load_table("reviews")
+    seq, = submit_batch(write_queue, [[{"table": "reviews", "op": "upsert", "match": ("restaurant_id", 1)}]])
+    assert seq in write_queue.failed_writes
+    pd.testing.assert_frame_equal(app.load_table("reviews"), before)
+
+# --- Read-your-writes ---
+@pytest.fixture
+def session_queue(app, write_queue, monkeypatch):
+    """Routes submit_writes() to the scratch queue, with an empty pending-writes list for this 'session'."""
+    monkeypatch.setitem(app.submit_writes.__globals__, "get_write_queue", lambda: write_queue)
+    monkeypatch.setitem(app.submit_writes.__globals__, "build_write_indexes", lambda: None)
+    app.st.session_state.pending_writes = []
+    yield write_queue
+    del app.st.session_state.pending_writes
+
+def test_session_sees_its_writes_before_they_are_committed(app, session_queue):
+    restaurants = app.load_table("restaurants")
+    alpha = int(restaurants.loc[restaurants['Name'] == "Alpha", 'ID'].iloc[0])
+    with session_queue.lock:
+        seq = app.submit_writes([
+            {"table": "restaurants", "op": "update", "match": ("ID", alpha), "values": {"Name": "Alpha Prime"}},
+            review(alpha, "not saved yet"),
+        ])
+        # The writer is held off, so the files still have the old data
+        assert "Alpha" in app.load_table("restaurants")['Name'].tolist()
+        assert "Alpha Prime" in app.load_current_restaurants("Orchard")['Name'].tolist()
+        reviews, total = app.load_review_page(alpha)
+        assert (reviews[0]['review_text'], total) == ("not saved yet", 4)
+    wait_for_commit(session_queue, seq)
+    assert not app.pending_session_writes("reviews")
+    assert "Alpha Prime" in app.load_current_restaurants("Orchard")['Name'].tolist()
+    assert app.load_review_page(alpha)[1] == 4